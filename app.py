@@ -47,6 +47,10 @@ def create_app():
         import models
         db.create_all()
         
+        # Add columns introduced since the tables were first created
+        from migrations import upgrade_schema
+        upgrade_schema(db)
+        
         # Create admin user if it doesn't exist
         from werkzeug.security import generate_password_hash
         admin_user = models.User.query.filter_by(email='admin@fakenews.com').first()
@@ -73,6 +77,18 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(predict_bp, url_prefix='/predict')
     
+    # Register maintenance CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
+    # Request and database metrics, Server-Timing headers and /metrics
+    from utils.metrics import init_app as init_metrics
+    init_metrics(app)
+    
+    # Opt-in profiling of slow requests, stored in instance/profiles
+    from utils.profiling import init_app as init_profiling
+    init_profiling(app)
+    
     # Register main routes
     from flask import render_template, redirect, url_for
     from flask_login import current_user
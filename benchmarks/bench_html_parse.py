@@ -0,0 +1,106 @@
+"""
+Benchmark for HTML article extraction.
+
+Compares the original extract_title/extract_content path (html.parser and
+CSS selectors) with parse_article (lxml when available and a single tree
+walk) over a directory of saved HTML pages, reporting parse time and peak
+traced memory per page.
+
+Usage:
+    python benchmarks/bench_html_parse.py [--corpus DIR] [--repeat N] [--json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+from utils.content_extractor import parse_article, extract_title, extract_content, HTML_PARSER
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+
+def legacy_extract(html):
+    """The extraction path used before parse_article"""
+    soup = BeautifulSoup(html, 'html.parser')
+    title = extract_title(soup)
+    content = extract_content(soup)
+    return title, content
+
+
+def measure(func, html, repeat):
+    """Median wall time in ms and peak traced memory in KiB of func(html)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    result = func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak / 1024, result
+
+
+def run(corpus, repeat):
+    pages = sorted(glob.glob(os.path.join(corpus, '*.htm*')))
+    if not pages:
+        raise SystemExit(f'No HTML files found in {corpus}')
+
+    rows = []
+    for path in pages:
+        with open(path, 'rb') as f:
+            html = f.read()
+
+        legacy_ms, legacy_kib, legacy_result = measure(legacy_extract, html, repeat)
+        new_ms, new_kib, new_result = measure(parse_article, html, repeat)
+
+        rows.append({
+            'page': os.path.basename(path),
+            'bytes': len(html),
+            'legacy_ms': legacy_ms,
+            'parse_article_ms': new_ms,
+            'speedup': legacy_ms / new_ms if new_ms else 0.0,
+            'legacy_peak_kib': legacy_kib,
+            'parse_article_peak_kib': new_kib,
+            'same_title': legacy_result[0] == new_result[0],
+            'same_content': legacy_result[1] == new_result[1],
+        })
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML article extraction')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='directory of saved .html pages')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per page')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    rows = run(args.corpus, args.repeat)
+
+    if args.json:
+        print(json.dumps({'parser': HTML_PARSER, 'pages': rows}, indent=2))
+        return
+
+    print(f'parse_article parser: {HTML_PARSER}')
+    print(f"{'page':<28}{'KiB':>8}{'legacy ms':>12}{'new ms':>10}{'speedup':>9}"
+          f"{'legacy KiB':>12}{'new KiB':>10}  same")
+    for row in rows:
+        same = 'yes' if row['same_title'] and row['same_content'] else 'no'
+        print(f"{row['page']:<28}{row['bytes'] / 1024:>8.1f}{row['legacy_ms']:>12.2f}"
+              f"{row['parse_article_ms']:>10.2f}{row['speedup']:>8.2f}x"
+              f"{row['legacy_peak_kib']:>12.0f}{row['parse_article_peak_kib']:>10.0f}  {same}")
+
+
+if __name__ == '__main__':
+    main()
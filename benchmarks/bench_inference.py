@@ -0,0 +1,352 @@
+"""
+Inference benchmark suite with latency percentiles and regression gating.
+
+Measures, over synthetic articles from 100 B to 10 MB:
+
+- preprocess_text
+- predict_news (every run scores a fresh document, so the prediction cache never answers)
+- the /predict/analyze_text route through Flask's test client, from a stored draft to the redirect
+  to the result page (near-duplicate lookup, prediction and the database writes included)
+
+and the extract_title/extract_content and parse_article extraction paths
+over the saved HTML fixtures. Each case reports p50/p95/p99 latency,
+throughput and the peak traced memory of one extra run.
+
+Results can be saved as a baseline and later runs compared against it;
+the comparison exits with status 1 when a case got slower or bigger than
+the tolerance allows, so it can gate a deploy.
+
+Usage:
+    python benchmarks/bench_inference.py [--max-size 1MB] [--only predict_news,route] [--json]
+    python benchmarks/bench_inference.py --save baseline.json
+    python benchmarks/bench_inference.py --baseline baseline.json [--tolerance 0.25]
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+SIZES = [('100B', 100), ('1KB', 1024), ('10KB', 10 * 1024), ('100KB', 100 * 1024),
+         ('1MB', 1024 * 1024), ('10MB', 10 * 1024 * 1024)]
+
+BENCHMARKS = ('preprocess_text', 'predict_news', 'extract', 'parse_article', 'route')
+
+WORDS = ('Government', 'officials', 'said', 'SHOCKING', 'study', 'found', 'that', '2024', 'the',
+         'economy', 'grew', '3.5%', 'café', "don't", 'miracle', 'cure!', 'council', 'approved',
+         'budget', 'researchers', 'published', 'secret', 'documents', 'leaked', 'according', 'to')
+
+# Latency differences below this are noise, whatever the ratio
+MIN_DELTA_MS = 0.05
+MIN_DELTA_KIB = 64
+
+
+def build_app(workdir):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('URL_CACHE_DB', '')
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+def make_vocabulary(size=20000, seed_value=7):
+    """WORDS plus generated words, so that distinct documents share few word triples"""
+    rng = random.Random(seed_value)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return list(WORDS) + [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+VOCABULARY = make_vocabulary()
+
+
+def make_document(size_bytes, seed_value):
+    """A distinct synthetic article of about ``size_bytes`` UTF-8 bytes.
+
+    Drawn from a large vocabulary so that two documents are never near
+    duplicates, which would let the route reuse a verdict instead of scoring.
+    """
+    rng = random.Random(seed_value)
+    text = ' '.join(rng.choices(VOCABULARY, k=max(1, size_bytes // 6)))
+    while len(text.encode('utf-8')) < size_bytes:
+        text += ' ' + ' '.join(rng.choices(VOCABULARY, k=max(1, (size_bytes - len(text)) // 6)))
+    return text.encode('utf-8')[:size_bytes].decode('utf-8', errors='ignore')
+
+
+def parse_size(value):
+    for name, size in SIZES:
+        if name.lower() == value.lower():
+            return size
+    raise argparse.ArgumentTypeError(f"size must be one of {', '.join(name for name, _ in SIZES)}")
+
+
+def measure(run, make_input, repeat, budget):
+    """Time ``run`` on fresh inputs; returns (sorted timings in ms, peak traced KiB).
+
+    Stops early once ``budget`` seconds have been spent timing, after at
+    least three runs. Inputs are built outside the timed region.
+    """
+    run(make_input(-1))
+
+    timings = []
+    spent = 0.0
+    for i in range(repeat):
+        value = make_input(i)
+        started = time.perf_counter()
+        run(value)
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed * 1000)
+        spent += elapsed
+        if i >= 2 and spent > budget:
+            break
+
+    value = make_input(repeat)
+    tracemalloc.start()
+    run(value)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return sorted(timings), peak / 1024
+
+
+def record(benchmark, case, size_bytes, timings, peak_kib):
+    from utils.batching import _summarize
+
+    summary = _summarize(timings)
+    return {
+        'benchmark': benchmark,
+        'case': case,
+        'bytes': size_bytes,
+        'runs': summary['count'],
+        'mean_ms': summary['mean'],
+        'p50_ms': summary['p50'],
+        'p95_ms': summary['p95'],
+        'p99_ms': summary['p99'],
+        'max_ms': summary['max'],
+        'ops_per_s': 1000 / summary['mean'] if summary['mean'] else 0.0,
+        'mb_per_s': size_bytes / 2 ** 20 / (summary['mean'] / 1000) if summary['mean'] else 0.0,
+        'peak_kib': peak_kib,
+    }
+
+
+def run_suite(app, selected, sizes, repeat, budget):
+    from bs4 import BeautifulSoup
+    from models import User
+    from utils.content_extractor import HTML_PARSER, extract_content, extract_title, parse_article
+    from utils.drafts import create_draft
+    from utils.ml_utils import predict_news, preprocess_text
+
+    results = []
+    seeds = iter(range(10 ** 9))
+
+    def fresh(size):
+        return lambda i: make_document(size, next(seeds))
+
+    for case, size in sizes:
+        if 'preprocess_text' in selected:
+            results.append(record('preprocess_text', case, size, *measure(preprocess_text, fresh(size), repeat, budget)))
+        if 'predict_news' in selected:
+            results.append(record('predict_news', case, size, *measure(predict_news, fresh(size), repeat, budget)))
+
+    pages = sorted(glob.glob(os.path.join(FIXTURES, '*.htm*')))
+    for path in pages:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        name = os.path.splitext(os.path.basename(path))[0]
+        size = len(html.encode('utf-8'))
+
+        def extract(page):
+            soup = BeautifulSoup(page, HTML_PARSER)
+            return extract_title(soup), extract_content(soup)
+
+        if 'extract' in selected:
+            results.append(record('extract', name, size, *measure(extract, lambda i: html, repeat, budget)))
+        if 'parse_article' in selected:
+            results.append(record('parse_article', name, size, *measure(parse_article, lambda i: html, repeat, budget)))
+
+    if 'route' in selected:
+        client = app.test_client()
+        response = client.post('/auth/login', data={'email': 'admin@fakenews.com', 'password': 'admin123'})
+        if response.status_code != 302:
+            raise SystemExit('Could not log in as the default admin user')
+
+        with app.app_context():
+            admin_id = User.query.filter_by(email='admin@fakenews.com').first().id
+
+        for case, size in sizes:
+            def make_draft(i, size=size):
+                # Outside the timed region; requests run in their own app context
+                with app.app_context():
+                    return create_draft(admin_id, f'Benchmark article {i}', make_document(size, next(seeds)))
+
+            def analyze(token):
+                response = client.get(f'/predict/analyze_text?draft={token}')
+                if response.status_code != 302 or '/result/' not in response.headers.get('Location', ''):
+                    raise RuntimeError(f'analyze_text failed with status {response.status_code}')
+
+            results.append(record('route', case, size, *measure(analyze, make_draft, repeat, budget)))
+
+    return results
+
+
+def environment():
+    from utils.ml_utils import get_model_version
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model_version': get_model_version(),
+        'commit': commit,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance, memory_tolerance, was_run=lambda row: True):
+    """Compare results with a baseline; returns (rows, regressions).
+
+    Baseline cases for which ``was_run`` is false (left out with --only or
+    --max-size) are not reported as missing.
+    """
+    previous = {(row['benchmark'], row['case']): row for row in baseline['results']}
+    rows = []
+    regressions = 0
+    for row in results:
+        base = previous.pop((row['benchmark'], row['case']), None)
+        if base is None:
+            rows.append((row, None, 'new'))
+            continue
+
+        slower = [metric for metric in ('p50_ms', 'p95_ms')
+                  if row[metric] > base[metric] * (1 + tolerance) and row[metric] - base[metric] > MIN_DELTA_MS]
+        bigger = (row['peak_kib'] > base['peak_kib'] * (1 + memory_tolerance)
+                  and row['peak_kib'] - base['peak_kib'] > MIN_DELTA_KIB)
+        if slower or bigger:
+            status = 'REGRESSION (' + ', '.join(slower + (['memory'] if bigger else [])) + ')'
+            regressions += 1
+        elif row['p50_ms'] < base['p50_ms'] / (1 + tolerance):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((row, base, status))
+
+    for base in previous.values():
+        if was_run(base):
+            rows.append((None, base, 'missing'))
+    return rows, regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<16}{'case':<20}{'runs':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'ops/s':>10}{'MB/s':>9}{'peak KiB':>11}")
+    for row in results:
+        print(f"{row['benchmark']:<16}{row['case']:<20}{row['runs']:>5}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+              f"{row['p99_ms']:>10.3f}{row['ops_per_s']:>10.1f}{row['mb_per_s']:>9.2f}{row['peak_kib']:>11.0f}")
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':<16}{'case':<20}{'p50 base':>10}{'p50 now':>10}{'p95 base':>10}{'p95 now':>10}"
+          f"{'KiB base':>10}{'KiB now':>10}  status")
+    for row, base, status in rows:
+        current = row or {}
+        before = base or {}
+        name = (row or base)['benchmark'], (row or base)['case']
+
+        def cell(values, metric, digits):
+            return f"{values[metric]:>10.{digits}f}" if metric in values else f"{'-':>10}"
+
+        print(f"{name[0]:<16}{name[1]:<20}{cell(before, 'p50_ms', 3)}{cell(current, 'p50_ms', 3)}"
+              f"{cell(before, 'p95_ms', 3)}{cell(current, 'p95_ms', 3)}"
+              f"{cell(before, 'peak_kib', 0)}{cell(current, 'peak_kib', 0)}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inference latency, throughput and memory benchmark suite')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--max-size', type=parse_size, default=SIZES[-1][1],
+                        help='largest synthetic document size (100B ... 10MB)')
+    parser.add_argument('--repeat', type=int, default=30, help='timed runs per case')
+    parser.add_argument('--budget', type=float, default=5.0,
+                        help='seconds of timed runs per case before stopping early (at least 3 runs)')
+    parser.add_argument('--save', metavar='FILE', help='write the results as JSON (e.g. a new baseline)')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with a saved baseline; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative p50/p95 latency increase over the baseline')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help='allowed relative peak memory increase over the baseline')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    selected = {name.strip() for name in args.only.split(',') if name.strip()}
+    unknown = selected - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    sizes = [(name, size) for name, size in SIZES if size <= args.max_size]
+
+    # Keep stdout clean for --json; the app prints model loading messages
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        app = build_app(tempfile.mkdtemp(prefix='bench_inference_'))
+        report = {
+            'environment': environment(),
+            'results': run_suite(app, selected, sizes, args.repeat, args.budget),
+        }
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        def was_run(row):
+            synthetic = row['benchmark'] not in ('extract', 'parse_article')
+            return row['benchmark'] in selected and not (synthetic and row['bytes'] > args.max_size)
+
+        rows, regressions = compare(report['results'], baseline, args.tolerance, args.memory_tolerance, was_run)
+        report['comparison'] = {
+            'baseline': args.baseline,
+            'baseline_environment': baseline.get('environment'),
+            'regressions': regressions,
+            'cases': [{'benchmark': (row or base)['benchmark'], 'case': (row or base)['case'], 'status': status}
+                      for row, base, status in rows],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(report['results'])
+        if args.baseline:
+            print()
+            if baseline.get('environment', {}).get('model_version') != report['environment']['model_version']:
+                print('Note: the baseline was measured with a different model version.')
+            print_comparison(rows)
+            print(f"\n{regressions} regression(s) beyond {args.tolerance:.0%} latency / "
+                  f"{args.memory_tolerance:.0%} memory tolerance")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Recall and latency benchmark of the near-duplicate (MinHash + LSH) index.
+
+Creates a throwaway SQLite database and fingerprints a synthetic corpus of
+articles (Zipf-distributed vocabulary) into it. It then queries lightly
+edited copies of stored articles at several edit rates, plus unrelated
+articles, and reports:
+
+- recall: the edited copy finds its source
+- false positive rate: an unrelated article finds anything
+- the true shingle Jaccard similarity of the copies
+- lookup latency percentiles and candidates compared per lookup
+
+The LSH lookups are compared with an exact linear scan over every stored
+signature held in memory, which gives the recall ceiling of the signatures
+themselves and the latency the index avoids.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py [--articles N] [--queries N] [--json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+EDIT_RATES = (0.02, 0.05, 0.10, 0.20)
+
+
+def build_app(database_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ.setdefault('URL_CACHE_DB', '')
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+class Corpus:
+    """Synthetic articles drawn from a Zipf-distributed vocabulary"""
+
+    def __init__(self, seed_value=42, vocabulary_size=20000):
+        self.rng = random.Random(seed_value)
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        self.vocabulary = [''.join(self.rng.choice(letters) for _ in range(self.rng.randint(3, 9)))
+                           for _ in range(vocabulary_size)]
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(vocabulary_size)))
+
+    def article(self):
+        return self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=self.rng.randint(200, 600))
+
+    def edit(self, words, rate):
+        """Replace, delete or insert a word at about ``rate`` of the positions"""
+        edited = []
+        for word in words:
+            roll = self.rng.random()
+            if roll < rate / 3:
+                edited.append(self.rng.choices(self.vocabulary, cum_weights=self.cum_weights)[0])
+            elif roll < rate * 2 / 3:
+                continue
+            elif roll < rate:
+                edited.extend((word, self.rng.choices(self.vocabulary, cum_weights=self.cum_weights)[0]))
+            else:
+                edited.append(word)
+        return edited
+
+
+def shingles(words):
+    from utils.near_duplicates import SHINGLE_SIZE
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def seed(db, corpus, count, batch_size=5000):
+    """Fingerprint ``count`` articles into the index; returns their words and signatures"""
+    from models import SubmissionFingerprint, SubmissionLshBucket
+    from utils.near_duplicates import band_buckets, fingerprint_text
+
+    articles = []
+    signatures = []
+    fingerprints = []
+    buckets = []
+    for submission_id in range(1, count + 1):
+        words = corpus.article()
+        signature = fingerprint_text(' '.join(words))
+        articles.append(words)
+        signatures.append(signature)
+        fingerprints.append({'submission_id': submission_id, 'signature': signature.tobytes(),
+                             'cluster_id': submission_id})
+        buckets.extend({'band': band, 'bucket': bucket, 'submission_id': submission_id}
+                       for band, bucket in band_buckets(signature))
+        if len(fingerprints) == batch_size or submission_id == count:
+            db.session.execute(SubmissionFingerprint.__table__.insert(), fingerprints)
+            db.session.execute(SubmissionLshBucket.__table__.insert(), buckets)
+            fingerprints, buckets = [], []
+    db.session.commit()
+    return articles, signatures
+
+
+def run_queries(db, queries, matrix, threshold):
+    """Look up every (words, expected_id) query through the index and by linear scan"""
+    from sqlalchemy import func, select
+    from utils.batching import _summarize
+    from utils.near_duplicates import _CANDIDATES, band_buckets, find_similar, fingerprint_text, similarities
+
+    count_candidates = select(func.count()).select_from(_CANDIDATES.subquery())
+    indexed_ms, scan_ms, candidates = [], [], []
+    indexed_hits = scan_hits = 0
+
+    for words, expected in queries:
+        signature = fingerprint_text(' '.join(words))
+
+        started = time.perf_counter()
+        match = find_similar(signature, threshold)
+        indexed_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        scores = similarities(signature, matrix)
+        best = int(scores.argmax())
+        scan_match = best + 1 if scores[best] >= threshold else None
+        scan_ms.append((time.perf_counter() - started) * 1000)
+
+        candidates.append(db.session.execute(count_candidates, {
+            f'bucket_{band}': bucket for band, bucket in band_buckets(signature)
+        }).scalar())
+
+        found = match.submission_id if match else None
+        if expected is None:
+            indexed_hits += found is not None
+            scan_hits += scan_match is not None
+        else:
+            indexed_hits += found == expected
+            scan_hits += scan_match == expected
+
+    return {
+        'queries': len(queries),
+        'indexed_rate': indexed_hits / len(queries),
+        'scan_rate': scan_hits / len(queries),
+        'indexed_ms': _summarize(sorted(indexed_ms)),
+        'scan_ms': _summarize(sorted(scan_ms)),
+        'mean_candidates': statistics.mean(candidates),
+    }
+
+
+def explain(db, signature):
+    from utils.near_duplicates import _FIND_SIMILAR, band_buckets
+
+    compiled = _FIND_SIMILAR.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params({f'bucket_{band}': bucket for band, bucket in band_buckets(signature)})
+    rows = db.session.connection().exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + str(compiled), tuple(params[name] for name in compiled.positiontup)
+    )
+    return [row[-1] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark near-duplicate recall and lookup latency')
+    parser.add_argument('--articles', type=int, default=50000, help='articles to index')
+    parser.add_argument('--queries', type=int, default=200, help='queries per edit rate')
+    parser.add_argument('--threshold', type=float, default=None, help='similarity threshold (default: app setting)')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_near_duplicates_')
+    database_path = os.path.join(workdir, 'bench.db')
+    app = build_app(database_path)
+
+    import numpy as np
+    from app import db
+    from utils.near_duplicates import NEAR_DUPLICATE_THRESHOLD, NUM_PERM
+
+    threshold = NEAR_DUPLICATE_THRESHOLD if args.threshold is None else args.threshold
+    corpus = Corpus()
+
+    with app.app_context():
+        started = time.perf_counter()
+        articles, signatures = seed(db, corpus, args.articles)
+        seed_s = time.perf_counter() - started
+        db.session.execute(db.text('ANALYZE'))
+        matrix = np.vstack(signatures).reshape(len(signatures), NUM_PERM)
+
+        rng = random.Random(7)
+        results = {}
+        true_similarity = {}
+        for rate in EDIT_RATES:
+            queries = []
+            similarity = []
+            for _ in range(args.queries):
+                source = rng.randrange(len(articles))
+                edited = corpus.edit(articles[source], rate)
+                queries.append((edited, source + 1))
+                similarity.append(jaccard(shingles(articles[source]), shingles(edited)))
+            results[f'edited {rate:.0%}'] = run_queries(db, queries, matrix, threshold)
+            true_similarity[f'edited {rate:.0%}'] = statistics.mean(similarity)
+
+        unrelated = [(corpus.article(), None) for _ in range(args.queries)]
+        results['unrelated'] = run_queries(db, unrelated, matrix, threshold)
+        plan = explain(db, signatures[0])
+
+    report = {
+        'articles': args.articles,
+        'threshold': threshold,
+        'seed_seconds': seed_s,
+        'database_mb': os.path.getsize(database_path) / 2 ** 20,
+        'signature_matrix_mb': matrix.nbytes / 2 ** 20,
+        'true_jaccard': true_similarity,
+        'results': results,
+        'candidate_plan': plan,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Indexed {args.articles} articles in {seed_s:.1f}s "
+          f"(database {report['database_mb']:.0f} MB; in-memory signatures would take "
+          f"{report['signature_matrix_mb']:.0f} MB), threshold {threshold}")
+    print(f"{'queries':<14}{'jaccard':>8}{'recall':>8}{'scan':>7}{'cands':>7}"
+          f"{'lsh p50':>9}{'p95':>7}{'p99':>7}{'scan p50':>10}")
+    for name, row in results.items():
+        label = 'false pos' if name == 'unrelated' else 'recall'
+        similarity = true_similarity.get(name)
+        print(f"{name:<14}{(f'{similarity:.2f}' if similarity is not None else '-'):>8}"
+              f"{row['indexed_rate']:>8.3f}{row['scan_rate']:>7.3f}{row['mean_candidates']:>7.1f}"
+              f"{row['indexed_ms']['p50']:>9.2f}{row['indexed_ms']['p95']:>7.2f}{row['indexed_ms']['p99']:>7.2f}"
+              f"{row['scan_ms']['p50']:>10.2f}   ({label})")
+    print()
+    print('Candidate lookup plan:')
+    for step in plan:
+        print(f'    {step}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for the shared text normalizer.
+
+Measures throughput in MB/s of the original regex-based preprocess_text,
+utils.text_normalizer.normalize_text and its chunked iter_normalized mode,
+and checks that all three produce identical output.
+
+Usage:
+    python benchmarks/bench_normalizer.py [--size-mb N] [--repeat N] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.text_normalizer import normalize_text, iter_normalized
+
+WORDS = ('Government', 'officials', 'said', 'SHOCKING', 'study', 'found', 'that', '2024',
+         'the', 'economy', 'grew', '3.5%', 'café', 'naïve', "don't", 'miracle', 'cure!')
+
+
+def legacy_normalize(text):
+    """preprocess_text as it was implemented before the shared normalizer"""
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    text = ' '.join(text.split())
+    return text
+
+
+def chunked_normalize(text, chunk_size=1024 * 1024):
+    chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    return ' '.join(iter_normalized(chunks))
+
+
+def make_document(size_bytes, seed=42):
+    """Synthetic article text of roughly size_bytes characters"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size_bytes:
+        word = rng.choice(WORDS)
+        separator = rng.choice(' \n\t  ')
+        parts.append(word + separator)
+        total += len(word) + 1
+    return ''.join(parts)[:size_bytes]
+
+
+def throughput(func, text, repeat):
+    """Best-of-N throughput in MB/s"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return len(text.encode('utf-8')) / (1024 * 1024) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark text normalization throughput')
+    parser.add_argument('--size-mb', type=float, default=16, help='document size in MB')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per variant')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    text = make_document(int(args.size_mb * 1024 * 1024))
+
+    expected = legacy_normalize(text)
+    identical = normalize_text(text) == expected and chunked_normalize(text) == expected
+
+    results = {
+        'size_mb': args.size_mb,
+        'identical_output': identical,
+        'mb_per_s': {
+            'legacy_regex': throughput(legacy_normalize, text, args.repeat),
+            'normalize_text': throughput(normalize_text, text, args.repeat),
+            'iter_normalized': throughput(chunked_normalize, text, args.repeat),
+        },
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Document: {args.size_mb} MB, identical output: {'yes' if identical else 'NO'}")
+    for name, value in results['mb_per_s'].items():
+        print(f'{name:<16}{value:>10.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
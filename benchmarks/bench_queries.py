@@ -0,0 +1,220 @@
+"""
+Seeded-data benchmark of the listing queries behind the dashboards.
+
+Creates a throwaway SQLite database, seeds it with users and submissions and
+runs the keyset-paginated queries issued by user.history, user.dashboard,
+admin.submissions, admin.dashboard and admin.users (first and deep pages),
+first without and then with the indexes declared on the models (plus the
+users FTS search index). For every query it prints the median time and the
+EXPLAIN QUERY PLAN output, and flags plans that scan a table or sort in a
+temporary B-tree.
+
+Usage:
+    python benchmarks/bench_queries.py [--users N] [--submissions N] [--repeat N] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def build_app(database_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ.setdefault('URL_CACHE_DB', '')
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+def seed(db, users_count, submissions_count, seed_value=42):
+    """Bulk insert synthetic users and submissions, then rebuild the derived data"""
+    from models import User, Submission, reconcile_user_counters, rebuild_submission_stats
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    first_names = ('alice', 'bob', 'carol', 'dave', 'erin', 'frank', 'grace', 'heidi', 'ivan', 'judy')
+
+    db.session.execute(User.__table__.insert(), [
+        {
+            'name': f'{rng.choice(first_names).title()} {i}',
+            'email': f'{rng.choice(first_names)}{i}@example.com',
+            'password_hash': 'x',
+            'role': 'user',
+            'status': 'blocked' if rng.random() < 0.05 else 'active',
+            'avatar': '',
+            'created_at': now - timedelta(minutes=i),
+        }
+        for i in range(users_count)
+    ])
+    user_ids = [row[0] for row in db.session.execute(User.__table__.select().with_only_columns(User.id))]
+
+    batch = []
+    for i in range(submissions_count):
+        batch.append({
+            'user_id': rng.choice(user_ids),
+            'article_title': f'Article {i}',
+            'article_content': 'Lorem ipsum dolor sit amet',
+            'source_type': rng.choice(('text', 'file', 'url')),
+            'result': rng.choice(('FAKE', 'REAL')),
+            'confidence': rng.uniform(50, 100),
+            'timestamp': now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+        })
+        if len(batch) == 10000:
+            db.session.execute(Submission.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Submission.__table__.insert(), batch)
+    db.session.commit()
+
+    reconcile_user_counters()
+    rebuild_submission_stats()
+    return user_ids
+
+
+def listing_queries(user_id, search, deep_cursor):
+    """The queries issued by each listing endpoint, with representative filters.
+
+    Listings are keyset-paginated newest first on (timestamp, id); the deep
+    variants continue from ``deep_cursor``, a (timestamp, id) pair near the
+    end of the table.
+    """
+    from sqlalchemy import tuple_
+    from models import User, Submission, user_search_condition
+
+    newest = (Submission.timestamp.desc(), Submission.id.desc())
+    after_deep = tuple_(Submission.timestamp, Submission.id) < deep_cursor
+    history = Submission.query.filter_by(user_id=user_id)
+    users = User.query.filter_by(role='user')
+    newest_users = (User.created_at.desc(), User.id.desc())
+
+    return {
+        'user.history': history.order_by(*newest).limit(11),
+        'user.history?result': history.filter(Submission.result == 'FAKE').order_by(*newest).limit(11),
+        'user.history deep page': history.filter(after_deep).order_by(*newest).limit(11),
+        'user.dashboard recent': history.order_by(Submission.timestamp.desc()).limit(5),
+        'admin.submissions': Submission.query.order_by(*newest).limit(21),
+        'admin.submissions deep page': Submission.query.filter(after_deep).order_by(*newest).limit(21),
+        'admin.submissions?result': Submission.query.filter(Submission.result == 'FAKE').order_by(*newest).limit(21),
+        'admin.submissions?source': Submission.query.filter(Submission.source_type == 'url').order_by(*newest).limit(21),
+        'admin.dashboard recent users': users.order_by(User.created_at.desc()).limit(5),
+        'admin.users?status': users.filter(User.status == 'blocked').order_by(*newest_users).limit(21),
+        'admin.users?search': users.filter(user_search_condition(search)).order_by(*newest_users).limit(21),
+    }
+
+
+def explain(db, query):
+    from sqlalchemy import text
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def measure(db, queries, repeat):
+    rows = {}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query.all()
+            timings.append((time.perf_counter() - started) * 1000)
+        plan = explain(db, query)
+        rows[name] = {
+            'median_ms': statistics.median(timings),
+            'plan': plan,
+            'full_scan': any(step.startswith('SCAN') and 'INDEX' not in step and 'VIRTUAL TABLE' not in step
+                             for step in plan),
+            'temp_sort': any('TEMP B-TREE' in step for step in plan),
+        }
+    return rows
+
+
+def drop_indexes(db):
+    """Remove the model-declared indexes and the user search index"""
+    from sqlalchemy import text
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(bind=db.engine, checkfirst=True)
+    for statement in ('DROP TRIGGER IF EXISTS users_fts_insert', 'DROP TRIGGER IF EXISTS users_fts_delete',
+                      'DROP TRIGGER IF EXISTS users_fts_update', 'DROP TABLE IF EXISTS users_fts'):
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark listing queries with and without indexes')
+    parser.add_argument('--users', type=int, default=5000, help='users to seed')
+    parser.add_argument('--submissions', type=int, default=200000, help='submissions to seed')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per query')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_queries_')
+    app = build_app(os.path.join(workdir, 'bench.db'))
+
+    from app import db
+    import models
+    from migrations import create_missing_indexes, create_user_search_index
+
+    with app.app_context():
+        started = time.perf_counter()
+        user_ids = seed(db, args.users, args.submissions)
+        seed_s = time.perf_counter() - started
+
+        # The busiest user exercises the per-user listings hardest
+        busiest = db.session.query(models.User.id).order_by(models.User.submission_count.desc()).first()[0]
+        search = 'ice12'
+        # Continue from ~95% of the way through the table
+        deep = models.Submission.query.order_by(models.Submission.timestamp.desc(), models.Submission.id.desc())\
+                                      .offset(int(args.submissions * 0.95)).first()
+        deep_cursor = (deep.timestamp, deep.id)
+
+        drop_indexes(db)
+        models._user_search_fts.clear()
+        db.session.execute(db.text('ANALYZE'))
+        without = measure(db, listing_queries(busiest, search, deep_cursor), args.repeat)
+
+        create_missing_indexes(db)
+        create_user_search_index(db)
+        models._user_search_fts.clear()
+        db.session.execute(db.text('ANALYZE'))
+        with_indexes = measure(db, listing_queries(busiest, search, deep_cursor), args.repeat)
+
+    results = {
+        'users': len(user_ids),
+        'submissions': args.submissions,
+        'seed_seconds': seed_s,
+        'queries': {
+            name: {'without_indexes': without[name], 'with_indexes': with_indexes[name]}
+            for name in with_indexes
+        },
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Seeded {results['users']} users and {args.submissions} submissions in {seed_s:.1f}s")
+    print(f"{'query':<32}{'no index ms':>12}{'indexed ms':>12}{'speedup':>9}")
+    for name, row in results['queries'].items():
+        before = row['without_indexes']['median_ms']
+        after = row['with_indexes']['median_ms']
+        print(f"{name:<32}{before:>12.2f}{after:>12.2f}{before / after if after else 0:>8.1f}x")
+    print()
+    for name, row in results['queries'].items():
+        plan = row['with_indexes']
+        flags = [flag for flag, bad in (('FULL SCAN', plan['full_scan']), ('TEMP SORT', plan['temp_sort'])) if bad]
+        print(f"{name}{'  [' + ', '.join(flags) + ']' if flags else ''}")
+        for step in plan['plan']:
+            print(f'    {step}')
+
+
+if __name__ == '__main__':
+    main()
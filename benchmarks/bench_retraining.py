@@ -0,0 +1,127 @@
+"""
+Incremental retraining benchmark: time against the feedback delta and the history size.
+
+For each history size, seeds a throwaway SQLite database with that many
+labeled submissions and lets a first retraining consume them all (the
+full retrain). It then appends batches of new labels and times
+retraining on each batch alone. The incremental time should follow the
+delta and stay flat as the history grows.
+
+Usage:
+    python benchmarks/bench_retraining.py [--history 10000,100000] [--deltas 100,1000] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+WORDS = ('shocking secret miracle conspiracy exposed doctors hate trick officials announced report study '
+         'council percent budget published analysts ministry quarter data according researchers').split()
+
+
+def build_app(workdir):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['MODEL_DIR'] = os.path.join(workdir, 'model')
+    os.environ.setdefault('URL_CACHE_DB', '')
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    # A TF-IDF + LogisticRegression model to start from
+    from ml_model.train_model import train_model
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_model(model_dir=os.environ['MODEL_DIR'])
+
+    from app import app
+    return app
+
+
+def article(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(80, 160)))
+
+
+def add_labeled(db, rng, count, user_id, batch_size=5000):
+    """Insert ``count`` submissions, each with one admin label"""
+    from models import Submission, SubmissionFeedback
+
+    first_id = (db.session.query(db.func.max(Submission.id)).scalar() or 0) + 1
+    now = datetime.utcnow()
+    for start in range(0, count, batch_size):
+        ids = range(first_id + start, first_id + min(count, start + batch_size))
+        labels = [rng.choice(('FAKE', 'REAL')) for _ in ids]
+        db.session.execute(Submission.__table__.insert(), [
+            {'id': submission_id, 'user_id': user_id, 'article_title': f'Article {submission_id}',
+             'article_content': article(rng), 'source_type': 'text', 'result': 'REAL', 'confidence': 60.0,
+             'feedback_label': label, 'timestamp': now}
+            for submission_id, label in zip(ids, labels)
+        ])
+        db.session.execute(SubmissionFeedback.__table__.insert(), [
+            {'submission_id': submission_id, 'label': label, 'admin_id': user_id, 'created_at': now}
+            for submission_id, label in zip(ids, labels)
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark incremental retraining from feedback')
+    parser.add_argument('--history', default='10000,100000', help='comma-separated labeled history sizes')
+    parser.add_argument('--deltas', default='100,1000', help='comma-separated new-label batch sizes')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    histories = [int(value) for value in args.history.split(',')]
+    deltas = [int(value) for value in args.deltas.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='bench_retraining_')
+    app = build_app(workdir)
+
+    from app import db
+    from models import Submission, SubmissionFeedback, User
+    from utils.retraining import retrain_from_feedback
+
+    rng = random.Random(42)
+    results = []
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        for history in histories:
+            # Start every history size from an empty table and the initial model
+            db.session.execute(SubmissionFeedback.__table__.delete())
+            db.session.execute(Submission.__table__.delete())
+            db.session.commit()
+            add_labeled(db, rng, history, admin.id)
+
+            # Trained models remember their checkpoint; the ids of this round start above it
+            started = time.perf_counter()
+            status = retrain_from_feedback()
+            results.append({'history': history, 'delta': status['rows'], 'kind': 'full',
+                            'seconds': time.perf_counter() - started})
+
+            for delta in deltas:
+                add_labeled(db, rng, delta, admin.id)
+                started = time.perf_counter()
+                status = retrain_from_feedback()
+                results.append({'history': history, 'delta': status['rows'], 'kind': 'incremental',
+                                'seconds': time.perf_counter() - started})
+                history += delta
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'history':>9}{'new labels':>12}{'kind':>13}{'seconds':>10}{'labels/s':>10}")
+    for result in results:
+        print(f"{result['history']:>9}{result['delta']:>12}{result['kind']:>13}{result['seconds']:>10.3f}"
+              f"{result['delta'] / result['seconds']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Throughput and memory benchmark of the out-of-core training mode.
+
+Writes a synthetic labeled corpus as CSV shards into a temporary
+directory, then runs ``ml_model/train_model.py --data`` on it with each
+requested number of preprocessing workers and reports wall-clock time,
+rows per second, the speedup over one worker and the peak RSS of the
+largest process. The one-worker run is repeated on the first shard alone:
+with memory bounded by the chunk size, its peak RSS should match the run
+over every shard.
+
+Usage:
+    python benchmarks/bench_training.py [--rows N] [--shards N] [--jobs 1,2,4] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TRAIN_SCRIPT = os.path.join(ROOT, 'ml_model', 'train_model.py')
+
+
+def write_corpus(directory, rows, shards, seed_value=42):
+    """Write ``rows`` labeled articles as ``shards`` CSV files; returns their paths"""
+    import pandas as pd
+
+    rng = random.Random(seed_value)
+    vocabulary = [f'word{i}' for i in range(20000)]
+    cues = {0: [f'fake{i}' for i in range(200)], 1: [f'real{i}' for i in range(200)]}
+    paths = []
+    per_shard = rows // shards
+    for shard in range(shards):
+        records = []
+        for _ in range(per_shard):
+            label = rng.randint(0, 1)
+            words = [rng.choice(cues[label]) if rng.random() < 0.03 else rng.choice(vocabulary)
+                     for _ in range(rng.randint(150, 600))]
+            records.append((' '.join(words), 'REAL' if label else 'FAKE'))
+        path = os.path.join(directory, f'shard-{shard:03d}.csv')
+        pd.DataFrame(records, columns=['text', 'label']).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def run_training(data, jobs, chunk_size, model_dir):
+    """Train once in a child process; returns (seconds, peak RSS in MiB, output)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, TRAIN_SCRIPT, '--data', *data, '--jobs', str(jobs),
+         '--chunk-size', str(chunk_size), '--model-dir', model_dir],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    output = process.stdout.read()
+    # wait4 reports the largest RSS of the child and its reaped workers
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f'Training failed with exit code {process.returncode}:\n{output}')
+    return seconds, usage.ru_maxrss / 1024, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark out-of-core training throughput and memory')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the synthetic corpus')
+    parser.add_argument('--shards', type=int, default=4, help='CSV shards the corpus is split into')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='rows per chunk')
+    parser.add_argument('--jobs', default=None,
+                        help='comma-separated worker counts (default: 1, 2, 4, ... up to the core count)')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+
+    if args.jobs:
+        job_counts = [int(value) for value in args.jobs.split(',')]
+    else:
+        job_counts = [1]
+        while job_counts[-1] * 2 <= (os.cpu_count() or 1):
+            job_counts.append(job_counts[-1] * 2)
+
+    workdir = tempfile.mkdtemp(prefix='bench_training_')
+    data_dir = os.path.join(workdir, 'data')
+    os.makedirs(data_dir)
+    started = time.perf_counter()
+    shards = write_corpus(data_dir, args.rows, args.shards)
+    corpus_mb = sum(os.path.getsize(path) for path in shards) / 2 ** 20
+    corpus_s = time.perf_counter() - started
+
+    configurations = [(f'{jobs} worker(s)', [data_dir], jobs, args.rows) for jobs in job_counts]
+    configurations.append(('1 worker, 1 shard', shards[:1], 1, args.rows // args.shards))
+
+    results = []
+    for name, data, jobs, rows in configurations:
+        seconds, peak_mb, output = run_training(data, jobs, args.chunk_size, os.path.join(workdir, 'model'))
+        accuracy = [line for line in output.splitlines() if line.startswith('Held-out accuracy')]
+        results.append({
+            'name': name,
+            'jobs': jobs,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds,
+            'peak_rss_mb': peak_mb,
+            'accuracy': accuracy[0].rsplit(' ', 1)[-1] if accuracy else None,
+        })
+    baseline = results[0]['rows_per_second']
+    for result in results:
+        result['speedup'] = result['rows_per_second'] / baseline
+
+    if args.json:
+        print(json.dumps({
+            'rows': args.rows,
+            'shards': args.shards,
+            'chunk_size': args.chunk_size,
+            'cpu_count': os.cpu_count(),
+            'corpus_mb': corpus_mb,
+            'results': results,
+        }, indent=2))
+        return
+
+    print(f"Corpus: {args.rows} rows in {args.shards} CSV shards ({corpus_mb:.0f} MB, written in {corpus_s:.1f}s), "
+          f"chunks of {args.chunk_size} rows, {os.cpu_count()} core(s)")
+    print(f"{'configuration':<20}{'rows':>9}{'seconds':>9}{'rows/s':>9}{'speedup':>9}{'peak MiB':>10}{'accuracy':>10}")
+    for result in results:
+        print(f"{result['name']:<20}{result['rows']:>9}{result['seconds']:>9.1f}{result['rows_per_second']:>9.0f}"
+              f"{result['speedup']:>9.2f}{result['peak_rss_mb']:>10.0f}{(result['accuracy'] or '-'):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Per-worker memory and boot time of the model under a pre-forking server.
+
+Simulates gunicorn workers with forked processes in four configurations:
+each worker loading the model itself or the master preloading it before
+forking (as gunicorn.conf.py does), each with and without MODEL_MMAP. Every
+worker scores one document and then reports its RSS, PSS (RSS with shared
+pages split between the processes sharing them) and USS (private memory),
+read from /proc/self/smaps_rollup while all workers are alive. Linux only.
+
+Usage:
+    python benchmarks/bench_worker_memory.py [--workers N] [--model-dir DIR] [--backend sklearn|hashed] [--json]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+SAMPLE = ('Government officials said on Tuesday that the economy grew faster than '
+          'expected in the third quarter, according to a report released this week.')
+
+CONFIGURATIONS = (
+    ('per-worker load', False, False),
+    ('per-worker load + mmap', False, True),
+    ('preload', True, False),
+    ('preload + mmap', True, True),
+)
+
+
+def memory_kib():
+    """Rss, Pss and Uss of this process in KiB"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def worker(preload, forked_at, barrier, results):
+    if not preload:
+        from utils import ml_utils
+    else:
+        ml_utils = sys.modules['utils.ml_utils']
+    ml_utils.predict_news_batch([SAMPLE])
+    boot_ms = (time.perf_counter() - forked_at) * 1000
+
+    # Measure only once every worker has loaded, then stay alive until all
+    # of them have measured so shared pages are split between all of them
+    barrier.wait()
+    memory = memory_kib()
+    barrier.wait()
+    results.put(dict(memory, boot_ms=boot_ms, model_version=ml_utils.model_version))
+
+
+def run_configuration(preload, workers):
+    """Fork ``workers`` workers in this fresh interpreter and collect their reports"""
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+
+    master_load_ms = 0.0
+    if preload:
+        started = time.perf_counter()
+        from utils import ml_utils  # noqa: F401  (loads the model at import)
+        master_load_ms = (time.perf_counter() - started) * 1000
+        gc.freeze()
+
+    processes = []
+    for _ in range(workers):
+        process = context.Process(target=worker, args=(preload, time.perf_counter(), barrier, results))
+        process.start()
+        processes.append(process)
+
+    barrier.wait()
+    master = memory_kib()
+    barrier.wait()
+
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    return {
+        'master_load_ms': master_load_ms,
+        'master': master,
+        'workers': reports,
+    }
+
+
+def summarize(name, preload, mmap, outcome):
+    reports = outcome['workers']
+    return {
+        'configuration': name,
+        'preload': preload,
+        'mmap': mmap,
+        'model_version': reports[0]['model_version'],
+        'master_load_ms': outcome['master_load_ms'],
+        'worker_boot_ms': statistics.mean(report['boot_ms'] for report in reports),
+        'worker_rss_mib': statistics.mean(report['rss'] for report in reports) / 1024,
+        'worker_pss_mib': statistics.mean(report['pss'] for report in reports) / 1024,
+        'worker_uss_mib': statistics.mean(report['uss'] for report in reports) / 1024,
+        # Memory actually used by the whole server: PSS sums to the real footprint
+        'total_pss_mib': (outcome['master']['pss'] + sum(report['pss'] for report in reports)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-worker model memory and boot time')
+    parser.add_argument('--workers', type=int, default=4, help='number of forked workers')
+    parser.add_argument('--model-dir', default=None, help='directory holding model.pkl / serving.pkl')
+    parser.add_argument('--backend', choices=('sklearn', 'hashed'), default=None, help='MODEL_BACKEND to use')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    parser.add_argument('--configuration', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.configuration is not None:
+        # Child run: one configuration in a fresh interpreter
+        name, preload, mmap = CONFIGURATIONS[args.configuration]
+        print(json.dumps(summarize(name, preload, mmap, run_configuration(preload, args.workers))))
+        return
+
+    rows = []
+    for index, (_, _, mmap) in enumerate(CONFIGURATIONS):
+        env = dict(os.environ, MODEL_MMAP='1' if mmap else '0')
+        if args.model_dir:
+            env['MODEL_DIR'] = os.path.abspath(args.model_dir)
+        if args.backend:
+            env['MODEL_BACKEND'] = args.backend
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--configuration', str(index), '--workers', str(args.workers)],
+            env=env, cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps({'workers': args.workers, 'results': rows}, indent=2))
+        return
+
+    print(f"Workers: {args.workers}, model version: {rows[0]['model_version']}")
+    print(f"{'configuration':<26}{'master ms':>10}{'boot ms':>10}{'RSS MiB':>10}"
+          f"{'PSS MiB':>10}{'USS MiB':>10}{'total PSS':>11}")
+    for row in rows:
+        print(f"{row['configuration']:<26}{row['master_load_ms']:>10.0f}{row['worker_boot_ms']:>10.0f}"
+              f"{row['worker_rss_mib']:>10.1f}{row['worker_pss_mib']:>10.1f}{row['worker_uss_mib']:>10.1f}"
+              f"{row['total_pss_mib']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
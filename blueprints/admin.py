@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, send_file, abort
 from flask_login import login_required, current_user
-from models import User, Submission
+from models import User, Submission, SubmissionFingerprint, get_submission_totals, get_monthly_stats, user_search_condition, count_submissions
 from app import db
-from datetime import datetime
-import csv
-import io
+from utils.ml_utils import get_batcher_stats, get_cache_stats, get_model_stats, reload_model_async
+from utils.content_extractor import get_url_cache_stats
+from utils.http_client import get_stats as get_http_stats
+from utils.pagination import keyset_paginate
+from utils.report_export import iter_batches, stream_csv, stream_parquet
+from utils.job_queue import get_queue_stats
+from utils.retraining import FEEDBACK_LABELS, record_feedback
+from utils import profiling
+from sqlalchemy import select
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -21,12 +28,19 @@ def admin_required(f):
 @login_required
 @admin_required
 def dashboard():
-    # Get statistics
-    total_users = User.query.filter_by(role='user').count()
-    total_submissions = Submission.query.count()
-    fake_submissions = Submission.query.filter_by(result='FAKE').count()
-    real_submissions = Submission.query.filter_by(result='REAL').count()
-    blocked_users = User.query.filter_by(status='blocked').count()
+    # Get statistics: user totals in one grouped query, submission totals
+    # from the daily rollup instead of scanning the submissions table
+    from sqlalchemy import func
+    
+    user_groups = db.session.query(User.role, User.status, func.count(User.id))\
+                            .group_by(User.role, User.status).all()
+    total_users = sum(count for role, status, count in user_groups if role == 'user')
+    blocked_users = sum(count for role, status, count in user_groups if status == 'blocked')
+    
+    totals = get_submission_totals()
+    total_submissions = sum(totals.values())
+    fake_submissions = totals.get('FAKE', 0)
+    real_submissions = totals.get('REAL', 0)
     
     # Get recent activity
     recent_users = User.query.filter_by(role='user')\
@@ -49,7 +63,7 @@ def dashboard():
 @login_required
 @admin_required
 def users():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     status_filter = request.args.get('status', '')
     search = request.args.get('search', '')
     
@@ -59,13 +73,9 @@ def users():
         query = query.filter(User.status == status_filter)
     
     if search:
-        query = query.filter(
-            (User.name.contains(search)) | 
-            (User.email.contains(search))
-        )
+        query = query.filter(user_search_condition(search))
     
-    users = query.order_by(User.created_at.desc())\
-               .paginate(page=page, per_page=20, error_out=False)
+    users = keyset_paginate(query, [User.created_at, User.id], per_page=20, cursor=cursor)
     
     return render_template('admin/users.html',
                          users=users,
@@ -117,10 +127,11 @@ def delete_user(user_id):
 @login_required
 @admin_required
 def submissions():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     result_filter = request.args.get('result', '')
     source_filter = request.args.get('source', '')
     user_filter = request.args.get('user', '')
+    cluster_filter = request.args.get('cluster', type=int)
     
     query = Submission.query
     
@@ -136,45 +147,126 @@ def submissions():
             (User.email.contains(user_filter))
         )
     
-    submissions = query.order_by(Submission.timestamp.desc())\
-                      .paginate(page=page, per_page=20, error_out=False)
+    if cluster_filter:
+        # Near-duplicates of one another (see utils.near_duplicates)
+        query = query.join(SubmissionFingerprint).filter(SubmissionFingerprint.cluster_id == cluster_filter)
+    
+    # Approximate total from the statistics rollup; unknown when filtering by user or cluster
+    total = None if user_filter or cluster_filter else count_submissions(result_filter, source_filter)
+    
+    submissions = keyset_paginate(query, [Submission.timestamp, Submission.id], per_page=20,
+                                  cursor=cursor, total=total)
     
     return render_template('admin/submissions.html',
                          submissions=submissions,
                          result_filter=result_filter,
                          source_filter=source_filter,
-                         user_filter=user_filter)
+                         user_filter=user_filter,
+                         cluster_filter=cluster_filter)
+
+@admin_bp.route('/submissions/<int:submission_id>/feedback', methods=['POST'])
+@login_required
+@admin_required
+def submission_feedback(submission_id):
+    submission = Submission.query.get_or_404(submission_id)
+    label = request.form.get('label', '').upper()
+    
+    if label not in FEEDBACK_LABELS:
+        flash('Invalid label.', 'error')
+        return redirect(request.referrer or url_for('admin.submissions'))
+    
+    try:
+        record_feedback(submission, label, current_user.id)
+        verb = 'confirmed' if label == submission.result else 'corrected'
+        flash(f'Verdict {verb} as {label}; it will be learned at the next retraining.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error recording feedback.', 'error')
+    
+    return redirect(request.referrer or url_for('admin.submissions'))
+
+@admin_bp.route('/profiles')
+@login_required
+@admin_required
+def profiles():
+    # Profiles of slow (or admin-flagged) requests and jobs, see utils.profiling
+    order = request.args.get('order', 'slowest')
+    
+    return render_template('admin/profiles.html',
+                         profiles=profiling.list_profiles(order=order),
+                         order=order,
+                         slow_ms=profiling.PROFILE_SLOW_MS,
+                         slow_job_ms=profiling.PROFILE_SLOW_JOB_MS,
+                         mode=profiling.PROFILE_MODE,
+                         header=profiling.PROFILE_HEADER)
+
+@admin_bp.route('/profiles/<profile_id>.<profile_format>')
+@login_required
+@admin_required
+def download_profile(profile_id, profile_format):
+    path = profiling.profile_file(profile_id, profile_format)
+    if path is None:
+        abort(404)
+    
+    return send_file(path, mimetype=profiling.PROFILE_FORMATS[profile_format],
+                     as_attachment=True, download_name=f'{profile_id}.{profile_format}')
 
 @admin_bp.route('/download_report')
 @login_required
 @admin_required
 def download_report():
-    # Create CSV report
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['User Name', 'User Email', 'Article Title', 'Source Type', 
-                    'Result', 'Confidence', 'Timestamp'])
-    
-    # Write data
-    submissions = Submission.query.join(User).all()
-    for submission in submissions:
-        writer.writerow([
-            submission.user.name,
-            submission.user.email,
-            submission.article_title,
-            submission.source_type,
-            submission.result,
-            f"{submission.confidence:.2f}%",
-            submission.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+    # Streamed report: format=csv|parquet, gzip=1 (CSV only), start/end
+    # dates (YYYY-MM-DD, inclusive) and the same filters as the submissions page
+    export_format = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    result_filter = request.args.get('result', '')
+    source_filter = request.args.get('source', '')
+    user_filter = request.args.get('user', '')
+    
+    if export_format not in ('csv', 'parquet'):
+        flash('Unsupported report format.', 'error')
+        return redirect(url_for('admin.submissions'))
+    
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') else None
+    except ValueError:
+        flash('Dates must be given as YYYY-MM-DD.', 'error')
+        return redirect(url_for('admin.submissions'))
+    
+    # Only the exported columns, joined in the same query (no per-row user lookups)
+    statement = select(
+        User.name, User.email, Submission.article_title, Submission.source_type,
+        Submission.result, Submission.confidence, Submission.model_version, Submission.timestamp
+    ).join(User, Submission.user_id == User.id)
+    
+    if start:
+        statement = statement.where(Submission.timestamp >= start)
+    if end:
+        statement = statement.where(Submission.timestamp < end + timedelta(days=1))
+    if result_filter:
+        statement = statement.where(Submission.result == result_filter)
+    if source_filter:
+        statement = statement.where(Submission.source_type == source_filter)
+    if user_filter:
+        statement = statement.where(User.name.contains(user_filter) | User.email.contains(user_filter))
+    
+    statement = statement.order_by(Submission.timestamp, Submission.id)
+    batches = iter_batches(db.session, statement)
+    
+    filename = f'fake_news_report_{datetime.now().strftime("%Y%m%d")}'
+    if export_format == 'parquet':
+        body = stream_parquet(batches)
+        mimetype = 'application/vnd.apache.parquet'
+        filename += '.parquet'
+    else:
+        body = stream_csv(batches, compress=compress)
+        mimetype = 'application/gzip' if compress else 'text/csv'
+        filename += '.csv.gz' if compress else '.csv'
     
     # Create response
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=fake_news_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     
     return response
 
@@ -182,24 +274,34 @@ def download_report():
 @login_required
 @admin_required
 def api_stats():
-    # Get monthly statistics for charts
-    from sqlalchemy import func, extract
-    
-    monthly_stats = db.session.query(
-        extract('month', Submission.timestamp).label('month'),
-        func.count(Submission.id).label('total'),
-        func.sum(func.case([(Submission.result == 'FAKE', 1)], else_=0)).label('fake'),
-        func.sum(func.case([(Submission.result == 'REAL', 1)], else_=0)).label('real')
-    ).group_by('month').all()
-    
+    # Monthly statistics for charts, keyed by 'YYYY-MM'
+    return jsonify({
+        'monthly_stats': get_monthly_stats()
+    })
+
+@admin_bp.route('/api/inference_stats')
+@login_required
+@admin_required
+def api_inference_stats():
     return jsonify({
-        'monthly_stats': [
-            {
-                'month': stat.month,
-                'total': stat.total,
-                'fake': stat.fake,
-                'real': stat.real
-            }
-            for stat in monthly_stats
-        ]
+        'model': get_model_stats(),
+        'micro_batcher': get_batcher_stats(),
+        'prediction_cache': get_cache_stats(),
+        'url_cache': get_url_cache_stats(),
+        'http_client': get_http_stats(),
+        'analysis_jobs': get_queue_stats()
     })
+
+@admin_bp.route('/api/model/reload', methods=['POST'])
+@login_required
+@admin_required
+def api_model_reload():
+    # Load and warm the model file in the background, then swap it in.
+    # Other worker processes pick the file up through their own watcher.
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+    started = reload_model_async(source='admin', force=force)
+    
+    return jsonify({
+        'status': 'reloading' if started else 'already_reloading',
+        'model': get_model_stats()
+    }), 202 if started else 409
@@ -1,45 +1,72 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
-from models import Submission
+from models import Submission, AnalysisJob
 from app import db
-from utils.ml_utils import predict_news
-from utils.content_extractor import extract_from_url
+from utils.ml_utils import predict_news_batched, predict_news_batch, get_model_version
+from utils.content_extractor import extract_many
+from utils.job_queue import enqueue_url_job, enqueue_url_jobs, job_to_dict
+from utils.drafts import consume_draft
+from utils.near_duplicates import fingerprint_text, lookup_verdict, record_fingerprint, cluster_size
+from utils.metrics import stage
+import math
 import re
 from urllib.parse import urlparse
 
 predict_bp = Blueprint('predict', __name__)
 
+# Upper bound on articles accepted by a single /predict/batch call
+MAX_BATCH_ARTICLES = 5000
+
+# Bounds for URL lists passed to /predict/batch
+MAX_BATCH_URLS = 500
+MIN_BATCH_DEADLINE = 1
+MAX_BATCH_DEADLINE = 120
+
 @predict_bp.route('/analyze_text')
 @login_required
 def analyze_text():
-    title = request.args.get('title', '').strip()
-    content = request.args.get('content', '').strip()
+    source_type = 'text'
+    token = request.args.get('draft', '')
+    
+    if token:
+        # Article stored server-side by user.analyze
+        draft = consume_draft(token, current_user.id)
+        if draft is None:
+            flash('This analysis has expired or was already submitted. Please try again.', 'error')
+            return redirect(url_for('user.analyze'))
+        title, content, source_type = draft.title, draft.content, draft.source_type
+    else:
+        title = request.args.get('title', '').strip()
+        content = request.args.get('content', '').strip()
     
     if not title or not content:
         flash('Invalid input data.', 'error')
         return redirect(url_for('user.analyze'))
     
     try:
-        # Predict using ML model
-        result, confidence = predict_news(content)
+        # Reuse the verdict of a near-duplicate article, else predict using ML model
+        signature = fingerprint_text(content)
+        match, verdict = lookup_verdict(signature)
+        result, confidence, model_version = verdict or predict_news_batched(content)
         
         # Save to database
         submission = Submission(
             user_id=current_user.id,
-            article_title=title,
+            article_title=title[:200],
             article_content=content[:1000],  # Truncate for storage
-            source_type='text',
+            source_type=source_type,
             result=result,
-            confidence=confidence
+            confidence=confidence,
+            model_version=model_version
         )
         
         db.session.add(submission)
-        db.session.commit()
+        with stage('commit'):
+            record_fingerprint(submission, signature, match)
+            db.session.commit()
         
-        return render_template('user/result.html',
-                             submission=submission,
-                             title=title,
-                             content=content)
+        # Redirect so that reloading the result page doesn't resubmit
+        return redirect(url_for('predict.result', submission_id=submission.id))
     
     except Exception as e:
         flash('Error analyzing the article. Please try again.', 'error')
@@ -64,37 +91,151 @@ def analyze_url():
         flash('Please provide a valid URL.', 'error')
         return redirect(url_for('user.analyze'))
     
-    try:
-        # Extract content from URL
-        title, content = extract_from_url(url)
-        
-        if not title or not content:
-            flash('Could not extract content from the URL. Please try a different URL or use text input.', 'error')
-            return redirect(url_for('user.analyze'))
-        
-        # Predict using ML model
-        result, confidence = predict_news(content)
-        
-        # Save to database
-        submission = Submission(
-            user_id=current_user.id,
-            article_title=title,
-            article_content=content[:1000],  # Truncate for storage
-            source_type='url',
-            source_url=url,
-            result=result,
-            confidence=confidence
-        )
-        
-        db.session.add(submission)
-        db.session.commit()
-        
-        return render_template('user/result.html',
-                             submission=submission,
-                             title=title,
-                             content=content,
-                             source_url=url)
+    # Fetching and scoring happen in a background worker; the page polls the job
+    job = enqueue_url_job(current_user.id, url)
+    return redirect(url_for('predict.job', job_id=job.id))
+
+def get_own_job(job_id):
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None or (job.user_id != current_user.id and current_user.role != 'admin'):
+        abort(404)
+    return job
+
+def job_payload(job):
+    payload = job_to_dict(job)
+    payload['status_url'] = url_for('predict.job_status', job_id=job.id)
+    payload['result_url'] = url_for('predict.result', submission_id=job.submission_id) if job.submission_id else None
+    return payload
+
+@predict_bp.route('/jobs/<int:job_id>')
+@login_required
+def job(job_id):
+    job = get_own_job(job_id)
     
-    except Exception as e:
-        flash('Error extracting or analyzing content from URL. Please try again.', 'error')
+    if job.status == 'done' and job.submission_id:
+        return redirect(url_for('predict.result', submission_id=job.submission_id))
+    
+    if job.status == 'failed':
+        flash(job.error or 'Error extracting or analyzing content from URL. Please try again.', 'error')
         return redirect(url_for('user.analyze'))
+    
+    return render_template('user/job.html', job=job, job_data=job_payload(job))
+
+@predict_bp.route('/jobs/<int:job_id>/status')
+@login_required
+def job_status(job_id):
+    # Answers right away; the job page polls with backoff instead of holding a web thread
+    job = get_own_job(job_id)
+    return jsonify(job_payload(job))
+
+@predict_bp.route('/result/<int:submission_id>')
+@login_required
+def result(submission_id):
+    submission = db.session.get(Submission, submission_id)
+    if submission is None or (submission.user_id != current_user.id and current_user.role != 'admin'):
+        abort(404)
+    
+    fingerprint = submission.fingerprint
+    
+    return render_template('user/result.html',
+                         submission=submission,
+                         title=submission.article_title,
+                         content=submission.article_content,
+                         source_url=submission.source_url,
+                         fingerprint=fingerprint,
+                         cluster_size=cluster_size(fingerprint.cluster_id) if fingerprint else 0)
+
+@predict_bp.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    data = request.get_json(silent=True) or {}
+    
+    if 'urls' in data:
+        return batch_urls(data)
+    
+    articles = data.get('articles')
+    
+    if not isinstance(articles, list) or not articles:
+        return jsonify({'error': 'Expected a non-empty "articles" list.'}), 400
+    
+    if len(articles) > MAX_BATCH_ARTICLES:
+        return jsonify({'error': f'At most {MAX_BATCH_ARTICLES} articles per batch.'}), 400
+    
+    # Accept either plain strings or {"title": ..., "content": ...} objects
+    titles = []
+    contents = []
+    for article in articles:
+        if isinstance(article, dict):
+            titles.append(str(article.get('title') or ''))
+            contents.append(str(article.get('content') or ''))
+        elif isinstance(article, str):
+            titles.append('')
+            contents.append(article)
+        else:
+            return jsonify({'error': 'Each article must be a string or an object with "content".'}), 400
+    
+    predictions, versions = predict_news_batch(contents, return_versions=True)
+    
+    return jsonify({
+        'model_version': batch_version(versions),
+        'results': [
+            {
+                'index': index,
+                'title': title,
+                'result': result,
+                'confidence': round(confidence, 2),
+                'model_version': version
+            }
+            for index, (title, (result, confidence), version) in enumerate(zip(titles, predictions, versions))
+        ]
+    })
+
+def batch_version(versions):
+    """Model version shared by a batch's results, or None when some fell back to the heuristic"""
+    distinct = set(versions)
+    if not distinct:
+        return get_model_version()
+    return distinct.pop() if len(distinct) == 1 else None
+
+def batch_urls(data):
+    urls = data.get('urls')
+    
+    if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'Expected a non-empty "urls" list of strings.'}), 400
+    
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f'At most {MAX_BATCH_URLS} URLs per batch.'}), 400
+    
+    if data.get('async'):
+        # Queue one job per URL and let the client poll each job's status_url
+        jobs = enqueue_url_jobs(current_user.id, urls)
+        return jsonify({'jobs': [job_payload(job) for job in jobs]}), 202
+    
+    try:
+        deadline = float(data.get('deadline', MAX_BATCH_DEADLINE))
+    except (TypeError, ValueError):
+        deadline = math.nan
+    if not math.isfinite(deadline):
+        return jsonify({'error': '"deadline" must be a number of seconds.'}), 400
+    deadline = min(max(deadline, MIN_BATCH_DEADLINE), MAX_BATCH_DEADLINE)
+    
+    # Fetch each distinct URL once, concurrently
+    extracted = {url: (title, content, error)
+                 for url, title, content, error in extract_many(list(dict.fromkeys(urls)), deadline=deadline)}
+    
+    # Then score every extracted article in one pass; results follow the input
+    # positions, so repeated URLs each get their own entry
+    scorable = [index for index, url in enumerate(urls) if extracted[url][2] is None]
+    scored, versions = predict_news_batch([extracted[urls[index]][1] for index in scorable], return_versions=True)
+    predictions = dict(zip(scorable, zip(scored, versions)))
+    
+    results = []
+    for index, url in enumerate(urls):
+        title, content, error = extracted[url]
+        entry = {'index': index, 'url': url, 'title': title, 'error': error}
+        if index in predictions:
+            (result, confidence), version = predictions[index]
+            entry.update(result=result, confidence=round(confidence, 2), model_version=version)
+        results.append(entry)
+    
+    return jsonify({'model_version': batch_version(versions), 'results': results})
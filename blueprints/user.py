@@ -4,6 +4,11 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from models import User, Submission
 from app import db
+from utils.pagination import keyset_paginate
+from utils.drafts import create_draft
+from utils.upload_ingest import plan_upload, UploadError
+from utils.ml_utils import predict_news_stream
+from utils.near_duplicates import MinHasher, lookup_verdict, record_fingerprint
 import os
 from datetime import datetime
 
@@ -15,8 +20,8 @@ def dashboard():
     if current_user.role == 'admin':
         return redirect(url_for('admin.dashboard'))
     
-    # Get user statistics
-    total_submissions = len(current_user.submissions)
+    # Get user statistics from the denormalized counters
+    total_submissions = current_user.get_submission_count()
     fake_count = current_user.get_fake_count()
     real_count = current_user.get_real_count()
     
@@ -45,35 +50,70 @@ def analyze():
                 flash('Please provide both title and content.', 'error')
                 return render_template('user/analyze.html')
             
-            # Redirect to prediction
-            return redirect(url_for('predict.analyze_text', 
-                                  title=title, content=content))
+            # Store the article server-side and hand over only its token
+            token = create_draft(current_user.id, title, content, source_type='text')
+            return redirect(url_for('predict.analyze_text', draft=token))
         
         elif source_type == 'file':
-            if 'file' not in request.files:
+            files = [file for file in request.files.getlist('file') if file.filename]
+            if not files:
                 flash('Please select a file.', 'error')
                 return render_template('user/analyze.html')
             
-            file = request.files['file']
-            if file.filename == '':
-                flash('Please select a file.', 'error')
-                return render_template('user/analyze.html')
-            
-            if not file.filename.lower().endswith('.txt'):
-                flash('Only .txt files are allowed.', 'error')
+            try:
+                articles = plan_upload(files, title=request.form.get('file_title', '').strip())
+            except UploadError as e:
+                flash(str(e), 'error')
                 return render_template('user/analyze.html')
             
-            # Read file content
+            # Score every article straight from its upload stream, chunk by chunk
+            submissions = []
             try:
-                content = file.read().decode('utf-8')
-                title = request.form.get('file_title', '').strip() or \
-                       os.path.splitext(file.filename)[0]
-                
-                return redirect(url_for('predict.analyze_text',
-                                      title=title, content=content))
+                for article in articles:
+                    hasher = MinHasher()
+                    prediction = predict_news_stream(article.iter_text(), return_version=True, also_feed=(hasher,))
+                    
+                    # The signature covers the whole normalized text; None means it has no words
+                    signature = hasher.signature()
+                    if signature is None:
+                        continue
+                    preview = article.preview.strip()
+                    
+                    # Keep near-duplicate copies consistent with the stored verdict
+                    match, verdict = lookup_verdict(signature)
+                    result, confidence, model_version = verdict or prediction
+                    
+                    submission = Submission(
+                        user_id=current_user.id,
+                        article_title=article.title,
+                        article_content=preview,
+                        source_type='file',
+                        result=result,
+                        confidence=confidence,
+                        model_version=model_version
+                    )
+                    db.session.add(submission)
+                    record_fingerprint(submission, signature, match)
+                    submissions.append(submission)
+                db.session.commit()
             except Exception as e:
+                db.session.rollback()
+                print(f"Error analyzing upload: {e}")
                 flash('Error reading file. Please try again.', 'error')
                 return render_template('user/analyze.html')
+            
+            if not submissions:
+                flash('The uploaded files contain no text.', 'error')
+                return render_template('user/analyze.html')
+            
+            if len(articles) == 1:
+                return redirect(url_for('predict.result', submission_id=submissions[0].id))
+            
+            fake = sum(1 for submission in submissions if submission.result == 'FAKE')
+            skipped = len(articles) - len(submissions)
+            flash(f'Analyzed {len(submissions)} articles: {fake} fake, {len(submissions) - fake} real'
+                  + (f' ({skipped} empty files skipped).' if skipped else '.'), 'success')
+            return redirect(url_for('user.history', source='file'))
         
         elif source_type == 'url':
             url = request.form.get('url', '').strip()
@@ -89,7 +129,7 @@ def analyze():
 @user_bp.route('/history')
 @login_required
 def history():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     result_filter = request.args.get('result', '')
     source_filter = request.args.get('source', '')
     
@@ -101,8 +141,15 @@ def history():
     if source_filter:
         query = query.filter(Submission.source_type == source_filter)
     
-    submissions = query.order_by(Submission.timestamp.desc())\
-                      .paginate(page=page, per_page=10, error_out=False)
+    # Approximate total from the user's counters, when the filters allow it
+    total = None
+    if not source_filter:
+        total = {'': current_user.get_submission_count(),
+                 'FAKE': current_user.get_fake_count(),
+                 'REAL': current_user.get_real_count()}.get(result_filter)
+    
+    submissions = keyset_paginate(query, [Submission.timestamp, Submission.id], per_page=10,
+                                  cursor=cursor, total=total)
     
     return render_template('user/history.html', 
                          submissions=submissions,
@@ -0,0 +1,66 @@
+"""
+Maintenance commands, run with the Flask CLI:
+
+    flask --app main reconcile-counters
+    flask --app main backfill-stats
+    flask --app main prune-jobs --days 7
+    flask --app main backfill-fingerprints
+    flask --app main retrain
+"""
+
+import click
+
+
+def register_commands(app):
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters():
+        """Rebuild the per-user submission counters from the submissions table."""
+        from models import reconcile_user_counters
+        corrected = reconcile_user_counters()
+        click.echo(f"Corrected submission counters of {corrected} users.")
+
+    @app.cli.command('backfill-stats')
+    def backfill_stats():
+        """Rebuild the daily submission statistics rollup from the submissions table."""
+        from models import rebuild_submission_stats
+        rows = rebuild_submission_stats()
+        click.echo(f"Rebuilt {rows} daily submission statistics rows.")
+
+    @app.cli.command('prune-jobs')
+    @click.option('--days', default=7, show_default=True, help='Keep finished jobs this many days.')
+    def prune_jobs(days):
+        """Delete finished URL analysis jobs older than --days days."""
+        from utils.job_queue import prune_finished_jobs
+        deleted = prune_finished_jobs(days)
+        click.echo(f"Deleted {deleted} finished analysis jobs.")
+
+    @app.cli.command('backfill-fingerprints')
+    @click.option('--batch-size', default=1000, show_default=True, help='Submissions fingerprinted per transaction.')
+    def backfill_fingerprints(batch_size):
+        """Add near-duplicate fingerprints to submissions stored without one."""
+        from utils.near_duplicates import backfill_fingerprints
+        added = backfill_fingerprints(batch_size)
+        click.echo(f"Fingerprinted {added} submissions.")
+
+    @app.cli.command('retrain')
+    @click.option('--batch-size', default=1000, show_default=True, help='Feedback rows vectorized per step.')
+    @click.option('--epochs', default=1, show_default=True, help='Passes over the new feedback.')
+    @click.option('--export-serving', is_flag=True, help='Also export the hashed serving artifact (serving.pkl).')
+    def retrain(batch_size, epochs, export_serving):
+        """Update the model with the admin feedback added since it was last retrained."""
+        from utils.retraining import retrain_from_feedback
+        try:
+            status = retrain_from_feedback(batch_size=batch_size, epochs=epochs, export_serving=export_serving)
+        except (FileNotFoundError, ValueError) as e:
+            raise click.ClickException(str(e))
+        
+        if status['status'] == 'up_to_date':
+            click.echo(f"No new feedback since checkpoint {status['feedback_checkpoint']}; "
+                       f"model {status['version']} unchanged.")
+            return
+        click.echo(f"Learned from {status['rows']} labels ({status['labels']['FAKE']} fake, "
+                   f"{status['labels']['REAL']} real) out of {status['pending']} new feedback rows "
+                   f"in {status['seconds']:.2f}s.")
+        click.echo(f"Published model {status['version']} (from {status['parent_version']}), "
+                   f"feedback checkpoint {status['feedback_checkpoint']}.")
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration.
+
+Usage:
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is preloaded in the master, which also loads the model (see
+utils.ml_utils). Workers are forked afterwards and share the model's
+memory-mapped arrays and the rest of the master's heap copy-on-write
+instead of each deserializing their own copy.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+preload_app = True
+
+
+def on_starting(server):
+    # Counters restart with the deployment; drop the metric files of old workers
+    from utils.metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation so that
+    # garbage collections in the workers don't write to (and unshare) the
+    # pages holding the model and the imported modules
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Database connections opened while preloading belong to the master
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,3 +1,10 @@
+import os
+
+if __name__ == '__main__':
+    # The development server processes URL analysis jobs in its own threads
+    # unless told otherwise; deployments run worker.py (see INSTALLATION.md)
+    os.environ.setdefault('JOB_INLINE_THREADS', '2')
+
 from app import app
 
 if __name__ == '__main__':
@@ -0,0 +1,189 @@
+"""
+Additive schema upgrades for databases created by older versions of the app.
+
+db.create_all() creates missing tables but never alters existing ones, so
+columns added to existing models are listed here and added on startup.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select, text
+
+# (table, column, column DDL) added after the table was first released
+ADDED_COLUMNS = [
+    ('submissions', 'model_version', 'VARCHAR(64)'),
+    ('submissions', 'feedback_label', 'VARCHAR(10)'),
+    ('users', 'submission_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('users', 'fake_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('users', 'real_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('analysis_jobs', 'run_after', 'TIMESTAMP'),
+]
+
+
+def _backfill_user_counters(db):
+    from models import reconcile_user_counters
+    corrected = reconcile_user_counters()
+    logging.info(f"Backfilled submission counters of {corrected} users")
+
+
+def _backfill_submission_stats(db):
+    from models import rebuild_submission_stats
+    rows = rebuild_submission_stats()
+    logging.info(f"Backfilled {rows} daily submission statistics rows")
+
+
+# Run once, right after the column they fill has been added
+BACKFILLS = {
+    ('users', 'submission_count'): _backfill_user_counters,
+}
+
+# (derived table, source table, backfill): filled when the derived table is
+# empty but its source is not, i.e. right after create_all() created it
+DERIVED_TABLES = [
+    ('submission_daily_stats', 'submissions', _backfill_submission_stats),
+]
+
+
+# Timestamps that keyset pagination orders by: its (timestamp, id) < cursor
+# comparison never matches NULL, so rows without one would drop out of the
+# listings. Older versions declared them nullable.
+NOT_NULL_TIMESTAMPS = [
+    ('submissions', 'timestamp'),
+    ('users', 'created_at'),
+]
+
+
+def backfill_null_timestamps(db):
+    """Fill NULL NOT_NULL_TIMESTAMPS and, on PostgreSQL, add the NOT NULL constraint.
+
+    Ids are assigned in insert order, so a missing time is approximated by
+    that of the closest earlier row. Returns the tables that had NULLs.
+    """
+    backfilled = []
+    for table_name, column_name in NOT_NULL_TIMESTAMPS:
+        table = db.metadata.tables[table_name]
+        column = table.c[column_name]
+        earlier = table.alias('earlier')
+        previous_time = select(func.max(earlier.c[column_name])).where(earlier.c.id < table.c.id).scalar_subquery()
+
+        with db.engine.begin() as connection:
+            filled = connection.execute(
+                table.update().where(column.is_(None))
+                .values({column_name: func.coalesce(previous_time, datetime.utcnow())})
+            ).rowcount
+        if filled:
+            logging.info(f"Backfilled {filled} NULL values of {table_name}.{column_name}")
+            backfilled.append(table_name)
+
+        # SQLite cannot add a constraint to an existing column; the model's
+        # nullable=False and default cover the rows inserted from now on
+        if db.engine.dialect.name == 'postgresql':
+            nullable = {c['name']: c['nullable'] for c in inspect(db.engine).get_columns(table_name)}
+            if nullable.get(column_name):
+                quoted = db.engine.dialect.identifier_preparer.quote(column_name)
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN {quoted} SET NOT NULL'))
+    return backfilled
+
+
+def missing_columns(db):
+    inspector = inspect(db.engine)
+    existing = {}
+    missing = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if table not in existing:
+            existing[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column not in existing[table]:
+            missing.append((table, column, ddl))
+    return missing
+
+
+def upgrade_schema(db):
+    """Add any columns from ADDED_COLUMNS that the database does not have yet"""
+    added = []
+    for table, column, ddl in missing_columns(db):
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            logging.info(f"Added column {table}.{column}")
+            added.append((table, column))
+        except Exception as e:
+            # Another process may have added it concurrently
+            if (table, column, ddl) in missing_columns(db):
+                raise
+            logging.info(f"Column {table}.{column} already added: {e}")
+    
+    for key in added:
+        if key in BACKFILLS:
+            BACKFILLS[key](db)
+    
+    backfilled = backfill_null_timestamps(db)
+    
+    for table, source, backfill in DERIVED_TABLES:
+        # Also rebuilt when the timestamps it is derived from were just filled
+        if (is_empty(db, table) or source in backfilled) and not is_empty(db, source):
+            backfill(db)
+    
+    create_missing_indexes(db)
+    create_user_search_index(db)
+    return added
+
+
+def is_empty(db, table):
+    with db.engine.connect() as connection:
+        return connection.execute(text(f'SELECT 1 FROM {table} LIMIT 1')).first() is None
+
+
+def create_missing_indexes(db):
+    """Create indexes declared on the models that existing tables lack"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+# Trigram FTS5 index kept in sync with users.name/email by triggers
+SQLITE_USER_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE users_fts USING fts5(
+        name, email, content='users', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END""",
+    """CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+    END""",
+    """CREATE TRIGGER users_fts_update AFTER UPDATE OF name, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+        INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END""",
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_USER_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+]
+
+
+def create_user_search_index(db):
+    """Index users.name/email for substring search (SQLite FTS5 trigram or pg_trgm)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        if inspect(db.engine).has_table('users_fts'):
+            return
+        statements = SQLITE_USER_SEARCH_DDL
+    elif dialect == 'postgresql':
+        statements = POSTGRESQL_USER_SEARCH_DDL
+    else:
+        return
+
+    try:
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    except Exception as e:
+        # e.g. SQLite without FTS5/trigram (< 3.34) or no rights to add pg_trgm;
+        # user search then falls back to LIKE scans
+        logging.warning(f"User search index not created: {e}")
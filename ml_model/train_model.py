@@ -1,27 +1,55 @@
 """
 Training script for the fake news detection model.
 This script creates and saves a TF-IDF + Logistic Regression model.
+
+With --data it instead trains out of core on labeled CSV, Parquet or JSONL
+shards: rows are read chunk by chunk, normalized and hashed in parallel
+worker processes (HashingVectorizer is stateless, so nothing has to be
+fitted first), and fed to SGDClassifier.partial_fit in order. Memory is
+bounded by the chunk size and the number of chunks in flight, not by the
+size of the corpus.
 """
 
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score, classification_report
-import joblib
+from joblib import effective_n_jobs
+from scipy import sparse
+import argparse
+import glob
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import os
-import re
+import random
+import sys
+import time
+import zlib
+from datetime import datetime
+
+# Share the text normalizer with the serving code in utils/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.text_normalizer import normalize_text
+from utils.model_io import new_version, publish_artifact
+from utils.hashed_model import build_artifact, HashedLinearModel, HashedVectorizer
+
+# Label spellings accepted in training data (0 = fake, 1 = real)
+LABEL_VALUES = {'0': 0, 'fake': 0, 'false': 0, '1': 1, 'real': 1, 'true': 1}
+
+SHARD_FORMATS = {
+    '.csv': 'csv', '.csv.gz': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.jsonl': 'jsonl', '.jsonl.gz': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'
+}
 
 def preprocess_text(text):
     """Clean and preprocess text"""
     if pd.isna(text):
         return ""
     
-    text = str(text).lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    text = ' '.join(text.split())
-    return text
+    return normalize_text(str(text))
 
 def create_sample_dataset():
     """Create a sample dataset for training"""
@@ -59,7 +87,46 @@ def create_sample_dataset():
     
     return texts, labels
 
-def train_model():
+def export_serving_artifact(model, vectorizer, texts, model_dir, n_features=None, version=None):
+    """Export the hashed serving artifact and print an accuracy-parity report"""
+    artifact, collisions = build_artifact(model, vectorizer, n_features)
+    artifact['version'] = version or new_version()
+    
+    serving_path = os.path.join(model_dir, 'serving.pkl')
+    publish_artifact(artifact, serving_path)
+    
+    hashed_model = HashedLinearModel(artifact)
+    hashed_vectorizer = HashedVectorizer(artifact)
+    
+    # Compare both pipelines document by document
+    started = time.perf_counter()
+    reference = np.vstack([model.predict_proba(vectorizer.transform([text])) for text in texts])
+    reference_ms = (time.perf_counter() - started) * 1000 / len(texts)
+    
+    started = time.perf_counter()
+    served = np.vstack([hashed_model.predict_proba(hashed_vectorizer.transform([text])) for text in texts])
+    served_ms = (time.perf_counter() - started) * 1000 / len(texts)
+    
+    agreement = np.mean(reference.argmax(axis=1) == served.argmax(axis=1))
+    difference = np.abs(reference[:, 1] - served[:, 1])
+    
+    print("\nServing artifact parity report:")
+    print(f"  Vocabulary terms:        {len(vectorizer.vocabulary_)}")
+    print(f"  Hashed features:         {artifact['n_features']}")
+    print(f"  Probed (collided) terms: {collisions}")
+    print(f"  Documents compared:      {len(texts)}")
+    print(f"  Label agreement:         {agreement:.2%}")
+    print(f"  Max |P(real)| diff:      {difference.max():.6f}")
+    print(f"  Mean |P(real)| diff:     {difference.mean():.6f}")
+    print(f"  sklearn ms/document:     {reference_ms:.3f}")
+    print(f"  hashed ms/document:      {served_ms:.3f}")
+    print(f"  model.pkl size:          {os.path.getsize(os.path.join(model_dir, 'model.pkl')) / 1024:.1f} KiB")
+    print(f"  serving.pkl size:        {os.path.getsize(serving_path) / 1024:.1f} KiB")
+    print(f"Serving artifact saved to: {serving_path}")
+    
+    return serving_path
+
+def train_model(export_serving=False, hash_features=None, model_dir=None):
     """Train and save the fake news detection model"""
     print("Creating sample dataset...")
     texts, labels = create_sample_dataset()
@@ -105,18 +172,274 @@ def train_model():
     print("Saving model...")
     model_data = {
         'model': model,
-        'vectorizer': vectorizer
+        'vectorizer': vectorizer,
+        'version': new_version(),
+        'trained_at': datetime.utcnow().isoformat()
     }
     
     # Create model directory if it doesn't exist
-    model_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = model_dir or os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(model_dir, exist_ok=True)
+    
+    model_path = os.path.join(model_dir, 'model.pkl')
+    # Renamed into place so that workers with the old file mapped are
+    # unaffected; running servers pick the new version up on their own
+    archive_path = publish_artifact(model_data, model_path)
+    
+    print(f"Model version {model_data['version']} saved to: {model_path}")
+    print(f"Archived as: {archive_path}")
+    
+    if export_serving:
+        export_serving_artifact(model, vectorizer, processed_texts, model_dir, hash_features,
+                                version=model_data['version'])
+    
+    return model, vectorizer
+
+def shard_format(path):
+    """Format of a shard from its extension, or None if it is not a data file"""
+    lowered = path.lower()
+    for extension, shard_type in SHARD_FORMATS.items():
+        if lowered.endswith(extension):
+            return shard_type
+    return None
+
+def list_shards(paths):
+    """Expand files, directories and glob patterns into a sorted list of shard files"""
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = [os.path.join(path, name) for name in os.listdir(path)]
+        else:
+            candidates = glob.glob(path) or [path]
+        for candidate in sorted(candidates):
+            if os.path.isfile(candidate) and shard_format(candidate):
+                shards.append(candidate)
+            elif not os.path.isdir(path):
+                raise ValueError(f"Not a CSV, Parquet or JSONL file: {candidate}")
+    if not shards:
+        raise ValueError(f"No training shards found in: {', '.join(paths)}")
+    return shards
+
+def iter_chunks(path, columns, chunk_size):
+    """Read a shard as DataFrames of at most ``chunk_size`` rows holding ``columns``"""
+    shard_type = shard_format(path)
+    
+    if shard_type == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif shard_type == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+    else:
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_size):
+            missing = set(columns) - set(chunk.columns)
+            if missing:
+                raise ValueError(f"{path} has no column(s) {', '.join(sorted(missing))}")
+            yield chunk[columns]
+
+def encode_labels(values):
+    """Map a label column to 1 (real), 0 (fake) or -1 (unrecognized)"""
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        codes = values.astype(float)
+        codes = codes.where(codes.isin([0, 1]))
+    else:
+        codes = values.astype(str).str.strip().str.lower().map(LABEL_VALUES)
+    return codes.fillna(-1).astype(np.int8).to_numpy()
+
+def vectorize_chunk(texts, labels, vectorizer, test_size):
+    """Normalize and hash one chunk; runs in a worker process.
+    
+    Rows are assigned to the held-out set by a hash of their normalized
+    text, so the split is the same in every epoch and exact duplicates
+    never end up on both sides.
+    """
+    texts = [preprocess_text(text) for text in texts]
+    keep = np.array([label >= 0 and bool(text) for text, label in zip(texts, labels)], dtype=bool)
+    texts = [text for text, kept in zip(texts, keep) if kept]
+    labels = labels[keep]
+    dropped = len(keep) - int(keep.sum())
+    
+    held_out = np.array([zlib.crc32(text.encode('utf-8')) % 1000 < test_size * 1000 for text in texts], dtype=bool)
+    X = vectorizer.transform(texts) if texts else sparse.csr_matrix((0, vectorizer.n_features))
+    return X[~held_out], labels[~held_out], X[held_out], labels[held_out], dropped
+
+def iter_training_chunks(shards, columns, chunk_size, text_column, label_column, title_column=None):
+    """(texts, labels) per chunk of every shard, in order"""
+    for path in shards:
+        for chunk in iter_chunks(path, columns, chunk_size):
+            texts = chunk[text_column].fillna('').astype(str)
+            if title_column:
+                texts = chunk[title_column].fillna('').astype(str) + '\n' + texts
+            yield texts.tolist(), encode_labels(chunk[label_column])
+
+def iter_vectorized(chunks, vectorizer, test_size, executor=None, max_in_flight=1):
+    """vectorize_chunk results of ``chunks``, in order.
+    
+    With an executor, at most ``max_in_flight`` chunks are submitted and not
+    yet consumed: the next chunk is only submitted once the caller has taken
+    the oldest result, so hashed matrices never pile up when training is
+    slower than hashing.
+    """
+    if executor is None:
+        for texts, labels in chunks:
+            yield vectorize_chunk(texts, labels, vectorizer, test_size)
+        return
+    
+    pending = deque()
+    try:
+        for texts, labels in chunks:
+            pending.append(executor.submit(vectorize_chunk, texts, labels, vectorizer, test_size))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def train_streaming(paths, text_column='text', label_column='label', title_column=None,
+                    chunk_size=10000, n_jobs=-1, epochs=1, n_features=2 ** 20,
+                    test_size=0.2, max_test_rows=20000, alpha=1e-5, model_dir=None):
+    """Train a HashingVectorizer + SGDClassifier model out of core and save it as model.pkl"""
+    shards = list_shards(paths)
+    columns = [column for column in (title_column, text_column, label_column) if column]
+    print(f"Training on {len(shards)} shard(s) in chunks of {chunk_size} rows")
+    
+    vectorizer = HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm='l2',
+        dtype=np.float32
+    )
+    model = SGDClassifier(loss='log_loss', alpha=alpha, random_state=42)
+    classes = np.array([0, 1])
+    
+    test_X, test_y = [], []
+    test_rows = 0
+    stats = {'rows': 0, 'trained': 0, 'held_out': 0, 'dropped': 0, 'chunks': 0}
+    progressive_correct = progressive_seen = 0
+    started = time.perf_counter()
+    
+    # Each chunk is preprocessed in a worker process while the main process
+    # trains on the previous ones; at most 2 * workers chunks are in flight
+    workers = effective_n_jobs(n_jobs)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for epoch in range(epochs):
+            epoch_shards = list(shards)
+            if epoch:
+                random.Random(epoch).shuffle(epoch_shards)
+            
+            chunks = iter_training_chunks(epoch_shards, columns, chunk_size, text_column, label_column, title_column)
+            results = iter_vectorized(chunks, vectorizer, test_size, executor, max_in_flight=2 * workers)
+            
+            for X_train, y_train, X_test, y_test, dropped in results:
+                if epoch == 0:
+                    stats['rows'] += X_train.shape[0] + X_test.shape[0] + dropped
+                    stats['dropped'] += dropped
+                    stats['held_out'] += X_test.shape[0]
+                    if test_rows < max_test_rows and X_test.shape[0]:
+                        X_test, y_test = X_test[:max_test_rows - test_rows], y_test[:max_test_rows - test_rows]
+                        test_X.append(X_test)
+                        test_y.append(y_test)
+                        test_rows += X_test.shape[0]
+                
+                if not X_train.shape[0]:
+                    continue
+                
+                # Progressive validation: score each chunk before learning from it
+                if epoch == 0 and stats['chunks']:
+                    progressive_correct += int((model.predict(X_train) == y_train).sum())
+                    progressive_seen += X_train.shape[0]
+                
+                model.partial_fit(X_train, y_train, classes=classes)
+                stats['trained'] += X_train.shape[0]
+                stats['chunks'] += 1
+                
+                elapsed = time.perf_counter() - started
+                print(f"  epoch {epoch + 1}/{epochs}: {stats['trained']} rows trained "
+                      f"({stats['trained'] / elapsed:.0f} rows/s)", end='\r', flush=True)
+            print()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    
+    if not stats['trained']:
+        raise ValueError("No labeled rows to train on")
+    
+    elapsed = time.perf_counter() - started
+    stats.update(seconds=round(elapsed, 3), epochs=epochs, n_jobs=n_jobs, chunk_size=chunk_size, shards=len(shards))
+    print(f"Read {stats['rows']} rows: {stats['trained'] // epochs} trained, {stats['held_out']} held out, "
+          f"{stats['dropped']} dropped (empty text or unrecognized label) in {elapsed:.1f}s")
+    if progressive_seen:
+        stats['progressive_accuracy'] = progressive_correct / progressive_seen
+        print(f"Progressive validation accuracy (first epoch): {stats['progressive_accuracy']:.4f}")
+    
+    if test_rows:
+        X_test = sparse.vstack(test_X)
+        y_test = np.concatenate(test_y)
+        y_pred = model.predict(X_test)
+        stats['accuracy'] = accuracy_score(y_test, y_pred)
+        print(f"Held-out accuracy on {test_rows} rows: {stats['accuracy']:.4f}")
+        print("\nClassification Report:")
+        print(classification_report(y_test, y_pred, labels=[0, 1], target_names=['Fake', 'Real'], zero_division=0))
+    
+    print("Saving model...")
+    model_data = {
+        'model': model,
+        'vectorizer': vectorizer,
+        'version': new_version(),
+        'trained_at': datetime.utcnow().isoformat(),
+        'training': stats
+    }
+    
+    model_dir = model_dir or os.path.dirname(os.path.abspath(__file__))
     os.makedirs(model_dir, exist_ok=True)
     
     model_path = os.path.join(model_dir, 'model.pkl')
-    joblib.dump(model_data, model_path)
+    archive_path = publish_artifact(model_data, model_path)
+    
+    print(f"Model version {model_data['version']} saved to: {model_path}")
+    print(f"Archived as: {archive_path}")
     
-    print(f"Model saved to: {model_path}")
     return model, vectorizer
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description='Train the fake news detection model')
+    parser.add_argument('--export-serving', action='store_true',
+                        help='also export the compact hashed serving artifact (serving.pkl)')
+    parser.add_argument('--hash-features', type=int, default=None,
+                        help='size of the hashed feature space of the serving artifact '
+                             '(default: picked from the vocabulary size)')
+    parser.add_argument('--model-dir', default=None,
+                        help='directory the model is written to (default: ml_model/)')
+    
+    streaming = parser.add_argument_group('streaming training (--data)')
+    streaming.add_argument('--data', nargs='+', metavar='PATH',
+                           help='train out of core on CSV, Parquet or JSONL shards (files, directories or globs)')
+    streaming.add_argument('--text-column', default='text', help='column holding the article text')
+    streaming.add_argument('--title-column', default=None, help='optional column prepended to the text')
+    streaming.add_argument('--label-column', default='label',
+                           help='column holding the label: 0/1, fake/real or false/true')
+    streaming.add_argument('--chunk-size', type=int, default=10000, help='rows read and hashed per chunk')
+    streaming.add_argument('--jobs', type=int, default=-1, help='preprocessing worker processes (-1: all cores)')
+    streaming.add_argument('--epochs', type=int, default=1, help='passes over the data')
+    streaming.add_argument('--n-features', type=int, default=2 ** 20, help='size of the hashed feature space')
+    streaming.add_argument('--test-size', type=float, default=0.2, help='fraction of rows held out')
+    streaming.add_argument('--max-test-rows', type=int, default=20000,
+                           help='held-out rows kept in memory for the final evaluation')
+    streaming.add_argument('--alpha', type=float, default=1e-5, help='SGDClassifier regularization strength')
+    args = parser.parse_args()
+    
+    if args.data:
+        if args.export_serving:
+            parser.error('--export-serving needs the TF-IDF model; a streaming model is already hashed '
+                         'and is served with MODEL_BACKEND=sklearn')
+        train_streaming(args.data, text_column=args.text_column, label_column=args.label_column,
+                        title_column=args.title_column, chunk_size=args.chunk_size, n_jobs=args.jobs,
+                        epochs=args.epochs, n_features=args.n_features, test_size=args.test_size,
+                        max_test_rows=args.max_test_rows, alpha=args.alpha, model_dir=args.model_dir)
+    else:
+        train_model(export_serving=args.export_serving, hash_features=args.hash_features, model_dir=args.model_dir)
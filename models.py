@@ -1,10 +1,24 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import case, event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app import db
 
+# Dialect INSERTs supporting ON CONFLICT DO UPDATE, used for rollup upserts
+UPSERT_INSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # admin.users and admin.dashboard: role (+ status), newest first
+        db.Index('ix_users_role_created_at', 'role', 'created_at', 'id'),
+        db.Index('ix_users_role_status_created_at', 'role', 'status', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -13,25 +27,43 @@ class User(UserMixin, db.Model):
     role = db.Column(db.String(20), default='user')  # 'user' or 'admin'
     status = db.Column(db.String(20), default='active')  # 'active' or 'blocked'
     avatar = db.Column(db.String(200), default='')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Paginated on, like timestamp
+    
+    # Denormalized submission counters, kept in sync by the Submission
+    # insert/update/delete listeners below
+    submission_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    fake_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    real_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationship with submissions
     submissions = db.relationship('Submission', backref='user', lazy=True, cascade='all, delete-orphan')
+    analysis_jobs = db.relationship('AnalysisJob', backref='user', lazy=True, cascade='all, delete-orphan')
+    drafts = db.relationship('AnalysisDraft', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Deleting an admin keeps their labels, without the author
+    feedback_given = db.relationship('SubmissionFeedback', backref='admin', lazy=True)
     
     def __repr__(self):
         return f'<User {self.email}>'
     
     def get_submission_count(self):
-        return len(self.submissions)
+        return self.submission_count or 0
     
     def get_fake_count(self):
-        return len([s for s in self.submissions if s.result == 'FAKE'])
+        return self.fake_count or 0
     
     def get_real_count(self):
-        return len([s for s in self.submissions if s.result == 'REAL'])
+        return self.real_count or 0
 
 class Submission(db.Model):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        # Listings filter on one of these columns and order by timestamp DESC;
+        # id breaks timestamp ties so the index also serves cursor pagination
+        db.Index('ix_submissions_user_id_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_submissions_result_timestamp', 'result', 'timestamp', 'id'),
+        db.Index('ix_submissions_source_type_timestamp', 'source_type', 'timestamp', 'id'),
+        db.Index('ix_submissions_timestamp', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -41,7 +73,331 @@ class Submission(db.Model):
     source_url = db.Column(db.String(500), nullable=True)
     result = db.Column(db.String(10), nullable=False)  # 'FAKE' or 'REAL'
     confidence = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    model_version = db.Column(db.String(64), nullable=True)  # Model that produced the result
+    feedback_label = db.Column(db.String(10), nullable=True)  # Latest admin label, 'FAKE' or 'REAL'
+    # Never NULL: keyset pagination on (timestamp, id) would skip the row
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Near-duplicate signature and admin feedback; their rows are deleted by
+    # the before_delete listener below
+    fingerprint = db.relationship('SubmissionFingerprint', uselist=False, viewonly=True)
     
     def __repr__(self):
         return f'<Submission {self.id}: {self.result}>'
+
+class SubmissionDailyStat(db.Model):
+    """Submission counts per day, result and source type.
+    
+    Maintained incrementally by the Submission listeners below so that the
+    admin dashboard never has to scan the submissions table.
+    """
+    __tablename__ = 'submission_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    result = db.Column(db.String(10), primary_key=True)
+    source_type = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SubmissionDailyStat {self.day} {self.result} {self.source_type}: {self.count}>'
+
+class SubmissionFingerprint(db.Model):
+    """MinHash signature of a submission's normalized text (see utils.near_duplicates).
+    
+    Submissions whose signatures are similar enough share a cluster_id, the
+    id of the cluster's first submission.
+    """
+    __tablename__ = 'submission_fingerprints'
+    
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    cluster_id = db.Column(db.Integer, nullable=False, index=True)
+    duplicate_of = db.Column(db.Integer, nullable=True)  # Most similar earlier submission, if any
+    similarity = db.Column(db.Float, nullable=True)  # Estimated Jaccard similarity to duplicate_of
+    
+    def __repr__(self):
+        return f'<SubmissionFingerprint {self.submission_id}: cluster {self.cluster_id}>'
+
+class SubmissionLshBucket(db.Model):
+    """One LSH band of a submission's signature; similar articles share buckets"""
+    __tablename__ = 'submission_lsh_buckets'
+    
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), primary_key=True)
+    
+    def __repr__(self):
+        return f'<SubmissionLshBucket {self.band}:{self.bucket} -> {self.submission_id}>'
+
+class SubmissionFeedback(db.Model):
+    """An admin's confirmation or correction of a submission's verdict.
+    
+    Rows are only ever appended, through utils.retraining.record_feedback,
+    which makes them commit in id order. Incremental retraining learns from
+    those with an id above the checkpoint recorded in the model artifact;
+    the latest label is also kept on the submission.
+    """
+    __tablename__ = 'submission_feedback'
+    __table_args__ = (
+        # Retraining skips labels superseded by a newer one for the same submission
+        db.Index('ix_submission_feedback_submission_id_id', 'submission_id', 'id'),
+        # Ids must never be reused once the newest rows are deleted, or new
+        # labels could fall below a checkpoint (PostgreSQL sequences never reuse)
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
+    label = db.Column(db.String(10), nullable=False)  # 'FAKE' or 'REAL'
+    admin_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SubmissionFeedback {self.id}: {self.submission_id} -> {self.label}>'
+
+class AnalysisJob(db.Model):
+    """A URL analysis queued by the web app and processed by worker.py.
+    
+    Jobs move from 'queued' to 'running' when a worker claims them, then to
+    'done' (with the resulting submission) or 'failed'.
+    """
+    __tablename__ = 'analysis_jobs'
+    __table_args__ = (
+        # Workers claim the oldest queued job; stats count jobs per status
+        db.Index('ix_analysis_jobs_status_created_at', 'status', 'created_at', 'id'),
+        # Latency metrics read the most recently finished jobs
+        db.Index('ix_analysis_jobs_finished_at', 'finished_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500), nullable=True)
+    worker = db.Column(db.String(100), nullable=True)  # host:pid:thread of the claiming worker
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=True)  # Not claimed before this time (retry backoff)
+    
+    submission = db.relationship('Submission')
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id}: {self.status}>'
+
+class AnalysisDraft(db.Model):
+    """Article text posted to user.analyze, waiting to be analyzed.
+    
+    The form handler stores the content once and redirects with only the
+    token; predict.analyze_text consumes (deletes) the draft.
+    """
+    __tablename__ = 'analysis_drafts'
+    
+    token = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    source_type = db.Column(db.String(20), nullable=False)  # 'text' or 'file'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<AnalysisDraft {self.token}>'
+
+def _apply_counter_delta(connection, user_id, result, sign):
+    """Add ``sign`` to the owner's counters in the flush's own transaction"""
+    users = User.__table__
+    values = {'submission_count': users.c.submission_count + sign}
+    if result == 'FAKE':
+        values['fake_count'] = users.c.fake_count + sign
+    elif result == 'REAL':
+        values['real_count'] = users.c.real_count + sign
+    connection.execute(users.update().where(users.c.id == user_id).values(values))
+
+def _apply_rollup_delta(connection, timestamp, result, source_type, sign):
+    """Add ``sign`` to the matching daily rollup row, creating it if needed"""
+    stats = SubmissionDailyStat.__table__
+    key = {
+        'day': timestamp.date(),
+        'result': result,
+        'source_type': source_type,
+    }
+    
+    if sign > 0 and connection.dialect.name in UPSERT_INSERTS:
+        # Single-statement upsert, safe against concurrent inserts of the same key
+        statement = UPSERT_INSERTS[connection.dialect.name](stats).values(count=sign, **key)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[stats.c.day, stats.c.result, stats.c.source_type],
+            set_={'count': stats.c.count + sign}
+        ))
+        return
+    
+    updated = connection.execute(
+        stats.update()
+        .where(stats.c.day == key['day'], stats.c.result == result, stats.c.source_type == source_type)
+        .values(count=stats.c.count + sign)
+    ).rowcount
+    if not updated and sign > 0:
+        connection.execute(stats.insert().values(count=sign, **key))
+
+@event.listens_for(Submission, 'before_insert')
+def _stamp_submission(mapper, connection, target):
+    # A submission is bucketed by its insert time, both by the listeners and by
+    # rebuild_submission_stats, so it must carry that time (also when None was
+    # set explicitly, which overrides the column default)
+    if target.timestamp is None:
+        target.timestamp = datetime.utcnow()
+
+@event.listens_for(Submission, 'after_insert')
+def _count_inserted_submission(mapper, connection, target):
+    _apply_counter_delta(connection, target.user_id, target.result, 1)
+    _apply_rollup_delta(connection, target.timestamp, target.result, target.source_type, 1)
+
+@event.listens_for(Submission, 'before_delete')
+def _delete_submission_dependents(mapper, connection, target):
+    # Before the submission row goes, so foreign keys stay satisfied
+    for table in (SubmissionLshBucket.__table__, SubmissionFingerprint.__table__, SubmissionFeedback.__table__):
+        connection.execute(table.delete().where(table.c.submission_id == target.id))
+
+@event.listens_for(Submission, 'after_delete')
+def _count_deleted_submission(mapper, connection, target):
+    _apply_counter_delta(connection, target.user_id, target.result, -1)
+    _apply_rollup_delta(connection, target.timestamp, target.result, target.source_type, -1)
+
+@event.listens_for(Submission, 'after_update')
+def _count_updated_submission(mapper, connection, target):
+    state = inspect(target)
+    
+    def previous(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(target, name)
+    
+    def changed(*names):
+        return any(state.attrs[name].history.has_changes() for name in names)
+    
+    if changed('user_id', 'result'):
+        _apply_counter_delta(connection, previous('user_id'), previous('result'), -1)
+        _apply_counter_delta(connection, target.user_id, target.result, 1)
+    
+    if changed('timestamp', 'result', 'source_type'):
+        _apply_rollup_delta(connection, previous('timestamp'), previous('result'), previous('source_type'), -1)
+        _apply_rollup_delta(connection, target.timestamp, target.result, target.source_type, 1)
+
+def reconcile_user_counters():
+    """Recompute every user's counters from the submissions table.
+    
+    The listeners above do not see bulk query.update()/query.delete() calls;
+    this rebuilds the counters after such changes. Returns the number of
+    users whose counters were corrected.
+    """
+    users = User.__table__
+    submissions = Submission.__table__
+    
+    # One pass over submissions grouped by user, rather than correlated
+    # per-user subqueries
+    totals = select(
+        submissions.c.user_id,
+        func.count().label('total'),
+        func.sum(case((submissions.c.result == 'FAKE', 1), else_=0)).label('fake'),
+        func.sum(case((submissions.c.result == 'REAL', 1), else_=0)).label('real')
+    ).group_by(submissions.c.user_id).subquery()
+    
+    corrected = db.session.execute(
+        users.update()
+        .where(users.c.id == totals.c.user_id)
+        .where((users.c.submission_count != totals.c.total) |
+               (users.c.fake_count != totals.c.fake) |
+               (users.c.real_count != totals.c.real))
+        .values(submission_count=totals.c.total, fake_count=totals.c.fake, real_count=totals.c.real)
+    ).rowcount
+    
+    # Users left without any submissions
+    has_submissions = select(submissions.c.id).where(submissions.c.user_id == users.c.id).exists()
+    corrected += db.session.execute(
+        users.update()
+        .where(~has_submissions)
+        .where((users.c.submission_count != 0) | (users.c.fake_count != 0) | (users.c.real_count != 0))
+        .values(submission_count=0, fake_count=0, real_count=0)
+    ).rowcount
+    db.session.commit()
+    return corrected
+
+def rebuild_submission_stats():
+    """Rebuild the daily rollup from the submissions table; returns the number of rows.
+    
+    Every submission has a timestamp (_stamp_submission, and migrations.py
+    for older rows), so the rollup and the table always count the same rows.
+    """
+    stats = SubmissionDailyStat.__table__
+    submissions = Submission.__table__
+    day = func.date(submissions.c.timestamp)
+    
+    db.session.execute(stats.delete())
+    db.session.execute(stats.insert().from_select(
+        ['day', 'result', 'source_type', 'count'],
+        select(day, submissions.c.result, submissions.c.source_type, func.count())
+        .group_by(day, submissions.c.result, submissions.c.source_type)
+    ))
+    rows = db.session.query(func.count()).select_from(stats).scalar()
+    db.session.commit()
+    return rows
+
+# Trigram full-text index over users.name/email, created by migrations.py
+# on SQLite builds with FTS5. Trigram queries need at least three characters.
+USER_SEARCH_FTS_TABLE = 'users_fts'
+USER_SEARCH_MIN_FTS_LENGTH = 3
+
+_user_search_fts = {}
+
+def has_user_search_fts():
+    """Whether the users FTS table exists in the current database"""
+    url = str(db.engine.url)
+    if url not in _user_search_fts:
+        _user_search_fts[url] = inspect(db.engine).has_table(USER_SEARCH_FTS_TABLE)
+    return _user_search_fts[url]
+
+def user_search_condition(search):
+    """Filter for users whose name or email contains ``search``.
+    
+    Uses the trigram FTS index when available; otherwise a LIKE scan, which
+    PostgreSQL serves from the pg_trgm indexes created by migrations.py.
+    """
+    if len(search) >= USER_SEARCH_MIN_FTS_LENGTH and has_user_search_fts():
+        # A quoted FTS5 string is matched as a substring by the trigram tokenizer
+        phrase = '"' + search.replace('"', '""') + '"'
+        return User.id.in_(
+            select(text('rowid')).select_from(text(USER_SEARCH_FTS_TABLE))
+            .where(text(f'{USER_SEARCH_FTS_TABLE} MATCH :user_search').bindparams(user_search=phrase))
+        )
+    return User.name.contains(search) | User.email.contains(search)
+
+def get_submission_totals():
+    """Total submissions per result, read from the daily rollup"""
+    rows = db.session.query(SubmissionDailyStat.result, func.sum(SubmissionDailyStat.count))\
+                     .group_by(SubmissionDailyStat.result).all()
+    return {result: int(total or 0) for result, total in rows}
+
+def count_submissions(result=None, source_type=None):
+    """Number of submissions matching the filters, read from the daily rollup"""
+    query = db.session.query(func.coalesce(func.sum(SubmissionDailyStat.count), 0))
+    if result:
+        query = query.filter(SubmissionDailyStat.result == result)
+    if source_type:
+        query = query.filter(SubmissionDailyStat.source_type == source_type)
+    return int(query.scalar())
+
+def get_monthly_stats():
+    """Per-month ('YYYY-MM') total, fake and real counts, read from the daily rollup"""
+    rows = db.session.query(SubmissionDailyStat.day, SubmissionDailyStat.result,
+                            func.sum(SubmissionDailyStat.count))\
+                     .group_by(SubmissionDailyStat.day, SubmissionDailyStat.result)\
+                     .order_by(SubmissionDailyStat.day).all()
+    
+    months = {}
+    for day, result, total in rows:
+        month = months.setdefault(day.strftime('%Y-%m'), {'total': 0, 'fake': 0, 'real': 0})
+        month['total'] += int(total or 0)
+        if result in ('FAKE', 'REAL'):
+            month[result.lower()] += int(total or 0)
+    return [dict(month=month, **counts) for month, counts in months.items() if counts['total']]
@@ -0,0 +1,75 @@
+"""
+Shared fixtures.
+
+The app module builds its app at import time from the environment, so the
+test database and the disabled caches are configured here before anything
+imports it. Every test starts from empty tables (the seeded admin user
+excepted).
+"""
+
+import os
+import tempfile
+
+import pytest
+
+_tmp_dir = tempfile.mkdtemp(prefix='fakenews-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'test.db')
+os.environ['MODEL_DIR'] = os.path.join(_tmp_dir, 'model')
+os.environ['MODEL_WATCH_INTERVAL'] = '0'
+os.environ['URL_CACHE_DB'] = ''
+os.environ['PREDICTION_CACHE_DB'] = ''
+os.environ['JOB_INLINE_THREADS'] = '0'
+os.environ['PROFILE_DIR'] = os.path.join(_tmp_dir, 'profiles')
+
+ADMIN_EMAIL = 'admin@fakenews.com'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """The database, inside an app context, emptied before the test"""
+    from app import db
+    from models import User
+
+    with app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name != User.__tablename__:
+                db.session.execute(table.delete())
+        db.session.execute(User.__table__.delete().where(User.email != ADMIN_EMAIL))
+        db.session.commit()
+        yield db
+        db.session.rollback()
+
+
+@pytest.fixture
+def user(db):
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    user = User(name='Reader', email='reader@example.com', password_hash=generate_password_hash('secret1'))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_submission(db, user):
+    """Create submissions owned by ``user``; keyword arguments override the defaults"""
+    from models import Submission
+
+    def make(**fields):
+        values = dict(user_id=user.id, article_title='Title', article_content='Some article text',
+                      source_type='text', result='FAKE', confidence=75.0)
+        values.update(fields)
+        submission = Submission(**values)
+        db.session.add(submission)
+        db.session.commit()
+        return submission
+
+    return make
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+ARTICLE = ('Government officials said on Tuesday that the national economy grew faster than '
+           'expected in the third quarter, according to figures from the statistics office.')
+
+
+@pytest.fixture
+def jobs(db, user):
+    from utils import job_queue
+    return job_queue
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    """Replace fetch_article; set ``fetch.error`` to make it raise"""
+    class FakeFetch:
+        error = None
+        calls = 0
+
+        def __call__(self, url):
+            self.calls += 1
+            if self.error is not None:
+                raise self.error
+            return 'A headline', ARTICLE
+
+    fake = FakeFetch()
+    monkeypatch.setattr('utils.content_extractor.fetch_article', fake)
+    return fake
+
+
+def test_claim_moves_the_oldest_queued_job_to_running(jobs, user):
+    first, second = jobs.enqueue_url_jobs(user.id, ['https://a.example/1', 'https://a.example/2'])
+
+    claimed = jobs.claim_job('worker-1')
+    assert claimed.id == first.id
+    assert (claimed.status, claimed.worker, claimed.attempts) == ('running', 'worker-1', 1)
+    assert claimed.started_at is not None
+
+    assert jobs.claim_job('worker-2').id == second.id
+    assert jobs.claim_job('worker-3') is None
+
+
+def test_processed_job_is_done_with_a_submission(jobs, user, fetch):
+    jobs.enqueue_url_job(user.id, 'https://a.example/story')
+    job = jobs.process_job(jobs.claim_job('worker'))
+
+    assert job.status == 'done'
+    assert job.finished_at is not None
+    assert job.submission.source_url == 'https://a.example/story'
+    assert job.submission.result in ('FAKE', 'REAL')
+
+
+def test_fetch_error_is_retried_after_a_growing_delay(jobs, user, fetch, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 3)
+    fetch.error = requests.exceptions.ConnectionError('pool to 10.0.0.7 exhausted')
+    job = jobs.enqueue_url_job(user.id, 'https://a.example/story')
+
+    delays = []
+    for attempt in (1, 2):
+        job = jobs.process_job(jobs.claim_job('worker'))
+        assert (job.status, job.attempts, job.worker) == ('queued', attempt, None)
+        assert '10.0.0.7' not in job.error
+        delays.append((job.run_after - datetime.utcnow()).total_seconds())
+
+        # Not claimable before its retry time, claimable after it
+        assert jobs.claim_job('worker') is None
+        job.run_after = datetime.utcnow() - timedelta(seconds=1)
+        jobs.db.session.commit()
+
+    assert 0 < delays[0] < delays[1] <= jobs.JOB_RETRY_BACKOFF_MAX
+
+    job = jobs.process_job(jobs.claim_job('worker'))
+    assert (job.status, job.attempts) == ('failed', 3)
+    assert job.finished_at is not None
+
+
+def test_retry_delay_doubles_up_to_the_maximum(jobs, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BACKOFF', 5)
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BACKOFF_MAX', 30)
+    assert [jobs.retry_delay(attempts) for attempts in range(1, 6)] == [5, 10, 20, 30, 30]
+
+
+def test_http_error_fails_without_retry(jobs, user, fetch):
+    fetch.error = requests.exceptions.RequestException('403 Forbidden')
+    jobs.enqueue_url_job(user.id, 'https://a.example/story')
+    job = jobs.process_job(jobs.claim_job('worker'))
+    assert (job.status, job.attempts) == ('failed', 1)
+
+
+def test_stale_running_jobs_are_requeued_or_failed(jobs, user, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+    retried, exhausted, recent = jobs.enqueue_url_jobs(user.id, [f'https://a.example/{i}' for i in range(3)])
+    for _ in range(3):
+        jobs.claim_job('dead-worker')
+
+    long_ago = datetime.utcnow() - timedelta(seconds=jobs.JOB_STALE_AFTER + 1)
+    retried.started_at = exhausted.started_at = long_ago
+    exhausted.attempts = 2
+    jobs.db.session.commit()
+
+    assert jobs.requeue_stale_jobs() == 2
+    for job in (retried, exhausted, recent):
+        jobs.db.session.refresh(job)
+    assert (retried.status, retried.worker) == ('queued', None)
+    assert exhausted.status == 'failed' and exhausted.finished_at is not None
+    assert recent.status == 'running'
+
+
+def test_job_status_answers_without_waiting(app, jobs, user):
+    job = jobs.enqueue_url_job(user.id, 'https://a.example/story')
+    client = app.test_client()
+    client.post('/auth/login', data={'email': user.email, 'password': 'secret1'})
+
+    response = client.get(f'/predict/jobs/{job.id}/status?wait=20')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'queued'
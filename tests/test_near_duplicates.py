@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+WORDS = ('government officials economy study found growth senator bill vote court ruling market shares '
+         'election campaign report climate policy health vaccine school budget city council').split()
+
+
+def article(seed, length=300):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def reworded(text, every=40):
+    """The same story with one word in every ``every`` replaced"""
+    words = text.split()
+    for i in range(0, len(words), every):
+        words[i] = 'changed'
+    return ' '.join(words)
+
+
+@pytest.fixture
+def nd(db):
+    from utils import near_duplicates
+    return near_duplicates
+
+
+@pytest.fixture
+def stored(db, nd, make_submission):
+    """Store a submission with its fingerprint, as the analysis paths do"""
+    def store(text, **fields):
+        signature = nd.fingerprint_text(text)
+        match = nd.find_similar(signature)
+        submission = make_submission(article_content=text[:1000], **fields)
+        nd.record_fingerprint(submission, signature, match)
+        db.session.commit()
+        return submission
+
+    return store
+
+
+def test_signature_does_not_depend_on_segmentation(nd):
+    text = article(1)
+    whole = nd.MinHasher()
+    whole.feed(text)
+
+    pieces = nd.MinHasher()
+    words = text.split()
+    for start in range(0, len(words), 7):
+        pieces.feed(' '.join(words[start:start + 7]))
+
+    assert (whole.signature() == pieces.signature()).all()
+    assert (nd.fingerprint_text(text.upper() + '!!') == whole.signature()).all()
+
+
+def test_empty_and_short_documents(nd):
+    assert nd.fingerprint_text('') is None
+    assert nd.fingerprint_text('  123 !? ') is None
+    assert nd.fingerprint_text('two words') is not None
+
+
+def test_similarity_estimates_separate_rewordings_from_other_stories(nd):
+    original = nd.fingerprint_text(article(1))
+    copy = nd.fingerprint_text(reworded(article(1)))
+    other = nd.fingerprint_text(article(2))
+
+    assert nd.similarities(original, copy[None, :])[0] >= nd.NEAR_DUPLICATE_THRESHOLD
+    assert nd.similarities(original, other[None, :])[0] < 0.3
+
+
+def test_rewording_joins_the_cluster_of_the_original(nd, stored):
+    original = stored(article(1))
+    copy = stored(reworded(article(1)))
+    other = stored(article(2))
+
+    assert original.fingerprint.cluster_id == original.id
+    assert copy.fingerprint.cluster_id == original.id
+    assert copy.fingerprint.duplicate_of == original.id
+    assert other.fingerprint.cluster_id == other.id
+    assert nd.cluster_size(original.id) == 2
+
+
+def test_verdict_is_reused_only_from_the_current_model(nd, stored, monkeypatch):
+    from utils import ml_utils
+
+    monkeypatch.setattr(nd, 'NEAR_DUPLICATE_REUSE', True)
+    current = ml_utils.get_model_version()
+    original = stored(article(1), result='REAL', confidence=91.0, model_version=current)
+    signature = nd.fingerprint_text(reworded(article(1)))
+
+    match, verdict = nd.lookup_verdict(signature)
+    assert match.submission_id == original.id
+    assert verdict == ('REAL', 91.0, current)
+
+    original.model_version = 'an-older-model'
+    nd.db.session.commit()
+    match, verdict = nd.lookup_verdict(signature)
+    assert match.submission_id == original.id
+    assert verdict is None
+
+
+def test_unrelated_article_has_no_match(nd, stored):
+    stored(article(1))
+    assert nd.lookup_verdict(nd.fingerprint_text(article(3))) == (None, None)
+
+
+def test_backfill_fingerprints_clusters_older_submissions(nd, make_submission):
+    # Short enough to be stored whole: backfill only sees the stored 1000 characters
+    text = article(1, length=100)
+    assert len(reworded(text, every=50)) < 1000
+    original = make_submission(article_content=text)
+    copy = make_submission(article_content=reworded(text, every=50))
+
+    assert nd.backfill_fingerprints() == 2
+    assert copy.fingerprint.cluster_id == original.id
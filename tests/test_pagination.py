@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.pagination import CursorError, NEXT, PREV, decode_cursor, encode_cursor, keyset_paginate
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def submissions(make_submission):
+    # Pairs share a timestamp, so page boundaries fall inside timestamp ties
+    return [make_submission(timestamp=START + timedelta(minutes=i // 2)) for i in range(11)]
+
+
+def newest_first(submissions):
+    return [s.id for s in sorted(submissions, key=lambda s: (s.timestamp, s.id), reverse=True)]
+
+
+def paginate(cursor=None, per_page=3):
+    from models import Submission
+    return keyset_paginate(Submission.query, [Submission.timestamp, Submission.id],
+                           per_page=per_page, cursor=cursor)
+
+
+def test_cursor_round_trip(app):
+    from models import Submission
+    columns = [Submission.timestamp, Submission.id]
+    token = encode_cursor(PREV, [START, 42])
+    assert decode_cursor(token, columns) == (PREV, [START, 42])
+
+
+@pytest.mark.parametrize('token', ['', 'not-base64!', encode_cursor('x', [START, 1]), encode_cursor(NEXT, [1])])
+def test_malformed_cursor_is_rejected(app, token):
+    from models import Submission
+    with pytest.raises(CursorError):
+        decode_cursor(token, [Submission.timestamp, Submission.id])
+
+
+@pytest.mark.parametrize('per_page', [1, 2, 3, 11, 20])
+def test_forward_pages_cover_every_row_once(db, submissions, per_page):
+    pages = [paginate(per_page=per_page)]
+    while pages[-1].has_next:
+        pages.append(paginate(pages[-1].next_cursor, per_page=per_page))
+
+    assert [s.id for page in pages for s in page.items] == newest_first(submissions)
+    assert not pages[0].has_prev
+    assert all(page.has_prev for page in pages[1:])
+    assert all(len(page.items) == per_page for page in pages[:-1])
+
+
+def test_backward_pages_mirror_forward_pages(db, submissions):
+    forward = [paginate()]
+    while forward[-1].has_next:
+        forward.append(paginate(forward[-1].next_cursor))
+
+    backward = [forward[-1]]
+    while backward[-1].has_prev:
+        backward.append(paginate(backward[-1].prev_cursor))
+
+    assert [[s.id for s in page.items] for page in reversed(backward)] == \
+           [[s.id for s in page.items] for page in forward]
+
+
+def test_invalid_cursor_starts_from_the_first_page(db, submissions):
+    page = paginate('garbage')
+    assert [s.id for s in page.items] == newest_first(submissions)[:3]
+    assert not page.has_prev
+
+
+def test_submission_without_timestamp_is_listed(db, submissions, make_submission):
+    # An explicit None would be skipped by the (timestamp, id) comparison
+    late = make_submission(timestamp=None)
+    assert late.timestamp is not None
+
+    pages = [paginate()]
+    while pages[-1].has_next:
+        pages.append(paginate(pages[-1].next_cursor))
+    assert late.id in [s.id for page in pages for s in page.items]
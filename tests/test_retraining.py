@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+FAKE_TEXTS = ['shocking miracle cure secret doctors hate', 'unbelievable secret trick celebrities hide']
+REAL_TEXTS = ['government officials announced the budget', 'the court ruled on the appeal on tuesday']
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """A model.pkl trained like train_model.py's, on a tiny corpus"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from utils.model_io import new_version, publish_artifact
+
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(FAKE_TEXTS + REAL_TEXTS)
+    model = LogisticRegression().fit(X, [0, 0, 1, 1])
+    publish_artifact({'model': model, 'vectorizer': vectorizer, 'version': new_version()},
+                     str(tmp_path / 'model.pkl'))
+    return str(tmp_path)
+
+
+def load_artifact(model_dir):
+    from utils.model_io import load_mapped
+    return load_mapped(f'{model_dir}/model.pkl', mmap_mode=None)
+
+
+@pytest.fixture
+def feedback(db, app, make_submission):
+    """Record an admin label for a new submission with ``text``; returns the submission"""
+    from models import User
+    from utils.retraining import record_feedback
+
+    admin = User.query.filter_by(role='admin').first()
+
+    def give(text, label, submission=None):
+        submission = submission or make_submission(article_content=text)
+        record_feedback(submission, label, admin.id)
+        return submission
+
+    return give
+
+
+def last_feedback_id():
+    from app import db
+    from models import SubmissionFeedback
+    return db.session.query(db.func.max(SubmissionFeedback.id)).scalar()
+
+
+def test_record_feedback_rejects_unknown_labels(feedback):
+    with pytest.raises(ValueError):
+        feedback(FAKE_TEXTS[0], 'MAYBE')
+
+
+def test_superseded_labels_are_skipped(db, feedback):
+    from utils.retraining import count_pending_feedback, iter_feedback
+
+    corrected = feedback(FAKE_TEXTS[0], 'REAL')
+    feedback(None, 'FAKE', submission=corrected)
+    feedback(REAL_TEXTS[0], 'REAL')
+
+    rows = [row for batch in iter_feedback(0, batch_size=1) for row in batch]
+    assert [row.label for row in rows] == ['FAKE', 'REAL']
+    assert [row.id for row in rows] == sorted(row.id for row in rows)
+    assert count_pending_feedback(0) == 3
+    assert corrected.feedback_label == 'FAKE'
+
+
+def test_retrain_learns_each_label_once(db, model_dir, feedback):
+    from utils.retraining import retrain_from_feedback
+
+    feedback(FAKE_TEXTS[0], 'FAKE')
+    feedback(REAL_TEXTS[0], 'REAL')
+    parent = load_artifact(model_dir)['version']
+
+    status = retrain_from_feedback(model_dir=model_dir)
+    assert status['status'] == 'published'
+    assert (status['pending'], status['rows']) == (2, 2)
+    assert status['parent_version'] == parent
+
+    artifact = load_artifact(model_dir)
+    assert artifact['version'] == status['version'] != parent
+    assert artifact['feedback_checkpoint'] == status['feedback_checkpoint'] == last_feedback_id()
+    assert artifact['feedback_rows'] == 2
+
+    # Nothing new: the artifact is left alone
+    status = retrain_from_feedback(model_dir=model_dir)
+    assert (status['status'], status['pending'], status['rows']) == ('up_to_date', 0, 0)
+    assert load_artifact(model_dir)['version'] == artifact['version']
+
+    # Only the label added since the checkpoint is learned
+    feedback(FAKE_TEXTS[1], 'FAKE')
+    status = retrain_from_feedback(model_dir=model_dir)
+    assert (status['status'], status['pending'], status['rows']) == ('published', 1, 1)
+    assert load_artifact(model_dir)['feedback_rows'] == 3
+
+
+def test_retrained_model_moves_towards_the_labels(db, model_dir, feedback):
+    from utils.ml_utils import preprocess_text
+    from utils.retraining import retrain_from_feedback
+
+    text = 'officials announced a miracle cure'
+    before = load_artifact(model_dir)
+    X = before['vectorizer'].transform([preprocess_text(text)])
+    p_before = before['model'].predict_proba(X)[0, 0]
+
+    for _ in range(5):
+        feedback(text, 'FAKE')
+    retrain_from_feedback(model_dir=model_dir, epochs=20)
+
+    after = load_artifact(model_dir)
+    assert after['model'].predict_proba(X)[0, 0] > p_before
+    assert np.array_equal(after['model'].classes_, [0, 1])
+
+
+def test_missing_model_is_reported(db, tmp_path):
+    from utils.retraining import retrain_from_feedback
+
+    with pytest.raises(FileNotFoundError):
+        retrain_from_feedback(model_dir=str(tmp_path))
@@ -0,0 +1,64 @@
+import random
+import re
+
+import pytest
+
+from utils.text_normalizer import iter_normalized, normalize_text
+
+
+def legacy_normalize(text):
+    """preprocess_text as it was implemented before the shared normalizer"""
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    text = ' '.join(text.split())
+    return text
+
+
+SAMPLES = [
+    '',
+    '   ',
+    'Plain words',
+    'SHOUTING Headline: 3.5% growth in 2024!',
+    "don't  stop\tme\nnow\r\n",
+    'café naïve Ünïcödé façade',
+    # Kelvin sign and dotted capital I lowercase to ASCII letters
+    'K elvin İstanbul',
+    # Unicode whitespace must still separate words
+    'no break em　ideographic line',
+    '\x1c\x1d\x1e\x1f separators',
+    'emoji 🚀 rocket 🙂',
+    '---***___',
+]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_normalize_text_matches_legacy_pipeline(text):
+    assert normalize_text(text) == legacy_normalize(text)
+
+
+def test_normalize_text_matches_legacy_pipeline_on_random_text():
+    rng = random.Random(7)
+    alphabet = 'abcXYZ019 \t\n\r.,!é Kİß-'
+    for _ in range(200):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        assert normalize_text(text) == legacy_normalize(text), repr(text)
+
+
+def test_preprocess_text_uses_the_shared_normalizer():
+    from ml_model.train_model import preprocess_text as training_preprocess
+    from utils.ml_utils import preprocess_text as serving_preprocess
+
+    text = 'Officials SAID: the café re-opened in 2024.\n\tReally!'
+    assert serving_preprocess(text) == training_preprocess(text) == legacy_normalize(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64])
+def test_iter_normalized_is_chunking_invariant(chunk_size):
+    text = ' '.join(SAMPLES) + '  Trailing words split across chunks  '
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    assert ' '.join(iter_normalized(chunks)) == legacy_normalize(text)
+
+
+def test_iter_normalized_skips_empty_chunks():
+    assert list(iter_normalized(['', 'Hel', '', 'lo wor', 'ld', ''])) == ['hello', 'world']
+    assert list(iter_normalized(['', '  ', '!!'])) == []
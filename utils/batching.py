@@ -0,0 +1,168 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class _PendingItem:
+    """A queued payload together with the future its caller is waiting on"""
+    __slots__ = ('payload', 'future', 'enqueued_at')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Group concurrent single-item calls into batches run by one worker thread.
+
+    ``handler`` receives a list of payloads and must return a list of results
+    in the same order. The worker flushes a batch as soon as it holds
+    ``max_batch_size`` items or ``max_wait_ms`` after the oldest item arrived.
+    """
+
+    def __init__(self, handler, max_batch_size=32, max_wait_ms=5.0, wait_samples=2048):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._batch_sizes = {bound: 0 for bound in self._histogram_bounds()}
+        self._waits = deque(maxlen=wait_samples)
+        self._latencies = deque(maxlen=wait_samples)
+
+    def submit(self, payload):
+        """Queue a payload and return a Future resolved with its result"""
+        item = _PendingItem(payload)
+        self._ensure_worker()
+        self._queue.put(item)
+        return item.future
+
+    def call(self, payload, timeout=None):
+        """Queue a payload and block until its result is available"""
+        return self.submit(payload).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily, and again in every forked process"""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # Items queued by the parent process can never be served here
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    def _collect_batch(self):
+        """Block for the first item, then gather more until full or timed out"""
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started_at = time.perf_counter()
+
+            try:
+                results = self.handler([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError('Batch handler returned the wrong number of results')
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            finished_at = time.perf_counter()
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[self._bucket_for(len(batch))] += 1
+                for item in batch:
+                    self._waits.append((started_at - item.enqueued_at) * 1000)
+                    self._latencies.append((finished_at - item.enqueued_at) * 1000)
+
+    def _histogram_bounds(self):
+        """Power-of-two batch size buckets up to max_batch_size"""
+        bounds = []
+        bound = 1
+        while bound < self.max_batch_size:
+            bounds.append(bound)
+            bound *= 2
+        bounds.append(self.max_batch_size)
+        return bounds
+
+    def _bucket_for(self, size):
+        for bound in self._batch_sizes:
+            if size <= bound:
+                return bound
+        return self.max_batch_size
+
+    def stats(self):
+        """Snapshot of queue depth, batch-size histogram and wait-time metrics"""
+        with self._lock:
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'errors': self._errors,
+                'mean_batch_size': (self._items / self._batches) if self._batches else 0.0,
+                'batch_size_histogram': {f'le_{bound}': count for bound, count in self._batch_sizes.items()},
+                'wait_ms': _summarize(waits),
+                'latency_ms': _summarize(latencies),
+            }
+
+
+def _summarize(sorted_values):
+    """Mean and tail percentiles of an already sorted sample"""
+    if not sorted_values:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+
+    def percentile(q):
+        index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    return {
+        'count': len(sorted_values),
+        'mean': sum(sorted_values) / len(sorted_values),
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': sorted_values[-1],
+    }
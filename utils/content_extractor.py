@@ -1,35 +1,74 @@
+import os
+import time
 import requests
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from urllib.parse import urlparse
 import re
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from utils.url_cache import UrlCache, canonicalize_url
+from utils.http_client import fetch_limited, ResponseTooLarge, UnsupportedContentType
+from utils.metrics import CACHE_LOOKUPS, stage
+
+# Prefer the C-based lxml parser when it is installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Only these content types are downloaded and parsed
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+# Selector rules used by parse_article, in priority order. They mirror the
+# CSS selectors of extract_title and extract_content.
+TITLE_RULES = (
+    ('tag', 'h1'),
+    ('class', 'headline'),
+    ('class', 'title'),
+    ('testid', 'headline'),
+    ('class', 'entry-title'),
+    ('class', 'post-title'),
+    ('class', 'article-title')
+)
+CONTENT_RULES = (
+    ('class', 'article-content'),
+    ('class', 'entry-content'),
+    ('class', 'post-content'),
+    ('class', 'content'),
+    ('testid', 'article-body'),
+    ('class', 'story-body'),
+    ('class', 'article-body'),
+    ('tag', 'main')
+)
+WANTED_RULES = frozenset(TITLE_RULES + CONTENT_RULES)
+REMOVED_TAGS = frozenset(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form'])
+
+# Persistent cache of extracted articles. Set URL_CACHE_DB to an empty
+# string to disable it.
+_url_cache_path = os.environ.get(
+    'URL_CACHE_DB',
+    os.path.join(os.path.dirname(__file__), '..', 'instance', 'url_cache.db')
+)
+url_cache = UrlCache(_url_cache_path, ttl=float(os.environ.get('URL_CACHE_TTL', 900))) if _url_cache_path else None
+
+# Defaults for concurrent multi-URL extraction
+EXTRACT_MAX_IN_FLIGHT = 32
+EXTRACT_PER_HOST = 4
+EXTRACT_DEADLINE = 60
+
+def normalize_url(url):
+    """Add a scheme if missing and canonicalize the URL"""
+    url = url.strip()
+    # Add http if not present
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return canonicalize_url(url)
 
 def extract_from_url(url):
     """Extract title and content from a news URL"""
     try:
-        # Add http if not present
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        
-        # Set headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Make request with timeout
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Extract title
-        title = extract_title(soup)
-        
-        # Extract content
-        content = extract_content(soup)
-        
-        return title, content
-        
+        return fetch_article(url)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return None, None
@@ -37,6 +76,235 @@ def extract_from_url(url):
         print(f"Error parsing content: {e}")
         return None, None
 
+def fetch_article(url):
+    """Fetch and extract title and content from a news URL, raising on failure"""
+    url = normalize_url(url)
+    
+    # Serve fresh cache entries without any network round-trip
+    cached = url_cache.get(url) if url_cache else None
+    if cached and cached['fresh']:
+        url_cache.record('hit')
+        return cached['title'], cached['content']
+    
+    # Set headers to mimic a real browser
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    
+    # Revalidate stale entries with a conditional request
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    # Stream the page through the pooled session with a hard size cap
+    with stage('fetch'):
+        response, body = fetch_limited(url, headers=headers, content_types=HTML_CONTENT_TYPES)
+    
+    if cached and response.status_code == 304:
+        # Not modified: skip the download and the parse
+        url_cache.touch(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        url_cache.record('revalidated')
+        return cached['title'], cached['content']
+    
+    response.raise_for_status()
+    
+    # Parse HTML and extract title and content in one tree walk
+    with stage('parse'):
+        title, content = parse_article(body)
+    
+    if url_cache:
+        url_cache.record('miss')
+        if title and content:
+            url_cache.store(url, title, content,
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'))
+    
+    return title, content
+
+def fetch_error_message(error):
+    """User-facing message for an exception raised by fetch_article.
+    
+    The exception's own text can name internal hosts, resolved addresses and
+    connection pool details, so it is only logged.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return 'Could not reach the URL. Please try again later.'
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f'The site answered with HTTP {error.response.status_code}.'
+    if isinstance(error, ResponseTooLarge):
+        return 'The page is too large to analyze.'
+    if isinstance(error, UnsupportedContentType):
+        return 'The URL does not point to an HTML page.'
+    if isinstance(error, requests.exceptions.RequestException):
+        return 'Could not fetch the URL. Please try a different URL or use text input.'
+    return 'Could not extract content from the URL.'
+
+def extract_many(urls, max_in_flight=EXTRACT_MAX_IN_FLIGHT, per_host=EXTRACT_PER_HOST, deadline=EXTRACT_DEADLINE):
+    """Extract many URLs concurrently, yielding (url, title, content, error) as they complete.
+    
+    At most ``max_in_flight`` fetches run at once and at most ``per_host`` of
+    them target the same host. URLs not finished ``deadline`` seconds after
+    the call are yielded with a timeout error.
+    """
+    # Queue URLs per host so one slow publisher cannot hog every slot
+    queues = OrderedDict()
+    for url in urls:
+        try:
+            host = urlparse(normalize_url(url)).netloc
+        except Exception:
+            host = ''
+        queues.setdefault(host, deque()).append(url)
+    
+    if not queues:
+        return
+    
+    expires_at = time.monotonic() + deadline
+    in_flight = {}
+    host_counts = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix='extract')
+    
+    def dispatch():
+        # Round-robin over hosts that still have capacity
+        progressed = True
+        while progressed and len(in_flight) < max_in_flight:
+            progressed = False
+            for host in list(queues):
+                if len(in_flight) >= max_in_flight:
+                    break
+                if host_counts.get(host, 0) >= per_host:
+                    continue
+                url = queues[host].popleft()
+                if not queues[host]:
+                    del queues[host]
+                future = executor.submit(fetch_article, url)
+                in_flight[future] = (url, host)
+                host_counts[host] = host_counts.get(host, 0) + 1
+                progressed = True
+    
+    try:
+        while queues or in_flight:
+            dispatch()
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            done, _ = wait(list(in_flight), timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, host = in_flight.pop(future)
+                host_counts[host] -= 1
+                try:
+                    title, content = future.result()
+                except Exception as e:
+                    print(f"Error extracting {url}: {e!r}")
+                    yield url, None, None, fetch_error_message(e)
+                    continue
+                if not title or not content:
+                    yield url, title, content, 'No article content found'
+                else:
+                    yield url, title, content, None
+        
+        # Anything left over ran out of time
+        for url, _ in in_flight.values():
+            yield url, None, None, 'Deadline exceeded'
+        for pending in queues.values():
+            for url in pending:
+                yield url, None, None, 'Deadline exceeded'
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_url_cache_stats():
+    """Hit, revalidation and miss counters of the URL extraction cache"""
+    return url_cache.stats() if url_cache else None
+
+def count_cache_lookups():
+    """URL cache lookups by outcome, for the metrics endpoint"""
+    if not url_cache:
+        return {}
+    stats = url_cache.stats()
+    return {
+        ('url', 'hit'): stats['hits'],
+        ('url', 'revalidated'): stats['revalidations'],
+        ('url', 'miss'): stats['misses'],
+    }
+
+CACHE_LOOKUPS.collect_from(count_cache_lookups)
+
+def parse_article(html):
+    """Parse HTML and extract (title, content) with a single walk over the tree"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    
+    first_any = {}      # first element per rule, anywhere in the page
+    first_visible = {}  # first element per rule outside removed elements
+    paragraphs = []
+    removed = []
+    title_tag = None
+    
+    stack = [(soup, False)]
+    while stack:
+        node, hidden = stack.pop()
+        
+        if node is not soup:
+            name = node.name
+            if name in REMOVED_TAGS and not hidden:
+                removed.append(node)
+                hidden = True
+            
+            rules = [('tag', name)]
+            rules.extend(('class', cls) for cls in node.get('class') or ())
+            testid = node.get('data-testid')
+            if testid:
+                rules.append(('testid', testid))
+            
+            for rule in rules:
+                if rule in WANTED_RULES:
+                    first_any.setdefault(rule, node)
+                    if not hidden:
+                        first_visible.setdefault(rule, node)
+            
+            if name == 'title' and title_tag is None:
+                title_tag = node
+            elif name == 'p' and not hidden:
+                paragraphs.append(node)
+        
+        # Push children in reverse so they are visited in document order
+        children = [child for child in node.contents if isinstance(child, Tag)]
+        stack.extend((child, hidden) for child in reversed(children))
+    
+    # Title candidates are checked before anything is removed
+    title = None
+    for rule in TITLE_RULES:
+        title_elem = first_any.get(rule)
+        if title_elem:
+            text = title_elem.get_text().strip()
+            if text and len(text) > 10:  # Reasonable title length
+                title = text
+                break
+    if title is None:
+        title = title_tag.get_text().strip() if title_tag else "Untitled Article"
+    
+    # Remove unwanted elements
+    for element in removed:
+        element.decompose()
+    
+    for rule in CONTENT_RULES:
+        content_elem = first_visible.get(rule)
+        if content_elem:
+            content = extract_text_from_element(content_elem)
+            if content and len(content) > 100:  # Reasonable content length
+                return title, content
+    
+    # Fallback: extract from paragraphs
+    if paragraphs:
+        texts = (p.get_text().strip() for p in paragraphs)
+        content = '\n'.join(text for text in texts if text)
+        if len(content) > 100:
+            return title, content
+    
+    # Last resort: get all text
+    return title, soup.get_text()
+
 def extract_title(soup):
     """Extract article title from HTML"""
     # Try different title selectors
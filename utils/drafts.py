@@ -0,0 +1,63 @@
+"""
+Server-side storage of article drafts handed from user.analyze to
+predict.analyze_text.
+
+The article is stored once and the redirect carries only a short token,
+instead of the whole text URL-encoded into the query string.
+"""
+
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from app import db
+from models import AnalysisDraft
+
+# Seconds an unconsumed draft is kept before it is deleted
+DRAFT_TTL = float(os.environ.get('DRAFT_TTL', 3600))
+
+
+def create_draft(user_id, title, content, source_type='text'):
+    """Store an article for ``user_id`` and return its token"""
+    token = secrets.token_urlsafe(24)
+    db.session.add(AnalysisDraft(
+        token=token,
+        user_id=user_id,
+        title=title[:200],
+        content=content,
+        source_type=source_type
+    ))
+    # Drafts abandoned before being analyzed are dropped here
+    purge_expired_drafts(commit=False)
+    db.session.commit()
+    return token
+
+
+def consume_draft(token, user_id):
+    """Delete the user's draft and return it, or None if it is unknown, expired or already used"""
+    draft = db.session.get(AnalysisDraft, token)
+    if draft is None or draft.user_id != user_id:
+        return None
+
+    # Only the request whose DELETE removes the row gets the draft, so a
+    # resubmitted redirect cannot analyze it twice. The detached draft keeps
+    # its loaded attributes.
+    db.session.expunge(draft)
+    deleted = db.session.execute(
+        AnalysisDraft.__table__.delete().where(AnalysisDraft.token == token)
+    ).rowcount
+    db.session.commit()
+
+    if not deleted or draft.created_at < datetime.utcnow() - timedelta(seconds=DRAFT_TTL):
+        return None
+    return draft
+
+
+def purge_expired_drafts(commit=True):
+    cutoff = datetime.utcnow() - timedelta(seconds=DRAFT_TTL)
+    deleted = db.session.execute(
+        AnalysisDraft.__table__.delete().where(AnalysisDraft.created_at < cutoff)
+    ).rowcount
+    if commit:
+        db.session.commit()
+    return deleted
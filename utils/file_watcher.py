@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+
+
+def file_signature(path):
+    """Identity of a file's current contents, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileWatcher:
+    """Poll a file and call ``callback()`` from a background thread when it changes.
+
+    Files replaced by an atomic rename get a new inode, so replacement is
+    detected even if size and mtime happen to match. The polling thread is
+    started lazily by ``start()`` and again in forked children, which do not
+    inherit it.
+    """
+
+    def __init__(self, path, callback, interval):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.signature = file_signature(path)
+        self.changes = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def mark_current(self):
+        """Treat the file as it is now as already handled"""
+        self.signature = file_signature(self.path)
+
+    def start(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+            thread.start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.interval)
+            signature = file_signature(self.path)
+            if signature is None or signature == self.signature:
+                continue
+            self.signature = signature
+            self.changes += 1
+            try:
+                self.callback()
+            except Exception as e:
+                print(f"Error handling change of {self.path}: {e}")
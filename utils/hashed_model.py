@@ -0,0 +1,196 @@
+"""
+Compact serving artifact for the TF-IDF + LogisticRegression model.
+
+The fitted vocabulary is hashed into a fixed feature space and the IDF
+weights are folded into the LogisticRegression coefficients, giving one
+dense float32 weight vector. Scoring a document is then a sparse dot
+product of its n-gram counts with that vector, normalized by the L2 norm
+of its TF-IDF vector, and needs neither sklearn nor the vocabulary dict.
+
+The hashed space is an open-addressing table with linear probing. Each slot
+also stores the full 32-bit CRC of its n-gram as a fingerprint, so
+vocabulary terms never share a slot and out-of-vocabulary n-grams are not
+mistaken for them.
+"""
+
+import re
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from utils.model_io import dump_atomic, load_mapped
+
+ARTIFACT_FORMAT = 'hashed-linear-v1'
+
+# Hashed space size is picked from the vocabulary size unless given; a load
+# factor of at most 1/2 keeps probe sequences short
+SLOTS_PER_TERM = 2
+MIN_N_FEATURES = 2 ** 10
+
+
+def hash_term(term):
+    """Non-zero 32-bit hash of an n-gram; its low bits pick the home slot"""
+    return zlib.crc32(term.encode('utf-8')) or 1
+
+
+def choose_n_features(vocabulary_size):
+    """Smallest power of two giving SLOTS_PER_TERM slots per vocabulary term"""
+    n_features = MIN_N_FEATURES
+    while n_features < vocabulary_size * SLOTS_PER_TERM:
+        n_features *= 2
+    return n_features
+
+
+def build_artifact(model, vectorizer, n_features=None):
+    """Fold a fitted TfidfVectorizer + binary linear model into a serving artifact.
+
+    Returns ``(artifact, collisions)`` where ``collisions`` counts vocabulary
+    terms that had to probe past their home slot.
+    """
+    if getattr(vectorizer, 'analyzer', None) != 'word' or not hasattr(vectorizer, 'idf_'):
+        raise ValueError('Only fitted word-level TfidfVectorizer models can be exported')
+    if vectorizer.norm != 'l2' or vectorizer.sublinear_tf or vectorizer.binary or not vectorizer.use_idf:
+        raise ValueError('Only l2-normalized, linear-tf TF-IDF features can be exported')
+    if vectorizer.preprocessor is not None or vectorizer.tokenizer is not None or vectorizer.strip_accents:
+        raise ValueError('Custom preprocessors, tokenizers and accent stripping cannot be exported')
+    if getattr(model, 'coef_', None) is None or model.coef_.shape[0] != 1:
+        raise ValueError('Only binary linear classifiers can be exported')
+
+    coef = model.coef_[0]
+    idf = vectorizer.idf_
+    if not n_features:
+        n_features = choose_n_features(len(vectorizer.vocabulary_))
+    if n_features < len(vectorizer.vocabulary_) * SLOTS_PER_TERM:
+        raise ValueError(f'n_features must be at least {SLOTS_PER_TERM}x the vocabulary size')
+
+    weights = np.zeros(n_features, dtype=np.float32)
+    idf_squared = np.zeros(n_features, dtype=np.float32)
+    fingerprints = np.zeros(n_features, dtype=np.uint32)
+    collisions = 0
+
+    for term, column in vectorizer.vocabulary_.items():
+        fingerprint = hash_term(term)
+        slot = fingerprint % n_features
+        if fingerprints[slot]:
+            collisions += 1
+        while fingerprints[slot]:
+            slot = (slot + 1) % n_features
+        weights[slot] = idf[column] * coef[column]
+        idf_squared[slot] = idf[column] ** 2
+        fingerprints[slot] = fingerprint
+
+    stop_words = vectorizer.get_stop_words() or ()
+
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'n_features': n_features,
+        'weights': weights,
+        'idf_squared': idf_squared,
+        'fingerprints': fingerprints,
+        'intercept': float(model.intercept_[0]),
+        'classes': np.asarray(model.classes_),
+        'ngram_range': tuple(vectorizer.ngram_range),
+        'token_pattern': vectorizer.token_pattern,
+        'lowercase': bool(vectorizer.lowercase),
+        'stop_words': sorted(stop_words),
+    }
+    return artifact, collisions
+
+
+def save_artifact(artifact, path):
+    dump_atomic(artifact, path)
+
+
+def load_artifact(path, mmap_mode=None):
+    """Load a serving artifact and return ``(model, vectorizer)``.
+
+    With ``mmap_mode='r'`` the weight, IDF and fingerprint arrays stay
+    memory-mapped and are shared by every process serving the same file.
+    """
+    artifact = load_mapped(path, mmap_mode)
+    if artifact.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported serving artifact format: {artifact.get('format')}")
+    return HashedLinearModel(artifact), HashedVectorizer(artifact)
+
+
+class HashedVectorizer:
+    """Turn documents into sparse n-gram count rows in the hashed feature space"""
+
+    def __init__(self, artifact):
+        self.n_features = int(artifact['n_features'])
+        self.fingerprints = artifact['fingerprints']
+        self.min_n, self.max_n = artifact['ngram_range']
+        self.lowercase = artifact['lowercase']
+        self.stop_words = frozenset(artifact['stop_words'])
+        self.token_pattern = re.compile(artifact['token_pattern'])
+
+    def analyze(self, text):
+        """Replicates sklearn's default word analyzer"""
+        if self.lowercase:
+            text = text.lower()
+        tokens = [token for token in self.token_pattern.findall(text) if token not in self.stop_words]
+
+        grams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def lookup(self, grams):
+        """Slot index of each n-gram, or -1 for n-grams outside the vocabulary"""
+        wanted = np.fromiter((hash_term(gram) for gram in grams), dtype=np.uint32, count=len(grams))
+        slots = wanted.astype(np.int64) % self.n_features
+
+        found = np.full(len(grams), -1, dtype=np.int64)
+        active = np.arange(len(grams))
+        while len(active):
+            stored = self.fingerprints[slots[active]]
+            matched = stored == wanted[active]
+            found[active[matched]] = slots[active[matched]]
+            # Keep probing only past occupied slots holding another n-gram
+            active = active[~matched & (stored != 0)]
+            slots[active] = (slots[active] + 1) % self.n_features
+        return found
+
+    def transform(self, texts):
+        indptr = [0]
+        indices = []
+        values = []
+
+        for text in texts:
+            found = self.lookup(self.analyze(text))
+            unique, counts = np.unique(found[found >= 0], return_counts=True)
+            indices.append(unique)
+            values.append(counts)
+            indptr.append(indptr[-1] + len(unique))
+
+        return sparse.csr_matrix(
+            (
+                np.concatenate(values).astype(np.float32) if values else np.zeros(0, np.float32),
+                np.concatenate(indices).astype(np.int64) if indices else np.zeros(0, np.int64),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(texts), self.n_features)
+        )
+
+
+class HashedLinearModel:
+    """Logistic scoring of hashed count rows with IDF folded into the weights"""
+
+    def __init__(self, artifact):
+        self.weights = artifact['weights']
+        self.idf_squared = artifact['idf_squared']
+        self.intercept = artifact['intercept']
+        self.classes_ = artifact['classes']
+        self.version = artifact.get('version')
+
+    def decision_function(self, X):
+        dot = X @ self.weights
+        # L2 norm of the TF-IDF row, as applied by TfidfVectorizer
+        norm = np.sqrt(X.multiply(X) @ self.idf_squared)
+        scaled = np.divide(dot, norm, out=np.zeros_like(dot), where=norm > 0)
+        return scaled + self.intercept
+
+    def predict_proba(self, X):
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - positive, positive])
@@ -0,0 +1,290 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from http import cookiejar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+
+# Pool and retry configuration
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 50))  # hosts kept in the pool
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # keep-alive connections per host
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.3))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Body download limits
+MAX_BODY_BYTES = int(os.environ.get('HTTP_MAX_BODY_BYTES', 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """The response body exceeded the configured byte cap"""
+
+
+class UnsupportedContentType(requests.exceptions.RequestException):
+    """The response is not of an accepted content type"""
+
+# Per-thread timing of the request currently in flight
+_current = threading.local()
+
+
+class HttpStats:
+    """Aggregate connection reuse and per-phase timing of outbound requests"""
+
+    PHASES = ('dns', 'connect', 'tls', 'transfer')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_requests = 0
+        self.totals = {phase: 0.0 for phase in self.PHASES}
+
+    def record_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_request(self, timing, error=False):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            elif not timing.get('connections'):
+                # Served entirely over an already open keep-alive connection
+                self.reused_requests += 1
+            for phase in self.PHASES:
+                self.totals[phase] += timing.get(phase, 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            requests_made = self.requests
+            return {
+                'requests': requests_made,
+                'errors': self.errors,
+                'new_connections': self.new_connections,
+                'reused_requests': self.reused_requests,
+                'reuse_rate': (self.reused_requests / requests_made) if requests_made else 0.0,
+                'total_ms': {phase: total * 1000 for phase, total in self.totals.items()},
+                'mean_ms': {
+                    phase: (total * 1000 / requests_made) if requests_made else 0.0
+                    for phase, total in self.totals.items()
+                },
+            }
+
+
+stats = HttpStats()
+
+
+def _add_timing(phase, seconds):
+    timing = getattr(_current, 'timing', None)
+    if timing is not None:
+        timing[phase] = timing.get(phase, 0.0) + seconds
+
+
+class _TimedConnectionMixin:
+    """Split new-connection setup into DNS resolution and TCP connect time"""
+
+    def _new_conn(self):
+        stats.record_connection()
+        _add_timing('connections', 1)
+        host = self._dns_host
+
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 raise its usual NameResolutionError
+            addresses = None
+        resolved = time.perf_counter()
+        _add_timing('dns', resolved - started)
+
+        try:
+            if addresses:
+                # Connect to the address we just resolved; SNI and certificate
+                # checks still use self.host
+                self._dns_host = addresses[0][4][0]
+            try:
+                sock = super()._new_conn()
+            except NewConnectionError:
+                if not addresses or len(addresses) == 1:
+                    raise
+                # Fall back to urllib3 trying every address itself
+                self._dns_host = host
+                sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+
+        _add_timing('connect', time.perf_counter() - resolved)
+        return sock
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        timing = getattr(_current, 'timing', None)
+        before = dict(timing) if timing is not None else None
+        started = time.perf_counter()
+
+        super().connect()
+
+        if timing is not None:
+            # Whatever connect() spent outside _new_conn is the TLS handshake
+            socket_setup = sum(timing.get(phase, 0.0) - before.get(phase, 0.0) for phase in ('dns', 'connect'))
+            _add_timing('tls', max(0.0, time.perf_counter() - started - socket_setup))
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report DNS/connect/TLS timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class _RejectAllCookies(cookiejar.DefaultCookiePolicy):
+    """Never keep cookies: the shared session fetches pages for every user"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def create_session():
+    """Build a keep-alive session with per-host pooling and a retry policy"""
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = PooledHTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+        pool_block=False,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.cookies.set_policy(_RejectAllCookies())
+    return session
+
+
+def get_session():
+    """Shared session for this process (recreated after a fork)"""
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session()
+                _session_pid = pid
+    return _session
+
+
+@contextmanager
+def _recorded_request():
+    """Collect the phase timings of one logical request into the stats"""
+    _current.timing = timing = {}
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except requests.exceptions.RequestException:
+        error = True
+        raise
+    finally:
+        _current.timing = None
+        elapsed = time.perf_counter() - started
+        setup = timing.get('dns', 0.0) + timing.get('connect', 0.0) + timing.get('tls', 0.0)
+        timing['transfer'] = max(0.0, elapsed - setup)
+        stats.record_request(timing, error=error)
+
+
+def fetch(url, headers=None, **kwargs):
+    """GET ``url`` through the pooled session, recording timing statistics"""
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+    with _recorded_request():
+        return get_session().get(url, headers=headers, **kwargs)
+
+
+def fetch_limited(url, headers=None, max_bytes=MAX_BODY_BYTES, content_types=None):
+    """Stream a GET response into memory, aborting early on size or content type.
+
+    Returns ``(response, body)``; the body is empty for non-2xx responses.
+    ``content_types`` is a tuple of accepted media-type prefixes, and
+    responses without a Content-Type are accepted. The download stops as
+    soon as the body would exceed ``max_bytes``.
+    """
+    with _recorded_request():
+        response = get_session().get(url, headers=headers, stream=True,
+                                     timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        try:
+            ok = response.status_code < 300
+            if ok:
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if content_types and content_type and not content_type.startswith(content_types):
+                    raise UnsupportedContentType(f'Unsupported content type: {content_type}', response=response)
+
+                declared = response.headers.get('Content-Length')
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise ResponseTooLarge(f'Response of {declared} bytes exceeds {max_bytes} bytes', response=response)
+
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_bytes:
+                    if ok:
+                        raise ResponseTooLarge(f'Response exceeds {max_bytes} bytes', response=response)
+                    # Bodies of 304s and errors are thrown away anyway
+                    break
+                chunks.append(chunk)
+            return response, b''.join(chunks) if ok else b''
+        finally:
+            # Returns the connection to the pool, or drops it after an abort
+            response.close()
+
+
+def get_stats():
+    """Connection reuse rate and DNS/connect/TLS/transfer time split"""
+    return stats.snapshot()
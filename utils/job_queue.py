@@ -0,0 +1,312 @@
+"""
+Database-backed queue of URL analysis jobs.
+
+The web app only inserts a row (enqueue_url_jobs) and answers right away;
+worker processes (worker.py) claim queued rows, fetch and score the
+article, store the Submission and mark the job done or failed. The two
+sides share nothing but the database, so any number of workers can run.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import func, or_, select, update
+
+from app import db
+from models import AnalysisJob, Submission
+from utils.batching import _summarize
+from utils.metrics import start_flusher, stage
+from utils.profiling import profile_job
+
+# Attempts per job; fetch errors are retried until this many have been made
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+# Seconds before the first retry of a job after a fetch error; doubled on
+# every further attempt
+JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 5))
+
+# Upper bound on the delay before a retry, in seconds
+JOB_RETRY_BACKOFF_MAX = float(os.environ.get('JOB_RETRY_BACKOFF_MAX', 300))
+
+# Seconds an idle worker waits before looking for queued jobs again
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 0.5))
+
+# Seconds after which a running job is presumed lost (its worker died) and
+# is queued again
+JOB_STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', 120))
+
+# Worker threads started inside each web process, for deployments that
+# cannot run worker.py next to the web app (0 disables them)
+JOB_INLINE_THREADS = int(os.environ.get('JOB_INLINE_THREADS', 0))
+
+# Seconds after which a queued job's page says that no worker seems to be running
+JOB_UNCLAIMED_WARNING = float(os.environ.get('JOB_UNCLAIMED_WARNING', 30))
+
+# Finished jobs sampled for the latency metrics
+LATENCY_SAMPLE = 500
+
+FINISHED_STATUSES = ('done', 'failed')
+
+# Set when a job is enqueued so that inline workers don't wait for the poll
+_wakeup = threading.Event()
+
+_inline_lock = threading.Lock()
+_inline_pid = None
+
+
+def enqueue_url_jobs(user_id, urls):
+    """Queue one analysis job per URL and return the jobs"""
+    jobs = [AnalysisJob(user_id=user_id, url=url[:500], status='queued') for url in urls]
+    db.session.add_all(jobs)
+    db.session.commit()
+
+    if JOB_INLINE_THREADS:
+        from flask import current_app
+        start_inline_workers(current_app._get_current_object())
+        _wakeup.set()
+    return jobs
+
+
+def enqueue_url_job(user_id, url):
+    return enqueue_url_jobs(user_id, [url])[0]
+
+
+def claim_job(worker_name):
+    """Move the oldest queued job that is due to 'running' and return it, or None if there is none"""
+    for _ in range(5):
+        due = or_(AnalysisJob.run_after.is_(None), AnalysisJob.run_after <= datetime.utcnow())
+        candidate = select(AnalysisJob.id).where(AnalysisJob.status == 'queued', due)\
+                                          .order_by(AnalysisJob.created_at, AnalysisJob.id)\
+                                          .limit(1)
+        if db.engine.dialect.name == 'postgresql':
+            # Concurrent workers skip rows another worker is claiming
+            candidate = candidate.with_for_update(skip_locked=True)
+        job_id = db.session.execute(candidate).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+
+        # Compare-and-set on the status, so only one worker wins a job
+        claimed = db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == 'queued')
+            .values(status='running', worker=worker_name, started_at=datetime.utcnow(),
+                    attempts=AnalysisJob.attempts + 1, run_after=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(AnalysisJob, job_id, populate_existing=True)
+    return None
+
+
+def process_job(job):
+    """Fetch, extract and score the job's URL, then store the Submission"""
+    from utils.content_extractor import fetch_article
+    from utils.ml_utils import predict_news_batched
+    from utils.near_duplicates import fingerprint_text, lookup_verdict, record_fingerprint
+
+    try:
+        title, content = fetch_article(job.url)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        print(f"Error fetching URL for job {job.id}: {e}")
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            job.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+            return finish_job(job, 'queued', error='Could not reach the URL yet; retrying shortly.')
+        return finish_job(job, 'failed', error='Could not reach the URL. Please try again later.')
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching URL for job {job.id}: {e}")
+        return finish_job(job, 'failed', error='Could not fetch the URL. Please try a different URL or use text input.')
+    except Exception as e:
+        print(f"Error parsing content for job {job.id}: {e}")
+        return finish_job(job, 'failed', error='Could not extract content from the URL.')
+
+    if not title or not content:
+        return finish_job(job, 'failed',
+                          error='Could not extract content from the URL. Please try a different URL or use text input.')
+
+    # Re-hosted copies of a stored article reuse its verdict
+    signature = fingerprint_text(content)
+    match, verdict = lookup_verdict(signature)
+    result, confidence, model_version = verdict or predict_news_batched(content)
+
+    submission = Submission(
+        user_id=job.user_id,
+        article_title=title[:200],
+        article_content=content[:1000],  # Truncate for storage
+        source_type='url',
+        source_url=job.url,
+        result=result,
+        confidence=confidence,
+        model_version=model_version
+    )
+    db.session.add(submission)
+    with stage('commit'):
+        record_fingerprint(submission, signature, match)
+        return finish_job(job, 'done', submission=submission)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times"""
+    return min(JOB_RETRY_BACKOFF * 2 ** max(attempts - 1, 0), JOB_RETRY_BACKOFF_MAX)
+
+
+def finish_job(job, status, error=None, submission=None):
+    job.status = status
+    job.error = error[:500] if error else None
+    if submission is not None:
+        job.submission = submission
+    if status in FINISHED_STATUSES:
+        job.finished_at = datetime.utcnow()
+    else:
+        job.worker = None
+    db.session.commit()
+    return job
+
+
+def requeue_stale_jobs():
+    """Queue again (or fail, once out of attempts) jobs whose worker has died"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    stale = (AnalysisJob.status == 'running', AnalysisJob.started_at < cutoff)
+
+    requeued = db.session.execute(
+        update(AnalysisJob)
+        .where(*stale, AnalysisJob.attempts < JOB_MAX_ATTEMPTS)
+        .values(status='queued', worker=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    failed = db.session.execute(
+        update(AnalysisJob)
+        .where(*stale, AnalysisJob.attempts >= JOB_MAX_ATTEMPTS)
+        .values(status='failed', error='The analysis did not finish. Please try again.',
+                finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return requeued + failed
+
+
+def work(app, stop_event):
+    """Claim and process jobs until ``stop_event`` is set"""
+    worker_name = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+    next_sweep = 0
+    # Share this process's stage timings with the web app's /metrics (METRICS_DIR)
+    start_flusher()
+
+    while not stop_event.is_set():
+        job = None
+        with app.app_context():
+            try:
+                if time.monotonic() >= next_sweep:
+                    requeue_stale_jobs()
+                    next_sweep = time.monotonic() + JOB_STALE_AFTER / 2
+
+                job = claim_job(worker_name)
+                if job is not None:
+                    with profile_job(job):
+                        process_job(job)
+            except Exception as e:
+                print(f"Error processing analysis job: {e}")
+                db.session.rollback()
+                if job is not None:
+                    _fail_quietly(job.id, 'Error analyzing the article. Please try again.')
+
+        if job is None:
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def _fail_quietly(job_id, error):
+    try:
+        db.session.execute(
+            update(AnalysisJob).where(AnalysisJob.id == job_id)
+            .values(status='failed', error=error, finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+    except Exception as e:
+        print(f"Error marking job {job_id} as failed: {e}")
+        db.session.rollback()
+
+
+def start_inline_workers(app):
+    """Start JOB_INLINE_THREADS worker threads in this process, once per process"""
+    global _inline_pid
+
+    pid = os.getpid()
+    if _inline_pid == pid:
+        return
+    with _inline_lock:
+        if _inline_pid == pid:
+            return
+        _inline_pid = pid
+        stop_event = threading.Event()
+        for index in range(JOB_INLINE_THREADS):
+            threading.Thread(target=work, args=(app, stop_event),
+                             name=f'job-worker-{index}', daemon=True).start()
+
+
+def job_to_dict(job):
+    def iso(value):
+        return value.isoformat() + 'Z' if value else None
+
+    # Queued for long with no worker threads in this process: worker.py is
+    # probably not running
+    unclaimed = (job.status == 'queued' and not job.attempts and not JOB_INLINE_THREADS
+                 and job.created_at is not None
+                 and (datetime.utcnow() - job.created_at).total_seconds() > JOB_UNCLAIMED_WARNING)
+
+    return {
+        'id': job.id,
+        'url': job.url,
+        'status': job.status,
+        'unclaimed': unclaimed,
+        'attempts': job.attempts,
+        'error': job.error,
+        'submission_id': job.submission_id,
+        'created_at': iso(job.created_at),
+        'started_at': iso(job.started_at),
+        'finished_at': iso(job.finished_at),
+        'run_after': iso(job.run_after),
+    }
+
+
+def get_queue_stats():
+    """Queue depth per status plus queue-wait and end-to-end latency of recent jobs"""
+    counts = dict(db.session.query(AnalysisJob.status, func.count()).group_by(AnalysisJob.status).all())
+    oldest_queued = db.session.query(func.min(AnalysisJob.created_at))\
+                              .filter(AnalysisJob.status == 'queued').scalar()
+
+    recent = db.session.query(AnalysisJob.created_at, AnalysisJob.started_at, AnalysisJob.finished_at)\
+                       .filter(AnalysisJob.finished_at.is_not(None))\
+                       .order_by(AnalysisJob.finished_at.desc())\
+                       .limit(LATENCY_SAMPLE).all()
+    waits = sorted((started - created).total_seconds() * 1000
+                   for created, started, _ in recent if created and started)
+    latencies = sorted((finished - created).total_seconds() * 1000
+                       for created, _, finished in recent if created)
+
+    return {
+        'queued': counts.get('queued', 0),
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_queued_seconds': (datetime.utcnow() - oldest_queued).total_seconds() if oldest_queued else 0.0,
+        'inline_threads': JOB_INLINE_THREADS,
+        'wait_ms': _summarize(waits),
+        'latency_ms': _summarize(latencies),
+    }
+
+
+def prune_finished_jobs(days):
+    """Delete finished jobs older than ``days`` days; returns the number deleted"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.session.execute(
+        AnalysisJob.__table__.delete()
+        .where(AnalysisJob.status.in_(FINISHED_STATUSES), AnalysisJob.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
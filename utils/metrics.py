@@ -0,0 +1,437 @@
+"""
+Prometheus metrics and per-stage request timing.
+
+init_app registers request hooks that count and time requests per
+endpoint, SQLAlchemy engine events that time every query, and a /metrics
+endpoint serving the metrics in the Prometheus text format. Code on the
+request path wraps its steps in ``stage('name')``: each stage feeds a
+latency histogram and, when it runs on a request's thread, that request's
+Server-Timing header, so the breakdown shows in an admin's browser network
+panel.
+
+Metrics are kept in the memory of each process. With METRICS_DIR set,
+every process (gunicorn workers and worker.py processes alike) also writes
+its metrics to a file there every METRICS_FLUSH_INTERVAL seconds, and
+/metrics adds all the files up, so one scrape covers every process.
+"""
+
+import bisect
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Directory shared by the processes of one deployment (unset: per process)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
+# Seconds between writes of this process's metrics to METRICS_DIR
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Token a scraper sends as "Authorization: Bearer <token>"; without it only
+# a logged-in admin can read /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Who gets a Server-Timing header with the stage breakdown: 'admin' (logged-in
+# admins only), 'all' (every client, e.g. in development) or 'off'
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'admin').lower()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_registry = {}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry[name] = self
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+
+class Counter(_Metric):
+    """Monotonic count per label tuple"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._collectors = []
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect_from(self, collector):
+        """Add the ``{labels: total}`` dict returned by ``collector()`` whenever the counter is read"""
+        self._collectors.append(collector)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for collector in self._collectors:
+            for labels, value in collector().items():
+                values[labels] = values.get(labels, 0) + value
+        return values
+
+
+class Histogram(_Metric):
+    """Bucketed distribution (plus sum and count) per label tuple"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        # Values equal to a bound belong to its bucket (le = less or equal)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+
+REQUESTS = Counter('newsdetector_http_requests_total', 'HTTP requests handled',
+                   ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = Histogram('newsdetector_http_request_duration_seconds',
+                            'Time from the start of a request until its response is returned by the view',
+                            ('endpoint', 'method'))
+REQUEST_QUERIES = Histogram('newsdetector_http_request_db_queries', 'Database queries run per request',
+                            ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+STAGE_SECONDS = Histogram('newsdetector_stage_duration_seconds', 'Time spent in each processing stage',
+                          ('stage',))
+DB_QUERY_SECONDS = Histogram('newsdetector_db_query_duration_seconds', 'Database query execution time')
+CACHE_LOOKUPS = Counter('newsdetector_cache_lookups_total', 'Cache lookups by cache and outcome',
+                        ('cache', 'outcome'))
+
+# Timing of the request running on this thread
+_current = threading.local()
+
+
+def _start_request():
+    _current.started = time.perf_counter()
+    _current.stages = {}
+    _current.queries = 0
+    _current.query_seconds = 0.0
+
+
+def _end_request():
+    _current.started = None
+    _current.stages = None
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, (name,))
+    stages = getattr(_current, 'stages', None)
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as processing stage ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def _record_query(seconds):
+    DB_QUERY_SECONDS.observe(seconds)
+    if getattr(_current, 'stages', None) is not None:
+        _current.queries += 1
+        _current.query_seconds += seconds
+
+
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if started:
+        _record_query(time.perf_counter() - started.pop())
+
+
+def _query_failed(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get('metrics_started') if connection is not None else None
+    if started:
+        _record_query(time.perf_counter() - started.pop())
+
+
+def _before_render(sender, template, context, **extra):
+    if getattr(_current, 'stages', None) is not None:
+        _current.render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    started = getattr(_current, 'render_started', None)
+    if started is not None:
+        _current.render_started = None
+        record_stage('render', time.perf_counter() - started)
+
+
+def current_timings():
+    """Stage and query timings (in ms) of the request on this thread so far, or None outside a request"""
+    stages = getattr(_current, 'stages', None)
+    if stages is None:
+        return None
+    return {
+        'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in stages.items()},
+        'queries': _current.queries,
+        'query_ms': round(_current.query_seconds * 1000, 2),
+    }
+
+
+def server_timing(elapsed):
+    """Server-Timing header value for the request on this thread"""
+    parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in _current.stages.items()]
+    if _current.queries:
+        parts.append(f'db;desc="{_current.queries} queries";dur={_current.query_seconds * 1000:.2f}')
+    parts.append(f'total;dur={elapsed * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def _before_request():
+    start_flusher()
+    _start_request()
+
+
+def _after_request(response):
+    started = getattr(_current, 'started', None)
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+    REQUEST_SECONDS.observe(elapsed, (endpoint, request.method))
+    REQUEST_QUERIES.observe(_current.queries, (endpoint,))
+    if SERVER_TIMING in ('all', '1', 'true', 'yes') or (SERVER_TIMING == 'admin' and _is_admin()):
+        response.headers['Server-Timing'] = server_timing(elapsed)
+    return response
+
+
+def _teardown_request(error):
+    _end_request()
+
+
+def snapshot():
+    """This process's metrics as a JSON-serializable dict"""
+    families = {}
+    for name, metric in _registry.items():
+        family = {
+            'kind': metric.kind,
+            'help': metric.documentation,
+            'labelnames': list(metric.labelnames),
+            'samples': [[list(labels), value] for labels, value in metric.samples().items()],
+        }
+        if metric.kind == 'histogram':
+            family['buckets'] = list(metric.buckets)
+        families[name] = family
+    return families
+
+
+def merge(snapshots):
+    """Add up the samples of several snapshots"""
+    merged = {}
+    for families in snapshots:
+        for name, family in families.items():
+            target = merged.setdefault(name, dict(family, samples={}))
+            samples = target['samples']
+            for labels, value in family['samples']:
+                labels = tuple(labels)
+                if family['kind'] == 'histogram':
+                    counts, total = samples.get(labels, ([0] * len(value[0]), 0.0))
+                    samples[labels] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                else:
+                    samples[labels] = samples.get(labels, 0) + value
+    return merged
+
+
+def _add_hit_ratios(merged):
+    # Share of lookups answered from each cache (everything but 'miss')
+    lookups = {}
+    for (cache, outcome), value in merged.get(CACHE_LOOKUPS.name, {'samples': {}})['samples'].items():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (value if outcome != 'miss' else 0), total + value)
+    merged['newsdetector_cache_hit_ratio'] = {
+        'kind': 'gauge',
+        'help': 'Share of cache lookups that were hits',
+        'labelnames': ['cache'],
+        'samples': {(cache,): (hits / total if total else 0.0) for cache, (hits, total) in lookups.items()},
+    }
+
+
+def _snapshot_name():
+    return f'{os.getpid()}-{_process_started}.json'
+
+
+def collect():
+    """Merged metrics of this process and of every process that wrote to METRICS_DIR"""
+    snapshots = [snapshot()]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        own_name = _snapshot_name()
+        for entry in os.scandir(METRICS_DIR):
+            if not entry.name.endswith('.json') or entry.name == own_name:
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or being replaced while we read it
+                continue
+    merged = merge(snapshots)
+    _add_hit_ratios(merged)
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def render(merged):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name in sorted(merged):
+        family = merged[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        names = family['labelnames']
+        for labels, value in sorted(family['samples'].items()):
+            if family['kind'] != 'histogram':
+                lines.append(f'{name}{_format_labels(names, labels)} {_format_value(value)}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(family['buckets'] + ['+Inf'], counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                lines.append(f"{name}_bucket{_format_labels(names, labels, [('le', le)])} {cumulative}")
+            lines.append(f'{name}_sum{_format_labels(names, labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _is_admin():
+    return current_user.is_authenticated and current_user.role == 'admin'
+
+
+def metrics_view():
+    # Route names, latencies and cache ratios are not public: fail closed
+    authorized = (METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                        f'Bearer {METRICS_TOKEN}'))
+    if not authorized and not _is_admin():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def write_snapshot():
+    """Write this process's metrics to METRICS_DIR, replacing its previous file"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _snapshot_name())
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(temp_path, path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def start_flusher():
+    """Start writing this process's metrics to METRICS_DIR in the background, once per process"""
+    global _flusher_pid
+
+    pid = os.getpid()
+    if METRICS_DIR is None or _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+        threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+
+
+def clear_metrics_dir():
+    """Remove the metric files of earlier runs (call before any process of a deployment starts)"""
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for entry in os.scandir(METRICS_DIR):
+            if entry.name.endswith(('.json', '.tmp')):
+                os.remove(entry.path)
+
+
+def _reset_after_fork():
+    # Forked workers start from zero instead of repeating the parent's counts
+    global _process_started, _flusher_lock
+    _process_started = time.time_ns()
+    _flusher_lock = threading.Lock()
+    for metric in _registry.values():
+        metric.reset()
+
+
+_process_started = time.time_ns()
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def init_app(app):
+    """Time the app's requests and database queries and serve /metrics"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_query):
+        event.listen(Engine, 'before_cursor_execute', _before_query)
+        event.listen(Engine, 'after_cursor_execute', _after_query)
+        event.listen(Engine, 'handle_error', _query_failed)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
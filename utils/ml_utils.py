@@ -1,45 +1,214 @@
 import os
-import joblib
+import hashlib
+import threading
+import time
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-import re
 import string
+from collections import namedtuple
+from datetime import datetime
+from utils.batching import MicroBatcher
+from utils.prediction_cache import PredictionCache, make_key
+from utils.text_normalizer import normalize_text, iter_normalized
+from utils.streaming_features import StreamingTermCounter
+from utils.hashed_model import load_artifact
+from utils.model_io import load_mapped
+from utils.file_watcher import FileWatcher
+from utils.metrics import CACHE_LOOKUPS, stage
 
 # Global variables for model and vectorizer
 model = None
 vectorizer = None
+model_version = None
 
-def load_model():
-    """Load the trained model and vectorizer"""
-    global model, vectorizer
+# The (model, vectorizer, version) triple being served. Predictions read it
+# once, so a reload swapping in a new bundle never mixes two models.
+ModelBundle = namedtuple('ModelBundle', ['model', 'vectorizer', 'version'])
+_bundle = None
+
+# Version reported for the built-in demonstration model
+SIMPLE_MODEL_VERSION = 'builtin-demo'
+
+# Version reported for heuristic fallback predictions
+HEURISTIC_VERSION = 'heuristic'
+
+# Characters of a streamed article kept for the heuristic fallback
+HEURISTIC_FALLBACK_CHARS = 100000
+
+MODEL_DIR = os.environ.get('MODEL_DIR') or os.path.join(os.path.dirname(__file__), '..', 'ml_model')
+
+# 'sklearn' serves model.pkl; 'hashed' serves the compact serving.pkl
+# artifact exported by `train_model.py --export-serving`
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'sklearn')
+
+# Memory-map the model arrays read-only so that gunicorn workers forked from
+# a preloading master (see gunicorn.conf.py) share them through the page cache
+MODEL_MMAP = os.environ.get('MODEL_MMAP', '1').lower() not in ('0', 'false', 'no')
+
+# Seconds between checks of the model file for a new version (0 disables)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 10))
+
+# Scored once by every newly loaded model before it is swapped in
+WARMUP_TEXT = 'government officials said the study found the economy grew'
+
+# Prediction cache keyed on preprocessed text + model version.
+# PREDICTION_CACHE_DB enables the SQLite tier shared across workers.
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 86400)),
+    db_path=os.environ.get('PREDICTION_CACHE_DB') or None
+)
+
+_reload_lock = threading.Lock()
+_reload_stats = {
+    'reloads': 0,
+    'swaps': 0,
+    'unchanged': 0,
+    'failures': 0,
+    'total_reload_ms': 0.0,
+    'last_reload_ms': None,
+    'last_reload_source': None,
+    'last_swap_at': None,
+    'last_error': None,
+}
+
+def file_version(path):
+    """Content hash identifying a model artifact"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def get_model_path():
+    """Path of the artifact served by the configured backend"""
+    if MODEL_BACKEND == 'hashed':
+        return os.path.join(MODEL_DIR, 'serving.pkl')
+    return os.path.join(MODEL_DIR, 'model.pkl')
+
+def read_bundle(path):
+    """Load and warm up a model artifact without touching the one being served"""
+    mmap_mode = 'r' if MODEL_MMAP else None
     
-    model_path = os.path.join(os.path.dirname(__file__), '..', 'ml_model', 'model.pkl')
+    if MODEL_BACKEND == 'hashed':
+        # Dense weight vector scored without any sklearn objects
+        new_model, new_vectorizer = load_artifact(path, mmap_mode=mmap_mode)
+        version = new_model.version
+    else:
+        model_data = load_mapped(path, mmap_mode)
+        new_model = model_data['model']
+        new_vectorizer = model_data['vectorizer']
+        version = model_data.get('version')
     
-    try:
-        # Load the saved model and vectorizer
-        model_data = joblib.load(model_path)
-        model = model_data['model']
-        vectorizer = model_data['vectorizer']
-        return True
-    except FileNotFoundError:
-        # If model doesn't exist, create a simple one
-        create_simple_model()
-        return True
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        create_simple_model()
+    # Artifacts from before versioning are identified by their content hash
+    version = str(version or file_version(path))
+    
+    # Score one document so an unusable artifact fails here and not in a
+    # request, and so the mapped pages are read in before the swap
+    probabilities = new_model.predict_proba(new_vectorizer.transform([WARMUP_TEXT]))
+    if probabilities.shape != (1, 2):
+        raise ValueError(f'Expected a binary classifier, got output of shape {probabilities.shape}')
+    
+    return ModelBundle(new_model, new_vectorizer, version)
+
+def swap_bundle(bundle):
+    """Atomically start serving ``bundle``"""
+    global _bundle, model, vectorizer, model_version
+    
+    _bundle = bundle
+    model, vectorizer, model_version = bundle
+    prediction_cache.invalidate(bundle.version)
+
+def reload_model(source='manual', force=False):
+    """Load the model file and swap it in if its version differs from the one served.
+    
+    Returns a status dict. If loading fails, the current model keeps serving.
+    """
+    with _reload_lock:
+        started = time.perf_counter()
+        previous_version = model_version
+        status = {'source': source, 'previous_version': previous_version}
+        
+        try:
+            watcher.mark_current()
+            bundle = read_bundle(get_model_path())
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            status.update(status='failed', error=str(e), version=previous_version)
+        else:
+            if bundle.version == previous_version and not force:
+                status.update(status='unchanged', version=previous_version)
+            else:
+                swap_bundle(bundle)
+                status.update(status='swapped', version=bundle.version)
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        status['load_ms'] = elapsed_ms
+        
+        _reload_stats['reloads'] += 1
+        _reload_stats['total_reload_ms'] += elapsed_ms
+        _reload_stats['last_reload_ms'] = elapsed_ms
+        _reload_stats['last_reload_source'] = source
+        if status['status'] == 'swapped':
+            _reload_stats['swaps'] += 1
+            _reload_stats['last_swap_at'] = datetime.utcnow().isoformat()
+        elif status['status'] == 'unchanged':
+            _reload_stats['unchanged'] += 1
+        else:
+            _reload_stats['failures'] += 1
+            _reload_stats['last_error'] = status['error']
+        
+        return status
+
+def reload_model_async(source='admin', force=False):
+    """Reload the model in a background thread; False if a reload is already running"""
+    if _reload_lock.locked():
+        return False
+    thread = threading.Thread(target=reload_model, kwargs={'source': source, 'force': force},
+                              name='model-reload', daemon=True)
+    thread.start()
+    return True
+
+def load_model():
+    """Load the trained model and vectorizer"""
+    status = reload_model(source='startup', force=True)
+    if status['status'] == 'swapped':
         return True
+    
+    # Nothing usable on disk yet: serve the demonstration model until a
+    # trained artifact appears and the watcher picks it up
+    print(f"Serving the built-in demonstration model ({get_model_path()} could not be loaded)")
+    create_simple_model()
+    return False
+
+def get_model_stats():
+    """Served model version plus reload latency and swap counters"""
+    stats = dict(_reload_stats)
+    reloads = stats['reloads']
+    stats.update(
+        version=model_version,
+        reloading=_reload_lock.locked(),
+        backend=MODEL_BACKEND,
+        path=get_model_path(),
+        mean_reload_ms=(stats['total_reload_ms'] / reloads) if reloads else 0.0,
+        watch_interval=MODEL_WATCH_INTERVAL,
+        file_changes_seen=watcher.changes,
+    )
+    return stats
+
+def get_model_version():
+    """Version of the model currently served"""
+    return _bundle.version
 
 def create_simple_model():
     """Create a simple model for demonstration"""
-    global model, vectorizer
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
     
     # Create a simple TF-IDF vectorizer
-    vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
+    demo_vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
     
     # Create a simple logistic regression model
-    model = LogisticRegression(random_state=42)
+    demo_model = LogisticRegression(random_state=42)
     
     # Train with some dummy data for demonstration
     dummy_texts = [
@@ -53,57 +222,202 @@ def create_simple_model():
     dummy_labels = [1, 0, 1, 0, 1, 0]  # 1 = Real, 0 = Fake
     
     # Fit vectorizer and model
-    X = vectorizer.fit_transform(dummy_texts)
-    model.fit(X, dummy_labels)
+    X = demo_vectorizer.fit_transform(dummy_texts)
+    demo_model.fit(X, dummy_labels)
+    
+    swap_bundle(ModelBundle(demo_model, demo_vectorizer, SIMPLE_MODEL_VERSION))
 
 def preprocess_text(text):
     """Clean and preprocess text for analysis"""
     if not text:
         return ""
     
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters and digits
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Remove extra whitespace
-    text = ' '.join(text.split())
-    
-    return text
+    # Lowercase, remove special characters and digits, collapse whitespace
+    return normalize_text(text)
 
 def predict_news(text):
     """Predict if news is fake or real"""
-    global model, vectorizer
+    return predict_news_batch([text])[0]
+
+def predict_news_batch(texts, return_versions=False):
+    """Predict fake/real for many articles in a single vectorize + predict_proba pass.
+    
+    With ``return_versions`` returns ``(predictions, model_versions)``, the
+    version that produced each prediction: cached and scored articles carry
+    the model's version, those scored by the fallback heuristic
+    HEURISTIC_VERSION.
+    """
+    # Pick up new model files in this process
+    watcher.start()
     
-    # Load model if not already loaded
-    if model is None or vectorizer is None:
-        load_model()
+    # Every article in the batch is scored by the same model
+    bundle = _bundle
     
-    # Preprocess text
-    cleaned_text = preprocess_text(text)
+    # Preprocess every document up front
+    with stage('preprocess'):
+        cleaned_texts = [preprocess_text(text) for text in texts]
     
-    if not cleaned_text:
-        return "REAL", 50.0  # Default for empty text
+    results = [("REAL", 50.0)] * len(texts)  # Default for empty text
+    versions = [bundle.version] * len(texts)
+    indices = [i for i, cleaned in enumerate(cleaned_texts) if cleaned]
+    
+    if not indices:
+        return (results, versions) if return_versions else results
+    
+    # Serve repeated articles from the prediction cache
+    with stage('cache'):
+        keys = {i: make_key(cleaned_texts[i], bundle.version) for i in indices}
+        cached = prediction_cache.get_many(list(keys.values()))
+    
+    pending = []
+    for i in indices:
+        if keys[i] in cached:
+            results[i] = tuple(cached[keys[i]])
+        else:
+            pending.append(i)
+    
+    if not pending:
+        return (results, versions) if return_versions else results
     
     try:
-        # Vectorize the text
-        X = vectorizer.transform([cleaned_text])
+        # Vectorize all uncached documents into one sparse matrix
+        with stage('vectorize'):
+            X = bundle.vectorizer.transform([cleaned_texts[i] for i in pending])
         
-        # Get prediction and probability
-        prediction = model.predict(X)[0]
-        probabilities = model.predict_proba(X)[0]
+        # A single predict_proba call gives both the label and the confidence
+        with stage('predict'):
+            probabilities = bundle.model.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        labels = bundle.model.classes_[best]
+        confidences = probabilities[np.arange(len(pending)), best] * 100
         
-        # Convert to result format
-        result = "REAL" if prediction == 1 else "FAKE"
-        confidence = max(probabilities) * 100
+        scored = {}
+        for i, label, confidence in zip(pending, labels, confidences):
+            # Convert to result format
+            results[i] = ("REAL" if label == 1 else "FAKE", float(confidence))
+            scored[keys[i]] = results[i]
         
-        return result, confidence
+        prediction_cache.set_many(list(scored.items()), bundle.version)
+        
+        return (results, versions) if return_versions else results
         
     except Exception as e:
         print(f"Error in prediction: {e}")
-        # Return a simple heuristic-based prediction
-        return heuristic_prediction(text)
+        # Return a simple heuristic-based prediction for the articles that
+        # were not served from the cache
+        for i in pending:
+            results[i] = heuristic_prediction(texts[i])
+            versions[i] = HEURISTIC_VERSION
+        return (results, versions) if return_versions else results
+
+def predict_news_versioned(texts):
+    """predict_news_batch, with the producing model version added to each prediction"""
+    predictions, versions = predict_news_batch(texts, return_versions=True)
+    return [(result, confidence, version) for (result, confidence), version in zip(predictions, versions)]
+
+def predict_news_stream(chunks, return_version=False, also_feed=()):
+    """Predict one article given as an iterable of text chunks, without joining them.
+    
+    Gives the same prediction as predict_news on the joined text while only
+    one chunk and the n-gram counts are held in memory. Each normalized
+    segment is also passed to the ``feed`` method of every object in
+    ``also_feed``. With ``return_version`` returns
+    ``(result, confidence, model_version)``.
+    """
+    watcher.start()
+    bundle = _bundle
+    
+    # The start of the raw text, for the heuristic fallback if the model fails
+    fallback_chunks = []
+    def remember(chunks):
+        kept = 0
+        for chunk in chunks:
+            if kept < HEURISTIC_FALLBACK_CHARS:
+                fallback_chunks.append(chunk[:HEURISTIC_FALLBACK_CHARS - kept])
+                kept += len(fallback_chunks[-1])
+            yield chunk
+    
+    error = None
+    segments = 0
+    try:
+        counter = StreamingTermCounter(bundle.vectorizer)
+    except Exception as e:
+        counter, error = None, e
+    
+    # Normalizing and counting happen together, so they are timed as one stage.
+    # The stream is read to the end even if counting fails, for ``also_feed``.
+    with stage('vectorize'):
+        for segment in iter_normalized(remember(chunks)):
+            segments += 1
+            if counter is not None:
+                try:
+                    counter.feed(segment)
+                except Exception as e:
+                    counter, error = None, e
+            for consumer in also_feed:
+                consumer.feed(segment)
+    
+    version = bundle.version
+    if not segments:
+        result = ("REAL", 50.0)  # Default for empty text
+    else:
+        try:
+            if counter is None:
+                raise error
+            X = counter.transform()
+            with stage('predict'):
+                probabilities = bundle.model.predict_proba(X)[0]
+            best = int(probabilities.argmax())
+            label = bundle.model.classes_[best]
+            result = ("REAL" if label == 1 else "FAKE", float(probabilities[best] * 100))
+        except Exception as e:
+            print(f"Error in prediction: {e}")
+            # Return a simple heuristic-based prediction, as predict_news_batch does
+            result = heuristic_prediction(''.join(fallback_chunks))
+            version = HEURISTIC_VERSION
+    
+    return result + (version,) if return_version else result
+
+# Polls the model file and hot-reloads it in the background
+watcher = FileWatcher(get_model_path(), lambda: reload_model(source='watcher'), MODEL_WATCH_INTERVAL)
+
+# Micro-batcher that groups concurrent single-article requests into one batch.
+# Set PREDICT_MAX_BATCH_SIZE=1 to score every request on its own.
+batcher = MicroBatcher(
+    predict_news_versioned,
+    max_batch_size=int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('PREDICT_MAX_WAIT_MS', 5))
+)
+
+def predict_news_batched(text):
+    """Predict a single article through the shared micro-batcher.
+    
+    Returns ``(result, confidence, model_version)``.
+    """
+    # Includes the wait for the batch; its stages are timed on the batcher's thread
+    with stage('inference'):
+        if batcher.max_batch_size <= 1:
+            return predict_news_versioned([text])[0]
+        return batcher.call(text)
+
+def get_batcher_stats():
+    """Queue depth, batch-size histogram and wait-time metrics of the micro-batcher"""
+    return batcher.stats()
+
+def get_cache_stats():
+    """Hit, miss and eviction counters of the prediction cache"""
+    return prediction_cache.stats()
+
+def count_cache_lookups():
+    """Prediction cache lookups by outcome, for the metrics endpoint"""
+    stats = prediction_cache.stats()
+    return {
+        ('prediction', 'hit'): stats['hits'],
+        ('prediction', 'sqlite_hit'): stats['sqlite_hits'],
+        ('prediction', 'miss'): stats['misses'],
+    }
+
+CACHE_LOOKUPS.collect_from(count_cache_lookups)
 
 def heuristic_prediction(text):
     """Simple heuristic-based prediction as fallback"""
@@ -0,0 +1,66 @@
+"""
+Reading and writing model artifacts.
+
+Artifacts are plain (uncompressed) joblib pickles so that their NumPy arrays
+can be opened with ``joblib.load(mmap_mode='r')``: the arrays are then backed
+by the page cache and shared between every process that maps the file
+instead of being copied into each worker's heap.
+
+Because running workers may have a file mapped, artifacts are never
+rewritten in place. A new artifact is written next to the old one and
+renamed over it, so existing mappings keep reading the previous inode.
+
+Every published artifact carries a ``version`` and is also archived as
+``versions/<name>-<version>.pkl`` next to the served file.
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+import joblib
+
+VERSIONS_DIR = 'versions'
+
+
+def dump_atomic(obj, path):
+    """joblib.dump ``obj`` to ``path`` via a temporary file and an atomic rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        # mkstemp creates the file owner-only; use the usual umask-based mode
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        with os.fdopen(fd, 'wb') as f:
+            joblib.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_mapped(path, mmap_mode='r'):
+    """joblib.load ``path`` with its arrays memory-mapped (``mmap_mode=None`` copies them)"""
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def new_version():
+    """Unique, time-sortable version for a freshly trained artifact"""
+    return f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{os.urandom(3).hex()}"
+
+
+def publish_artifact(artifact, path):
+    """Archive a versioned artifact dict and atomically make it the one at ``path``"""
+    directory, name = os.path.split(os.path.abspath(path))
+    stem, extension = os.path.splitext(name)
+    archive_dir = os.path.join(directory, VERSIONS_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    archive_path = os.path.join(archive_dir, f"{stem}-{artifact['version']}{extension}")
+    dump_atomic(artifact, archive_path)
+    dump_atomic(artifact, path)
+    return archive_path
@@ -0,0 +1,232 @@
+"""
+Near-duplicate detection over stored submissions with MinHash and LSH.
+
+An article's normalized text (the preprocess_text output) is cut into
+overlapping SHINGLE_SIZE-word shingles. Its MinHash signature holds, for
+each of NUM_PERM independent hash functions, the smallest hash of any
+shingle; the fraction of positions where two signatures agree estimates
+the Jaccard similarity of their shingle sets.
+
+For sub-linear lookups the signature is cut into LSH_BANDS bands of
+LSH_ROWS values, and each band is hashed to a bucket stored in
+submission_lsh_buckets under its (band, bucket) primary key. A new article
+is only compared with the submissions sharing at least one bucket: two
+articles with similarity s share one with probability
+1 - (1 - s ** LSH_ROWS) ** LSH_BANDS, about 0.99 at s = 0.8 and 0.12 at
+s = 0.3. Only one query's candidates are ever loaded, however many
+submissions are stored.
+"""
+
+import hashlib
+import os
+import zlib
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import and_, bindparam, func, or_, select
+
+from app import db
+from models import Submission, SubmissionFingerprint, SubmissionLshBucket
+from utils.metrics import CACHE_LOOKUPS, stage
+from utils.text_normalizer import iter_normalized
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Estimated Jaccard similarity from which an article counts as a near
+# duplicate of a stored one
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.8))
+
+# Reuse the stored verdict of a near duplicate scored by the current model
+NEAR_DUPLICATE_REUSE = os.environ.get('NEAR_DUPLICATE_REUSE', '1').lower() not in ('0', 'false', 'no')
+
+# Shingles hashed per NumPy step (HASH_BLOCK_SIZE x NUM_PERM x 8 bytes),
+# and characters of an article normalized at a time
+HASH_BLOCK_SIZE = 4096
+TEXT_SLICE_SIZE = 64 * 1024
+
+# Most recent candidates compared per lookup, bounding the cost of buckets
+# crowded by boilerplate text
+MAX_CANDIDATES = 500
+
+# Multiply-shift hash functions h(x) = ((a * x + b) mod 2**64) >> 32 with odd
+# a; fixed seed, so signatures stay comparable across processes and restarts
+_random = np.random.RandomState(20240601)
+_A = (_random.randint(0, 2 ** 32, NUM_PERM, dtype=np.uint64) << np.uint64(32)
+      | _random.randint(0, 2 ** 32, NUM_PERM, dtype=np.uint64) | np.uint64(1))
+_B = _random.randint(0, 2 ** 32, NUM_PERM, dtype=np.uint64) << np.uint64(32)
+_SHIFT = np.uint64(32)
+
+NearDuplicate = namedtuple('NearDuplicate', ['submission_id', 'cluster_id', 'similarity'])
+
+# Candidate lookup, built once: one (band, bucket) term per band with the
+# bucket as a bind parameter, so each query only binds its 16 hashes
+_buckets = SubmissionLshBucket.__table__.c
+_CANDIDATES = select(_buckets.submission_id).where(or_(*(
+    and_(_buckets.band == band, _buckets.bucket == bindparam(f'bucket_{band}')) for band in range(LSH_BANDS)
+))).distinct().order_by(_buckets.submission_id.desc()).limit(MAX_CANDIDATES)
+_FIND_SIMILAR = select(SubmissionFingerprint.submission_id, SubmissionFingerprint.cluster_id,
+                       SubmissionFingerprint.signature)\
+    .where(SubmissionFingerprint.submission_id.in_(_CANDIDATES.scalar_subquery()))
+
+
+class MinHasher:
+    """Build the MinHash signature of a document from its normalized segments, fed in order"""
+
+    def __init__(self):
+        self.minima = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+        self.carry = []
+        self.shingles = 0
+
+    def feed(self, segment):
+        tokens = segment.split()
+        if not tokens:
+            return
+        window = self.carry + tokens
+        # Only shingles ending in this segment; earlier ones were hashed already
+        first = max(0, len(self.carry) - SHINGLE_SIZE + 1)
+        last = len(window) - SHINGLE_SIZE + 1
+        # In blocks, so a long segment never needs a (shingles x NUM_PERM) matrix
+        for start in range(first, last, HASH_BLOCK_SIZE):
+            self._add([' '.join(window[i:i + SHINGLE_SIZE]) for i in range(start, min(last, start + HASH_BLOCK_SIZE))])
+        self.carry = window[len(window) - SHINGLE_SIZE + 1:]
+
+    def _add(self, shingles):
+        if not shingles:
+            return
+        values = np.fromiter((zlib.crc32(shingle.encode('ascii')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        hashes = (values[:, None] * _A + _B) >> _SHIFT
+        np.minimum(self.minima, hashes.min(axis=0), out=self.minima)
+        self.shingles += len(shingles)
+
+    def signature(self):
+        """The uint32 signature, or None for an empty document"""
+        if not self.shingles and self.carry:
+            # Documents shorter than one shingle are a single shingle
+            self._add([' '.join(self.carry)])
+        if not self.shingles:
+            return None
+        return self.minima.astype(np.uint32)
+
+
+def fingerprint_text(text):
+    """MinHash signature of an article's normalized text, or None if it is empty"""
+    with stage('fingerprint'):
+        hasher = MinHasher()
+        # Normalized in slices, so long articles are never copied whole
+        for segment in iter_normalized(text[i:i + TEXT_SLICE_SIZE] for i in range(0, len(text), TEXT_SLICE_SIZE)):
+            hasher.feed(segment)
+        return hasher.signature()
+
+
+def band_buckets(signature):
+    """(band, bucket) pairs of a signature; the bucket is a signed 64-bit hash of the band's rows"""
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8).digest(),
+            'little', signed=True
+        ))
+        for band in range(LSH_BANDS)
+    ]
+
+
+def similarities(signature, signatures):
+    """Estimated Jaccard similarity of ``signature`` with each row of ``signatures``"""
+    return (signatures == signature).mean(axis=1)
+
+
+def find_similar(signature, threshold=None):
+    """The most similar stored submission at or above ``threshold``, as a NearDuplicate, or None"""
+    if signature is None:
+        return None
+    threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+
+    rows = db.session.execute(_FIND_SIMILAR, {
+        f'bucket_{band}': bucket for band, bucket in band_buckets(signature)
+    }).all()
+    if not rows:
+        return None
+
+    scores = similarities(signature, np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint32)
+                          .reshape(len(rows), NUM_PERM))
+    best = int(scores.argmax())
+    if scores[best] < threshold:
+        return None
+    return NearDuplicate(rows[best][0], rows[best][1], float(scores[best]))
+
+
+def lookup_verdict(signature):
+    """Find a near duplicate of ``signature``.
+
+    Returns ``(match, verdict)``: the NearDuplicate (or None) and, when the
+    match was scored by the model currently served and reuse is enabled,
+    its ``(result, confidence, model_version)`` to reuse instead of scoring.
+    """
+    from utils.ml_utils import get_model_version
+
+    with stage('dedupe'):
+        match = find_similar(signature)
+        if match is None or not NEAR_DUPLICATE_REUSE:
+            verdict = None
+        else:
+            previous = db.session.get(Submission, match.submission_id)
+            if previous is None or previous.model_version != get_model_version():
+                verdict = None
+            else:
+                verdict = (previous.result, previous.confidence, previous.model_version)
+
+    CACHE_LOOKUPS.inc(('near_duplicate', 'miss' if verdict is None else 'hit'))
+    return match, verdict
+
+
+def record_fingerprint(submission, signature, match=None):
+    """Store the signature and LSH buckets of a new submission, joining ``match``'s cluster"""
+    if signature is None:
+        return
+    if submission.id is None:
+        db.session.add(submission)
+        db.session.flush()
+
+    db.session.add(SubmissionFingerprint(
+        submission_id=submission.id,
+        signature=signature.tobytes(),
+        cluster_id=match.cluster_id if match else submission.id,
+        duplicate_of=match.submission_id if match else None,
+        similarity=match.similarity if match else None
+    ))
+    db.session.execute(SubmissionLshBucket.__table__.insert(), [
+        {'band': band, 'bucket': bucket, 'submission_id': submission.id}
+        for band, bucket in band_buckets(signature)
+    ])
+
+
+def cluster_size(cluster_id):
+    return db.session.query(func.count()).select_from(SubmissionFingerprint)\
+                     .filter(SubmissionFingerprint.cluster_id == cluster_id).scalar()
+
+
+def backfill_fingerprints(batch_size=1000):
+    """Fingerprint stored submissions that have none, oldest first; returns the number added.
+
+    Older submissions only keep the first 1000 characters of their text, so
+    their signatures are computed from that.
+    """
+    added = 0
+    last_id = 0
+    while True:
+        batch = Submission.query.outerjoin(SubmissionFingerprint)\
+                                .filter(SubmissionFingerprint.submission_id.is_(None), Submission.id > last_id)\
+                                .order_by(Submission.id).limit(batch_size).all()
+        if not batch:
+            return added
+        for submission in batch:
+            signature = fingerprint_text(submission.article_content)
+            record_fingerprint(submission, signature, find_similar(signature))
+            # Flush so that the next article can match this one
+            db.session.flush()
+            added += signature is not None
+        last_id = batch[-1].id
+        db.session.commit()
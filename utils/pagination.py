@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination for newest-first listings.
+
+Instead of OFFSET, each page continues from the sort key of the last (or
+first) row of the previous page, e.g. ``(timestamp, id) < (:ts, :id)``. With
+an index on the sort key every page costs the same, however deep it is, and
+no COUNT(*) is issued. Cursors are opaque URL-safe tokens.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import tuple_
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class CursorError(ValueError):
+    """The pagination cursor is malformed"""
+
+
+class KeysetPage:
+    """One page of results with the cursors of its neighbours"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Approximate number of rows across all pages, when cheaply known
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(value, column):
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction] + [_to_json(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Return ``(direction, values)`` of a cursor made by encode_cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        direction, values = payload[0], payload[1:]
+        if direction not in (NEXT, PREV) or len(values) != len(columns):
+            raise CursorError('Cursor does not match this listing')
+        return direction, [_from_json(value, column) for value, column in zip(values, columns)]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, IndexError) as e:
+        raise CursorError(f'Invalid cursor: {e}') from e
+
+
+def keyset_paginate(query, columns, per_page, cursor=None, total=None):
+    """Paginate ``query`` newest first by ``columns`` (e.g. timestamp, id).
+
+    ``columns`` must be unique together and, for constant-time pages, be the
+    trailing columns of an index matching the query's filters. An invalid
+    cursor starts again from the first page.
+    """
+    direction, values = NEXT, None
+    if cursor:
+        try:
+            direction, values = decode_cursor(cursor, columns)
+        except CursorError:
+            direction, values = NEXT, None
+
+    key = tuple_(*columns)
+    if direction == PREV:
+        # Walk backwards (ascending) from the first row of the later page
+        rows = query.filter(key > tuple(values))\
+                    .order_by(*[column.asc() for column in columns])\
+                    .limit(per_page + 1).all()
+        more_before = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = more_before, True
+    else:
+        if values is not None:
+            query = query.filter(key < tuple(values))
+        rows = query.order_by(*[column.desc() for column in columns])\
+                    .limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_prev, has_next = values is not None, len(rows) > per_page
+
+    def cursor_for(direction, item):
+        return encode_cursor(direction, [getattr(item, column.key) for column in columns])
+
+    return KeysetPage(
+        items,
+        per_page,
+        next_cursor=cursor_for(NEXT, items[-1]) if has_next and items else None,
+        prev_cursor=cursor_for(PREV, items[0]) if has_prev and items else None,
+        total=total
+    )
@@ -0,0 +1,178 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from utils.sqlite_store import SQLiteStore
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS prediction_cache (
+    key TEXT PRIMARY KEY,
+    model_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_prediction_cache_version ON prediction_cache (model_version);
+'''
+
+# Remove expired SQLite rows every this many writes
+PRUNE_EVERY = 1000
+
+
+def make_key(cleaned_text, model_version):
+    """Content address of a preprocessed article under a given model version"""
+    digest = hashlib.sha256()
+    digest.update(model_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(cleaned_text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Two-tier (in-process LRU + optional SQLite) cache of (result, confidence) pairs.
+
+    Keys come from :func:`make_key`, so a new model version never sees entries
+    written by an older one. Both tiers expire entries after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size=10000, ttl=86400, db_path=None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl)
+        self.model_version = None
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._store = SQLiteStore(db_path, SCHEMA) if db_path else None
+        self._writes = 0
+
+        self.hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get_many(self, keys):
+        """Return a dict of the cached values found for ``keys``"""
+        now = time.time()
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] > self.ttl:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.hits += 1
+
+        if missing and self._store is not None:
+            for key, value, created_at in self._sqlite_get(missing, now):
+                found[key] = value
+                self._remember(key, value, created_at)
+                with self._lock:
+                    self.sqlite_hits += 1
+
+        with self._lock:
+            self.misses += sum(1 for key in keys if key not in found)
+
+        return found
+
+    def set_many(self, items, model_version):
+        """Store ``(key, (result, confidence))`` pairs scored by ``model_version`` in both tiers"""
+        # A reload since scoring already invalidated that version; its keys can never be hit again
+        if model_version != self.model_version:
+            return
+
+        now = time.time()
+        for key, value in items:
+            self._remember(key, value, now)
+
+        if self._store is not None and items:
+            self._sqlite_set(items, model_version, now)
+
+    def invalidate(self, model_version):
+        """Drop every entry that was not produced by ``model_version``"""
+        with self._lock:
+            if self.model_version == model_version:
+                return
+            self.model_version = model_version
+            self._entries.clear()
+            self.invalidations += 1
+
+        if self._store is not None:
+            try:
+                conn = self._store.connection()
+                conn.execute('DELETE FROM prediction_cache WHERE model_version != ?', (model_version,))
+            except Exception as e:
+                print(f"Error invalidating prediction cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.sqlite_hits + self.misses
+            return {
+                'model_version': self.model_version,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'sqlite_enabled': self._store is not None,
+                'hits': self.hits,
+                'sqlite_hits': self.sqlite_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': ((self.hits + self.sqlite_hits) / lookups) if lookups else 0.0,
+            }
+
+    def _remember(self, key, value, created_at):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _sqlite_get(self, keys, now):
+        rows = []
+        try:
+            conn = self._store.connection()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(conn.execute(
+                    f'SELECT key, result, confidence, created_at FROM prediction_cache '
+                    f'WHERE key IN ({placeholders}) AND created_at > ?',
+                    (*chunk, now - self.ttl)
+                ).fetchall())
+        except Exception as e:
+            print(f"Error reading prediction cache: {e}")
+            return []
+        return [(key, (result, confidence), created_at) for key, result, confidence, created_at in rows]
+
+    def _sqlite_set(self, items, model_version, now):
+        try:
+            conn = self._store.connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO prediction_cache (key, model_version, result, confidence, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(key, model_version or '', result, confidence, now) for key, (result, confidence) in items]
+            )
+            self._writes += len(items)
+            if self._writes >= PRUNE_EVERY:
+                self._writes = 0
+                cursor = conn.execute('DELETE FROM prediction_cache WHERE created_at <= ?', (now - self.ttl,))
+                with self._lock:
+                    self.expirations += cursor.rowcount
+        except Exception as e:
+            print(f"Error writing prediction cache: {e}")
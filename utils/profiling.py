@@ -0,0 +1,378 @@
+"""
+Opt-in profiling of slow requests and analysis jobs.
+
+ProfilingMiddleware wraps the app's WSGI callable. With PROFILE_SLOW_MS
+set, a sampler thread records the call stack of every request in flight
+every PROFILE_INTERVAL_MS; requests that end up slower than the threshold
+keep their samples, the others drop them. PROFILE_MODE=full also runs
+cProfile on every request and keeps its pstats for the slow ones. An admin
+can profile any single request, whatever the settings, by sending the
+PROFILE_HEADER header (``X-Profile: 1``); the response names the profile
+in ``X-Profile-Id``.
+
+URL analysis jobs run in worker processes and are profiled the same way
+when they take longer than PROFILE_SLOW_JOB_MS.
+
+Each profile is stored in PROFILE_DIR (``instance/profiles``) as a JSON
+summary, the samples as collapsed stacks (one ``frame;frame;frame count``
+line per stack, the input of flamegraph.pl and speedscope) and, with
+cProfile, a .pstats file. Only the newest PROFILE_KEEP profiles are kept.
+"""
+
+import cProfile
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import request
+from flask_login import current_user
+from werkzeug.wsgi import ClosingIterator
+
+from utils.metrics import current_timings
+
+# Requests slower than this many milliseconds are kept (0 disables sampling)
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+
+# The same for URL analysis jobs
+PROFILE_SLOW_JOB_MS = float(os.environ.get('PROFILE_SLOW_JOB_MS', 0))
+
+# 'sample' records stacks only; 'full' also runs cProfile on every request
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')
+
+# Milliseconds between two stack samples
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 10))
+
+# Request header with which an admin profiles a single request
+PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Profile')
+
+# Profiles kept on disk; the oldest are removed first
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+
+# Set by init_app from the app's instance folder
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or None
+
+PROFILE_FORMATS = {'collapsed': 'text/plain', 'pstats': 'application/octet-stream'}
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_frame_labels = {}
+
+
+def _short_path(filename):
+    if filename.startswith(_ROOT + os.sep):
+        return os.path.relpath(filename, _ROOT)
+    marker = filename.rfind('site-packages' + os.sep)
+    if marker != -1:
+        return filename[marker + len('site-packages') + 1:]
+    return os.path.basename(filename)
+
+
+def frame_label(code):
+    """``function (path:line)`` name of a code object, as shown in the flamegraph"""
+    label = _frame_labels.get(code)
+    if label is None:
+        name = getattr(code, 'co_qualname', code.co_name)
+        label = _frame_labels[code] = f'{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+    return label
+
+
+def collapse(frame):
+    """Collapsed stack of ``frame``: frame labels from the outermost call inwards, joined by ';'"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Background thread sampling the stacks of watched threads at a fixed interval.
+
+    The thread only wakes up while at least one thread is watched.
+    """
+
+    def __init__(self, interval_ms=10):
+        self.interval = interval_ms / 1000
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and again in forked workers
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._watched = {}
+        threading.Thread(target=self._run, name='profile-sampler', daemon=True).start()
+
+    def watch(self, thread_id):
+        self._ensure_thread()
+        with self._lock:
+            self._watched[thread_id] = {}
+            self._active.set()
+
+    def unwatch(self, thread_id):
+        """Stop sampling ``thread_id``; returns its ``{collapsed stack: samples}`` counts"""
+        with self._lock:
+            stacks = self._watched.pop(thread_id, {})
+            if not self._watched:
+                self._active.clear()
+        return stacks
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                watched = list(self._watched.items())
+            for thread_id, stacks in watched:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = collapse(frame)
+                    stacks[stack] = stacks.get(stack, 0) + 1
+            del frames
+
+
+sampler = StackSampler(PROFILE_INTERVAL_MS)
+
+
+class ProfileRun:
+    """Profiling state of one request or job, on the thread that runs it"""
+
+    def __init__(self, sample=False, full=False):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.thread_id = threading.get_ident()
+        self.forced = False
+        self.watching = False
+        self.profiler = None
+        self.stacks = {}
+        self.elapsed_ms = None
+        self.info = {}
+        self._profile_id = None
+        if sample:
+            self._watch()
+        if full:
+            self._enable_profiler()
+
+    @property
+    def profile_id(self):
+        if self._profile_id is None:
+            self._profile_id = f"{self.started_at:%Y%m%d-%H%M%S}-{os.getpid()}-{secrets.token_hex(3)}"
+        return self._profile_id
+
+    def force(self):
+        """Profile this run fully and keep it whatever its duration"""
+        self.forced = True
+        if not self.watching:
+            self._watch()
+        if self.profiler is None:
+            self._enable_profiler()
+
+    def _watch(self):
+        self.watching = True
+        sampler.watch(self.thread_id)
+
+    def _enable_profiler(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler or debugger is active on this thread
+            return
+        self.profiler = profiler
+
+    def stop(self):
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.watching:
+            self.stacks = sampler.unwatch(self.thread_id)
+
+    def keep(self, threshold_ms):
+        return self.forced or (threshold_ms > 0 and (self.watching or self.profiler is not None)
+                               and self.elapsed_ms >= threshold_ms)
+
+
+def top_frames(stacks, limit=5):
+    """Frames with the most samples at the top of the stack (self time), as (label, samples) pairs"""
+    totals = {}
+    for stack, count in stacks.items():
+        leaf = stack.rsplit(';', 1)[-1]
+        totals[leaf] = totals.get(leaf, 0) + count
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+def save_profile(run, kind, method, path, status):
+    """Write the profile of a finished run to PROFILE_DIR and return its id"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = run.profile_id
+    base = os.path.join(PROFILE_DIR, profile_id)
+
+    formats = []
+    if run.stacks:
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in sorted(run.stacks.items(), key=lambda item: -item[1]):
+                f.write(f'{stack} {count}\n')
+        formats.append('collapsed')
+    if run.profiler is not None:
+        run.profiler.dump_stats(base + '.pstats')
+        formats.append('pstats')
+
+    summary = {
+        'id': profile_id,
+        'kind': kind,
+        'method': method,
+        'path': path,
+        'status': status,
+        'started_at': run.started_at.isoformat(timespec='seconds'),
+        'duration_ms': round(run.elapsed_ms, 1),
+        'mode': 'full' if run.profiler is not None else 'sampled',
+        'forced': run.forced,
+        'samples': sum(run.stacks.values()),
+        'interval_ms': PROFILE_INTERVAL_MS,
+        'top_frames': top_frames(run.stacks),
+        'formats': formats,
+    }
+    summary.update(run.info)
+
+    # The summary is written last, so listings only see complete profiles
+    with open(base + '.json.tmp', 'w') as f:
+        json.dump(summary, f)
+    os.replace(base + '.json.tmp', base + '.json')
+
+    prune_profiles()
+    return profile_id
+
+
+def prune_profiles():
+    """Delete all but the newest PROFILE_KEEP profiles"""
+    profile_ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for profile_id in profile_ids[:max(0, len(profile_ids) - PROFILE_KEEP)]:
+        for suffix in ('.json', '.collapsed', '.pstats'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(order='slowest', limit=100):
+    """Summaries of the stored profiles, slowest or most recent first"""
+    if not PROFILE_DIR or not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            # Pruned while we were listing
+            continue
+
+    if order == 'recent':
+        profiles.sort(key=lambda profile: profile['id'], reverse=True)
+    else:
+        profiles.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+    return profiles[:limit]
+
+
+def profile_file(profile_id, profile_format):
+    """Path of a stored profile file, or None if there is no such file"""
+    if profile_format not in PROFILE_FORMATS or not PROFILE_DIR:
+        return None
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f'{profile_id}.{profile_format}')
+    return path if os.path.exists(path) else None
+
+
+@contextmanager
+def profile_job(job):
+    """Profile the enclosed processing of an analysis job if it takes over PROFILE_SLOW_JOB_MS"""
+    if PROFILE_SLOW_JOB_MS <= 0 or not PROFILE_DIR:
+        yield
+        return
+
+    # Read now: after a failed commit the job's attributes can no longer be loaded
+    url = job.url
+    run = ProfileRun(sample=True, full=PROFILE_MODE == 'full')
+    try:
+        yield
+    finally:
+        run.stop()
+        if run.keep(PROFILE_SLOW_JOB_MS):
+            try:
+                save_profile(run, 'job', 'JOB', url, None)
+            except OSError as e:
+                print(f"Error saving profile: {e}")
+
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling slow requests and the requests an admin asks for"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        enabled = PROFILE_SLOW_MS > 0
+        run = environ['profiling.run'] = ProfileRun(sample=enabled, full=enabled and PROFILE_MODE == 'full')
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status[:] = [status_line]
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            run.stop()
+            if run.keep(PROFILE_SLOW_MS):
+                try:
+                    save_profile(run, 'request', environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'),
+                                 int(status[0].split(' ', 1)[0]) if status else None)
+                except OSError as e:
+                    print(f"Error saving profile: {e}")
+
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            finish()
+            raise
+        # Streamed responses are produced while the server iterates the body,
+        # so the run ends when the server closes it
+        return ClosingIterator(body, finish)
+
+
+def _before_request():
+    # Only admins may profile a request on demand
+    run = request.environ.get('profiling.run')
+    if run is None or not request.headers.get(PROFILE_HEADER):
+        return
+    if current_user.is_authenticated and current_user.role == 'admin':
+        run.force()
+
+
+def _after_request(response):
+    run = request.environ.get('profiling.run')
+    if run is not None and (run.watching or run.profiler is not None):
+        run.info.update(endpoint=request.endpoint, timings=current_timings())
+        if run.forced:
+            response.headers['X-Profile-Id'] = run.profile_id
+    return response
+
+
+def init_app(app):
+    """Wrap the app in ProfilingMiddleware, storing profiles in the instance folder"""
+    global PROFILE_DIR
+
+    PROFILE_DIR = PROFILE_DIR or os.path.join(app.instance_path, 'profiles')
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
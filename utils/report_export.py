@@ -0,0 +1,128 @@
+"""
+Streaming submission report export.
+
+Rows are read from the database in batches (``yield_per``) and encoded
+batch by batch into CSV (optionally gzip-compressed) or Parquet row groups,
+so memory use stays constant however many submissions are exported.
+"""
+
+import csv
+import io
+import zlib
+
+# Rows fetched from the database, and written per CSV flush / Parquet row group
+BATCH_SIZE = 5000
+
+REPORT_HEADER = ['User Name', 'User Email', 'Article Title', 'Source Type',
+                 'Result', 'Confidence', 'Model Version', 'Timestamp']
+
+PARQUET_COLUMNS = ['user_name', 'user_email', 'article_title', 'source_type',
+                   'result', 'confidence', 'model_version', 'timestamp']
+
+
+def iter_batches(session, statement, batch_size=BATCH_SIZE):
+    """Execute ``statement`` and yield lists of at most ``batch_size`` rows.
+
+    With yield_per the rows are fetched from a server-side cursor where the
+    database supports one, instead of being buffered all at once.
+    """
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions(batch_size):
+        yield partition
+
+
+def stream_csv(batches, compress=False):
+    """Encode row batches as CSV chunks, gzip-compressed if ``compress``"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(REPORT_HEADER)
+    for batch in batches:
+        for name, email, title, source_type, result, confidence, model_version, timestamp in batch:
+            writer.writerow([
+                name,
+                email,
+                title,
+                source_type,
+                result,
+                f"{confidence:.2f}%",
+                model_version or '',
+                timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else ''
+            ])
+        chunk = drain()
+        if chunk:
+            yield chunk
+
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting whatever the Parquet writer emits"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(batches):
+    """Encode row batches as a Parquet file, one row group per batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('user_name', pa.string()),
+        ('user_email', pa.string()),
+        ('article_title', pa.string()),
+        ('source_type', pa.string()),
+        ('result', pa.string()),
+        ('confidence', pa.float64()),
+        ('model_version', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [()] * len(PARQUET_COLUMNS)
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_table(table)
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.take()
+    if chunk:
+        yield chunk
@@ -0,0 +1,181 @@
+"""
+Incremental retraining from admin feedback.
+
+Admins confirm or correct verdicts, which appends SubmissionFeedback rows.
+The model artifact records the id of the last feedback row it has learned
+from (record_feedback serializes the inserts, so no row can commit below
+that checkpoint later). retrain_from_feedback loads model.pkl, vectorizes
+only the rows after that checkpoint with the artifact's fitted vectorizer,
+updates the classifier with partial_fit and publishes the result as a
+new version, so the cost grows with the number of new labels and not with
+the history.
+
+Models without partial_fit (the LogisticRegression of train_model.py) are
+continued as an SGDClassifier starting from their coefficients. Running
+servers pick the new version up through the model file watcher.
+"""
+
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, exists, text
+from sqlalchemy.orm import aliased
+
+from app import db
+from models import Submission, SubmissionFeedback
+from utils.model_io import load_mapped, new_version, publish_artifact
+
+FEEDBACK_LABELS = {'FAKE': 0, 'REAL': 1}
+CLASSES = np.array([0, 1])
+
+# Constant SGD step size used when continuing a model that has no
+# partial_fit of its own; small, so a few labels nudge rather than rewrite it
+RETRAIN_LEARNING_RATE = float(os.environ.get('RETRAIN_LEARNING_RATE', 0.01))
+
+
+def record_feedback(submission, label, admin_id):
+    """Append an admin's label for ``submission`` and keep it as the submission's latest"""
+    label = label.upper()
+    if label not in FEEDBACK_LABELS:
+        raise ValueError(f'Unknown label: {label}')
+
+    # The checkpoint assumes feedback ids commit in id order. A PostgreSQL
+    # transaction could otherwise draw a lower id and commit after a retrain
+    # has checkpointed a higher one, and that label would never be learned.
+    # This lock mode conflicts with itself, so inserts take turns and each
+    # draws its id only once the previous one has committed. SQLite already
+    # has a single writer.
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('LOCK TABLE submission_feedback IN SHARE ROW EXCLUSIVE MODE'))
+
+    db.session.add(SubmissionFeedback(submission_id=submission.id, label=label, admin_id=admin_id))
+    submission.feedback_label = label
+    db.session.commit()
+
+
+def iter_feedback(after_id, batch_size=1000):
+    """Yield lists of (feedback id, label, article content) rows newer than ``after_id``, in id order.
+
+    A label superseded by a newer one for the same submission is skipped;
+    the newer one is yielded instead.
+    """
+    newer = aliased(SubmissionFeedback)
+    superseded = exists().where(and_(newer.submission_id == SubmissionFeedback.submission_id,
+                                     newer.id > SubmissionFeedback.id))
+    while True:
+        batch = db.session.query(SubmissionFeedback.id, SubmissionFeedback.label, Submission.article_content)\
+                          .join(Submission, Submission.id == SubmissionFeedback.submission_id)\
+                          .filter(SubmissionFeedback.id > after_id, ~superseded)\
+                          .order_by(SubmissionFeedback.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1].id
+
+
+def count_pending_feedback(after_id):
+    """Number of feedback rows newer than ``after_id``, superseded ones included"""
+    return db.session.query(db.func.count(SubmissionFeedback.id))\
+                     .filter(SubmissionFeedback.id > after_id).scalar()
+
+
+def incremental_learner(model):
+    """A classifier with partial_fit that continues from ``model``'s weights"""
+    if list(getattr(model, 'classes_', [])) != [0, 1]:
+        raise ValueError('Only binary fake (0) / real (1) classifiers can be retrained')
+    if hasattr(model, 'partial_fit'):
+        return model
+
+    coef = getattr(model, 'coef_', None)
+    if coef is None or coef.shape[0] != 1:
+        raise ValueError(f'{type(model).__name__} has no partial_fit and is not a binary linear model')
+
+    from sklearn.linear_model import SGDClassifier
+    learner = SGDClassifier(loss='log_loss', learning_rate='constant', eta0=RETRAIN_LEARNING_RATE,
+                            alpha=1e-6, random_state=42)
+    # partial_fit keeps coefficients that are already set
+    learner.coef_ = np.array(coef, dtype=np.float64)
+    learner.intercept_ = np.array(model.intercept_, dtype=np.float64)
+    return learner
+
+
+def retrain_from_feedback(model_dir=None, batch_size=1000, epochs=1, export_serving=False):
+    """Learn from the feedback added since the served artifact's checkpoint and publish a new version.
+
+    Returns a status dict; ``status`` is 'up_to_date' when there was
+    nothing new to learn from and 'published' otherwise.
+    """
+    from utils.ml_utils import MODEL_DIR, preprocess_text
+
+    model_dir = model_dir or MODEL_DIR
+    model_path = os.path.join(model_dir, 'model.pkl')
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f'No trained model at {model_path}; run ml_model/train_model.py first')
+
+    # Loaded into memory (not mapped) since partial_fit updates the weights in place
+    model_data = load_mapped(model_path, mmap_mode=None)
+    vectorizer = model_data['vectorizer']
+    parent_version = model_data.get('version')
+    checkpoint = model_data.get('feedback_checkpoint', 0)
+    started = time.perf_counter()
+
+    # Skips the feedback scan altogether when nothing was added since the checkpoint
+    pending = count_pending_feedback(checkpoint)
+
+    learner = None
+    rows = 0
+    labels = {'FAKE': 0, 'REAL': 0}
+    for batch in (iter_feedback(checkpoint, batch_size) if pending else ()):
+        checkpoint = batch[-1].id
+        texts = [preprocess_text(row.article_content) for row in batch]
+        kept = [(text, row.label) for text, row in zip(texts, batch) if text]
+        if not kept:
+            continue
+
+        X = vectorizer.transform([text for text, _ in kept])
+        y = np.array([FEEDBACK_LABELS[label] for _, label in kept])
+        if learner is None:
+            learner = incremental_learner(model_data['model'])
+        for _ in range(epochs):
+            learner.partial_fit(X, y, classes=CLASSES)
+
+        rows += len(kept)
+        for _, label in kept:
+            labels[label] += 1
+
+    status = {
+        'parent_version': parent_version,
+        'feedback_checkpoint': checkpoint,
+        'pending': pending,
+        'rows': rows,
+        'labels': labels,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if learner is None:
+        status.update(status='up_to_date', version=parent_version)
+        return status
+
+    version = new_version()
+    new_data = dict(model_data)
+    new_data.update(
+        model=learner,
+        version=version,
+        trained_at=datetime.utcnow().isoformat(),
+        parent_version=parent_version,
+        feedback_checkpoint=checkpoint,
+        feedback_rows=model_data.get('feedback_rows', 0) + rows
+    )
+    publish_artifact(new_data, model_path)
+    status.update(status='published', version=version, path=model_path)
+
+    if export_serving:
+        from utils.hashed_model import build_artifact
+        artifact, _ = build_artifact(learner, vectorizer)
+        artifact['version'] = version
+        serving_path = os.path.join(model_dir, 'serving.pkl')
+        publish_artifact(artifact, serving_path)
+        status['serving_path'] = serving_path
+
+    return status
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Small helper that hands out one SQLite connection per thread and process.
+
+    The database is opened in WAL mode so several gunicorn workers can read
+    while one of them writes. ``schema`` is executed once per connection.
+    """
+
+    def __init__(self, path, schema=''):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if self.schema:
+            conn.executescript(self.schema)
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
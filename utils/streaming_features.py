@@ -0,0 +1,122 @@
+"""
+Incremental feature extraction for articles too large to hold in memory.
+
+StreamingTermCounter is fed the normalized segments of one document (see
+utils.text_normalizer.iter_normalized) and builds the same feature row as
+``vectorizer.transform([' '.join(segments)])``. It holds only the counts of
+the vocabulary n-grams seen so far and the last ``max_n - 1`` tokens, which
+start the n-grams spanning two segments.
+"""
+
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from utils.hashed_model import HashedVectorizer
+
+
+def _is_hashing_vectorizer(vectorizer):
+    # Imported here: the hashed serving backend runs without loading sklearn
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return isinstance(vectorizer, HashingVectorizer)
+
+
+class StreamingTermCounter:
+    """Accumulate one document's n-gram counts for a fitted word vectorizer"""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.hasher = None
+
+        if isinstance(vectorizer, HashedVectorizer):
+            lowercase = vectorizer.lowercase
+            self.preprocess = (lambda text: text.lower()) if lowercase else (lambda text: text)
+            self.tokenize = vectorizer.token_pattern.findall
+            self.stop_words = vectorizer.stop_words
+            self.min_n, self.max_n = vectorizer.min_n, vectorizer.max_n
+            self.n_features = vectorizer.n_features
+            self.lookup = vectorizer.lookup
+            self.dtype = np.float32
+        elif _is_hashing_vectorizer(vectorizer):
+            # Stateless sklearn vectorizer of the streaming training mode;
+            # n-grams are hashed (and signed) exactly as its transform does
+            if vectorizer.analyzer != 'word':
+                raise ValueError('Only word-level vectorizers can be fed incrementally')
+            self.preprocess = vectorizer.build_preprocessor()
+            self.tokenize = vectorizer.build_tokenizer()
+            self.stop_words = frozenset(vectorizer.get_stop_words() or ())
+            self.min_n, self.max_n = vectorizer.ngram_range
+            self.n_features = vectorizer.n_features
+            self.hasher = vectorizer._get_hasher()
+            self.dtype = vectorizer.dtype
+        else:
+            # sklearn CountVectorizer / TfidfVectorizer
+            if getattr(vectorizer, 'analyzer', None) != 'word':
+                raise ValueError('Only word-level vectorizers can be fed incrementally')
+            self.preprocess = vectorizer.build_preprocessor()
+            self.tokenize = vectorizer.build_tokenizer()
+            self.stop_words = frozenset(vectorizer.get_stop_words() or ())
+            self.min_n, self.max_n = vectorizer.ngram_range
+            self.n_features = len(vectorizer.vocabulary_)
+            vocabulary = vectorizer.vocabulary_
+            self.lookup = lambda grams: np.fromiter(
+                (vocabulary.get(gram, -1) for gram in grams), dtype=np.int64, count=len(grams)
+            )
+            self.dtype = vectorizer.dtype
+
+        self.counts = Counter()
+        self.carry = []
+        self.segments = 0
+
+    def feed(self, segment):
+        """Count the n-grams of the next segment, including those spanning the previous one"""
+        if not segment:
+            return
+        self.segments += 1
+
+        tokens = [token for token in self.tokenize(self.preprocess(segment)) if token not in self.stop_words]
+        window = self.carry + tokens
+
+        grams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            # Only n-grams ending in this segment; earlier ones were counted already
+            first = max(0, len(self.carry) - n + 1)
+            grams.extend(' '.join(window[i:i + n]) for i in range(first, len(window) - n + 1))
+        self.carry = window[len(window) - self.max_n + 1:] if self.max_n > 1 else []
+
+        if grams and self.hasher is not None:
+            row = self.hasher.transform([grams])
+            self.counts.update(dict(zip(row.indices.tolist(), row.data.tolist())))
+        elif grams:
+            found = self.lookup(grams)
+            unique, counts = np.unique(found[found >= 0], return_counts=True)
+            self.counts.update(dict(zip(unique.tolist(), counts.tolist())))
+
+    @property
+    def empty(self):
+        """True when no non-empty segment was fed, i.e. the normalized document is empty"""
+        return self.segments == 0
+
+    def transform(self):
+        """The document's feature row, as ``vectorizer.transform`` returns it"""
+        indices = np.array(sorted(self.counts), dtype=np.int64)
+        values = np.array([self.counts[index] for index in indices], dtype=self.dtype)
+        if getattr(self.vectorizer, 'binary', False):
+            values = np.ones_like(values)
+
+        X = sparse.csr_matrix(
+            (values, indices, np.array([0, len(indices)], dtype=np.int64)),
+            shape=(1, self.n_features),
+            dtype=self.dtype
+        )
+
+        # TfidfVectorizer applies its fitted TF-IDF weighting to the counts;
+        # HashingVectorizer only normalizes them
+        tfidf = getattr(self.vectorizer, '_tfidf', None)
+        if tfidf is not None:
+            X = tfidf.transform(X, copy=False)
+        elif self.hasher is not None and self.vectorizer.norm is not None:
+            from sklearn.preprocessing import normalize
+            X = normalize(X, norm=self.vectorizer.norm, copy=False)
+        return X
@@ -0,0 +1,114 @@
+"""
+Text normalization shared by model training and serving.
+
+normalize_text(text) is equivalent to the original
+
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    text = ' '.join(text.split())
+
+but avoids the lower() copy and the regex substitution. The text is encoded
+to ASCII once (non-ASCII runs go through a memoized error handler) and a
+precompiled bytes translation table then lowercases, drops non-letters and
+maps whitespace to spaces in a single pass.
+"""
+
+import codecs
+import re
+import string
+
+ERROR_HANDLER = 'fakenews-normalize'
+
+_LETTERS = frozenset(string.ascii_letters)
+_WHITESPACE = frozenset(chr(codepoint) for codepoint in range(128) if chr(codepoint).isspace())
+
+# bytes.translate table: uppercase -> lowercase, ASCII whitespace -> space
+_BYTE_TABLE = bytes(
+    ord(chr(byte).lower()) if chr(byte) in _LETTERS else
+    ord(' ') if chr(byte) in _WHITESPACE else byte
+    for byte in range(256)
+)
+# Every other byte is deleted
+_DELETE_BYTES = bytes(
+    byte for byte in range(256)
+    if chr(byte) not in _LETTERS and chr(byte) not in _WHITESPACE
+)
+
+# Runs of two or more spaces left behind by the translation
+_SPACE_RUNS = re.compile(rb'  +')
+
+# Normalized replacement for each non-ASCII character seen so far
+_non_ascii = {}
+
+
+def _normalize_char(char):
+    """Lowercase a non-ASCII character and keep only ASCII letters and whitespace.
+
+    A few characters lowercase to ASCII letters (e.g. the Kelvin sign) and
+    Unicode whitespace must still separate words, exactly like the original
+    lower() + regex pipeline.
+    """
+    replacement = _non_ascii.get(char)
+    if replacement is None:
+        kept = []
+        for lowered in char.lower():
+            if lowered in _LETTERS:
+                kept.append(lowered)
+            elif lowered.isspace():
+                kept.append(' ')
+        replacement = _non_ascii[char] = ''.join(kept)
+    return replacement
+
+
+def _encode_error_handler(error):
+    if not isinstance(error, UnicodeEncodeError):
+        raise error
+    run = error.object[error.start:error.end]
+    return ''.join([_normalize_char(char) for char in run]), error.end
+
+
+codecs.register_error(ERROR_HANDLER, _encode_error_handler)
+
+
+def _translate(text):
+    """Lowercased ASCII letters and single spaces, not yet collapsed"""
+    return text.encode('ascii', ERROR_HANDLER).translate(_BYTE_TABLE, _DELETE_BYTES)
+
+
+def _collapse(translated):
+    """Collapse space runs and trim, like ' '.join(text.split())"""
+    return _SPACE_RUNS.sub(b' ', translated).strip(b' ')
+
+
+def normalize_text(text):
+    """Lowercase, keep only letters and collapse whitespace"""
+    if not text:
+        return ""
+    return _collapse(_translate(text)).decode('ascii')
+
+
+def iter_normalized(chunks):
+    """Normalize an iterable of string chunks without joining them first.
+
+    Yields normalized segments such that ``' '.join(segments)`` equals
+    ``normalize_text(''.join(chunks))``. A word split across chunk boundaries
+    is carried over to the next chunk.
+    """
+    carry = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        translated = carry + _translate(chunk)
+        if not translated:
+            continue
+        if translated.endswith(b' '):
+            carry = b''
+            segment = _collapse(translated)
+        else:
+            # The last word may continue in the next chunk
+            head, _, carry = translated.rpartition(b' ')
+            segment = _collapse(head)
+        if segment:
+            yield segment.decode('ascii')
+    if carry:
+        yield carry.decode('ascii')
@@ -0,0 +1,137 @@
+"""
+Streaming ingestion of uploaded articles.
+
+Uploads may hold several .txt files and .zip archives of .txt files. Each
+article is decoded incrementally from its (spooled) upload stream in
+fixed-size chunks, so no article is ever held in memory as a whole;
+invalid UTF-8 sequences are replaced rather than rejected. Only the first
+PREVIEW_CHARS characters are kept, for the stored submission.
+"""
+
+import codecs
+import os
+import zipfile
+from functools import partial
+
+# Bytes read from the upload per decode step
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Characters of each article kept as its stored preview
+PREVIEW_CHARS = 1000
+
+# Upper bounds on a single upload
+MAX_UPLOAD_ARTICLES = int(os.environ.get('MAX_UPLOAD_ARTICLES', 200))
+MAX_UPLOAD_UNCOMPRESSED_BYTES = int(os.environ.get('MAX_UPLOAD_UNCOMPRESSED_BYTES', 256 * 1024 * 1024))
+
+TEXT_EXTENSIONS = ('.txt',)
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+
+class UploadError(ValueError):
+    """The upload cannot be analyzed; the message is shown to the user"""
+
+
+def iter_decoded(stream, chunk_size=UPLOAD_CHUNK_SIZE, encoding='utf-8-sig'):
+    """Decode a binary stream chunk by chunk; a leading BOM is dropped and invalid bytes become U+FFFD"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+class UploadedArticle:
+    """One article of an upload, read lazily from its stream"""
+
+    def __init__(self, title, open_stream):
+        self.title = title[:200]
+        self.open_stream = open_stream
+        self.preview = ''
+
+    def iter_text(self):
+        """Yield the decoded text in chunks, keeping its first PREVIEW_CHARS characters as ``preview``.
+
+        Leading whitespace is not part of the preview, however long it is.
+        """
+        self.preview = ''
+        with self.open_stream() as stream:
+            for chunk in iter_decoded(stream):
+                if len(self.preview) < PREVIEW_CHARS:
+                    text = chunk if self.preview else chunk.lstrip()
+                    self.preview += text[:PREVIEW_CHARS - len(self.preview)]
+                yield chunk
+
+
+class _UnclosedStream:
+    """Context manager yielding ``stream`` without closing it afterwards"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __enter__(self):
+        self.stream.seek(0)
+        return self.stream
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _title_for(filename):
+    return os.path.splitext(os.path.basename(filename.replace('\\', '/')))[0] or 'Untitled Article'
+
+
+def _is_article_member(info):
+    name = info.filename.replace('\\', '/')
+    basename = os.path.basename(name)
+    return (not info.is_dir()
+            and name.lower().endswith(TEXT_EXTENSIONS)
+            and not basename.startswith('.')
+            and not name.startswith('__MACOSX/'))
+
+
+def plan_upload(files, title=''):
+    """Validate uploaded files and list their articles without reading them.
+
+    ``title`` names the article of a single-file upload. Raises UploadError
+    for unsupported files, corrupt archives, or uploads over the limits.
+    """
+    articles = []
+    uncompressed = 0
+
+    for storage in files:
+        filename = storage.filename or ''
+        lowered = filename.lower()
+
+        if lowered.endswith(TEXT_EXTENSIONS):
+            articles.append(UploadedArticle(_title_for(filename), partial(_UnclosedStream, storage.stream)))
+        elif lowered.endswith(ARCHIVE_EXTENSIONS):
+            try:
+                archive = zipfile.ZipFile(storage.stream)
+            except (zipfile.BadZipFile, OSError):
+                raise UploadError(f'{filename} is not a valid zip archive.')
+            members = [info for info in archive.infolist() if _is_article_member(info)]
+            if not members:
+                raise UploadError(f'{filename} contains no .txt files.')
+            for info in members:
+                # Reads of a member stop at its declared size, so the
+                # central directory bounds the decompressed total
+                uncompressed += info.file_size
+                articles.append(UploadedArticle(_title_for(info.filename), partial(archive.open, info)))
+        else:
+            raise UploadError('Only .txt files and .zip archives of .txt files are allowed.')
+
+        if len(articles) > MAX_UPLOAD_ARTICLES:
+            raise UploadError(f'At most {MAX_UPLOAD_ARTICLES} articles per upload.')
+        if uncompressed > MAX_UPLOAD_UNCOMPRESSED_BYTES:
+            raise UploadError(f'Archives may expand to at most {MAX_UPLOAD_UNCOMPRESSED_BYTES // (1024 * 1024)} MB.')
+
+    if len(articles) == 1 and title:
+        articles[0].title = title[:200]
+    return articles
+
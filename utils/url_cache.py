@@ -0,0 +1,134 @@
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+from utils.sqlite_store import SQLiteStore
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS url_cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    validated_at REAL NOT NULL
+);
+'''
+
+# Query parameters that only track the visitor and never change the article
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ocid', 'cmpid')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """Normalize a URL so that trivially different spellings share one cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+
+    # hostname drops the brackets around an IPv6 address; they are needed to tell it from a port
+    netloc = f'[{host}]' if ':' in host else host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    if parts.username:
+        credentials = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{credentials}@{netloc}'
+
+    # The pairs are kept as sent: decoding and re-encoding them would turn '%2B' into '+'
+    # (a space) or an encoded '&' into a separator and change what the server receives
+    query = sorted(
+        pair for pair in parts.query.split('&')
+        if pair and not unquote_plus(pair.split('=', 1)[0]).lower().startswith(TRACKING_PARAMS)
+    )
+
+    return urlunsplit((scheme, netloc, parts.path or '/', '&'.join(query), ''))
+
+
+class UrlCache:
+    """Persistent cache of extracted article title/content keyed by canonical URL.
+
+    Entries younger than ``ttl`` seconds are served without touching the
+    network; older ones keep their ETag/Last-Modified validators so they can be
+    revalidated with a conditional request.
+    """
+
+    def __init__(self, db_path, ttl=900):
+        self.ttl = float(ttl)
+        self._store = SQLiteStore(db_path, SCHEMA)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def get(self, url):
+        """Return the cached entry for ``url`` as a dict, or None"""
+        try:
+            row = self._store.connection().execute(
+                'SELECT etag, last_modified, title, content, fetched_at, validated_at '
+                'FROM url_cache WHERE url = ?', (url,)
+            ).fetchone()
+        except Exception as e:
+            print(f"Error reading URL cache: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        etag, last_modified, title, content, fetched_at, validated_at = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'title': title,
+            'content': content,
+            'fetched_at': fetched_at,
+            'validated_at': validated_at,
+            'fresh': time.time() - validated_at < self.ttl,
+        }
+
+    def store(self, url, title, content, etag=None, last_modified=None):
+        now = time.time()
+        try:
+            self._store.connection().execute(
+                'INSERT OR REPLACE INTO url_cache '
+                '(url, etag, last_modified, title, content, fetched_at, validated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, title, content, now, now)
+            )
+        except Exception as e:
+            print(f"Error writing URL cache: {e}")
+
+    def touch(self, url, etag=None, last_modified=None):
+        """Mark an entry as revalidated after a 304 Not Modified response"""
+        try:
+            self._store.connection().execute(
+                'UPDATE url_cache SET validated_at = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) '
+                'WHERE url = ?',
+                (time.time(), etag, last_modified, url)
+            )
+        except Exception as e:
+            print(f"Error updating URL cache: {e}")
+
+    def record(self, outcome):
+        """Count a lookup outcome: 'hit', 'revalidated' or 'miss'"""
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'revalidated':
+                self.revalidations += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.revalidations + self.misses
+            return {
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'hit_rate': ((self.hits + self.revalidations) / lookups) if lookups else 0.0,
+            }
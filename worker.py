@@ -0,0 +1,94 @@
+"""
+Background worker processing queued URL analysis jobs.
+
+Usage:
+    python worker.py [--processes N] [--threads N]
+
+The app and the model are loaded once here and the worker processes are
+forked afterwards, sharing the model copy-on-write as gunicorn workers do.
+Each process runs ``--threads`` threads that claim jobs from the database
+(see utils.job_queue). SIGTERM or SIGINT lets running jobs finish, then
+exits; worker processes that die are restarted.
+"""
+
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+
+def run_process(threads):
+    from app import app, db
+    from utils.job_queue import work
+
+    # Database connections opened before the fork belong to the parent
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    workers = [
+        threading.Thread(target=work, args=(app, stop_event), name=f'job-worker-{index}')
+        for index in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    # Join with a timeout so the main thread keeps handling signals
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(timeout=0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process queued URL analysis jobs')
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('JOB_WORKER_PROCESSES', 2)),
+                        help='worker processes to fork')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('JOB_WORKER_THREADS', 4)),
+                        help='job threads per worker process')
+    args = parser.parse_args()
+
+    # Load the app and the model before forking
+    from app import app  # noqa: F401
+    import utils.ml_utils  # noqa: F401
+    gc.freeze()
+
+    context = multiprocessing.get_context('fork')
+    stopping = threading.Event()
+    processes = []
+
+    def stop(signum, frame):
+        stopping.set()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def spawn():
+        process = context.Process(target=run_process, args=(args.threads,), name='job-worker')
+        process.start()
+        return process
+
+    processes.extend(spawn() for _ in range(max(1, args.processes)))
+    logging.info(f"Started {len(processes)} job worker processes with {args.threads} threads each")
+
+    while not stopping.is_set():
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not stopping.is_set():
+                logging.warning(f"Job worker {process.pid} exited with code {process.exitcode}; restarting it")
+                processes[index] = spawn()
+        stopping.wait(1)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()